@@ -14,6 +14,10 @@ import numpy as np
 import semopy
 from sklearn.preprocessing import StandardScaler
 
+# import factor score cache, stated choice design and prepared data writer
+from avchoice import FactorScoreCache, write_prepared_data
+from avchoice.design import DESIGN, expand_design
+
 
 # import data
 df = pd.read_csv("../data/data.csv")
@@ -22,6 +26,9 @@ df.describe
 # ---------------------------------------------------------------------------------------------------------------------#
 ## latent variables definition and score estimate
 
+# fitted measurement models and factor scores, see avchoice/factor_scores.py
+factor_score_cache = FactorScoreCache("../data/factor_scores")
+
 # model specification
 mod = """
 av_usefulness     =~ av_benefit_1 + av_benefit_2 + av_benefit_3 + \
@@ -35,16 +42,15 @@ polychronicity    =~ polychronicity_1 + polychronicity_2 + polychronicity_3
 envt_concern      =~ envt_concern_1 + envt_concern_2 + envt_concern_3
 """
 
-# model fit
-model = semopy.Model(mod)
-model.fit(df, obj="DWLS")
+# model fit and factor scores, read from the cache if the model and the indicators did not change, and fitted from
+# the cached parameters if only the indicators changed (e.g. new respondents)
+model, factors = factor_score_cache.fit(mod, df, obj="DWLS")
 pd.set_option("display.max_rows", 500)
 model.inspect(std_est=True)
 stats = semopy.calc_stats(model)
 print(stats.T)
 
-# estimate factor scores
-factors = model.predict_factors(df)
+# add factor scores
 df = df.join(factors)
 
 # standarized latent variable scores
@@ -186,15 +192,22 @@ df["av_fam_std"] = StandardScaler().fit_transform(df[["av_fam"]])
 # ---------------------------------------------------------------------------------------------------------------------#
 ## data preparation for choice models
 
-# convert wide to long format
+# split the data into a person table (df, one row per individual) and a task table (tasks, one row per choice
+# scenario), so that the person attributes are not repeated for each of the 12 scenarios
 value_vars = list(df.filter(like="stated_pref").columns)
-id_vars = list(df.columns.drop(value_vars))
-df = pd.melt(
-    df, id_vars=id_vars, value_vars=value_vars, var_name="scenario", value_name="chosen"
+tasks = pd.melt(
+    df, id_vars=["id"], value_vars=value_vars, var_name="scenario", value_name="chosen"
 )
+df = df.drop(columns=value_vars)
 
 # drop scenarios without chosen values
-df = df[df["chosen"].notnull()]
+tasks = tasks[tasks["chosen"].notnull()]
+
+# number of the scenarios, from 1 to 12
+tasks["scenario"] = tasks["scenario"].str.replace("stated_pref_", "").astype(int)
+
+# travel time and cost of the trip of each individual, from which the attributes of the scenarios are derived
+tasks = tasks.merge(df[["id", "time", "cost"]], on="id", how="left")
 
 # convert travel time to minutes from hours
 # df["time"] = df["time"] * 60
@@ -203,130 +216,13 @@ df = df[df["chosen"].notnull()]
 # choices: current vehicle (hv-1); autonomous vehicle with current vehilce interior(av-2);
 # autonomous vehicle with work and leisure interior (avwl-3)
 
-# conditons
-conditions = [
-    df["scenario"].eq("stated_pref_1"),
-    df["scenario"].eq("stated_pref_2"),
-    df["scenario"].eq("stated_pref_3"),
-    df["scenario"].eq("stated_pref_4"),
-    df["scenario"].eq("stated_pref_5"),
-    df["scenario"].eq("stated_pref_6"),
-    df["scenario"].eq("stated_pref_7"),
-    df["scenario"].eq("stated_pref_8"),
-    df["scenario"].eq("stated_pref_9"),
-    df["scenario"].eq("stated_pref_10"),
-    df["scenario"].eq("stated_pref_11"),
-    df["scenario"].eq("stated_pref_12"),
-]
-
-# travel time options for hv
-choices_hv_tt = [
-    df["time"],
-    df["time"] * 1.2,
-    df["time"],
-    df["time"] * 0.8,
-    df["time"],
-    df["time"],
-    df["time"] * 1.2,
-    df["time"] * 0.8,
-    df["time"] * 1.2,
-    df["time"] * 0.8,
-    df["time"] * 1.2,
-    df["time"] * 0.8,
-]
-
-# travel cost options for hv
-choices_hv_tc = [
-    df["cost"],
-    df["cost"],
-    df["cost"] * 1.2,
-    df["cost"] * 0.8,
-    df["cost"],
-    df["cost"] * 1.2,
-    df["cost"] * 0.8,
-    df["cost"],
-    df["cost"] * 0.8,
-    df["cost"] * 0.8,
-    df["cost"] * 1.2,
-    df["cost"] * 1.2,
-]
-
-# travel time options for av
-choices_av_tt = [
-    df["time"] * 1.2,
-    df["time"],
-    df["time"] * 0.8,
-    df["time"],
-    df["time"] * 1.2,
-    df["time"] * 0.8,
-    df["time"] * 0.8,
-    df["time"] * 1.2,
-    df["time"],
-    df["time"],
-    df["time"],
-    df["time"],
-]
-
-# travel cost options for av
-choices_av_tc = [
-    df["cost"] * 1.2,
-    df["cost"],
-    df["cost"] * 0.8,
-    df["cost"],
-    df["cost"] * 0.8,
-    df["cost"] * 1.2,
-    df["cost"],
-    df["cost"],
-    df["cost"] * 0.8,
-    df["cost"] * 1.2,
-    df["cost"] * 1.2,
-    df["cost"] * 0.8,
-]
-
-# travel time options for avwl
-choices_avwl_tt = [
-    df["time"],
-    df["time"] * 1.2,
-    df["time"],
-    df["time"] * 0.8,
-    df["time"],
-    df["time"],
-    df["time"] * 1.2,
-    df["time"] * 0.8,
-    df["time"] * 0.8,
-    df["time"] * 1.2,
-    df["time"] * 0.8,
-    df["time"] * 1.2,
-]
-
-# travel cost options for avwl
-choices_avwl_tc = [
-    df["cost"] * 1.2,
-    df["cost"] * 0.8,
-    df["cost"] * 1.2,
-    df["cost"] * 0.8,
-    df["cost"] * 0.8,
-    df["cost"] * 0.8,
-    df["cost"] * 1.2,
-    df["cost"] * 1.2,
-    df["cost"],
-    df["cost"],
-    df["cost"],
-    df["cost"],
-]
-
-# travel time and cost for choices
-df["hv_tt"] = np.select(conditions, choices_hv_tt)
-df["hv_tc"] = np.select(conditions, choices_hv_tc)
-df["av_tt"] = np.select(conditions, choices_av_tt)
-df["av_tc"] = np.select(conditions, choices_av_tc)
-df["avwl_tt"] = np.select(conditions, choices_avwl_tt)
-df["avwl_tc"] = np.select(conditions, choices_avwl_tc)
+# travel time and cost for choices, from the multipliers of the design by scenario (see avchoice/design.py)
+tasks[DESIGN.columns] = expand_design(tasks, DESIGN)
 
 # availabilities of hv, av, and avwl
-df["hv_av"] = 1
-df["av_av"] = 1
-df["avwl_av"] = 1
+tasks["hv_av"] = 1
+tasks["av_av"] = 1
+tasks["avwl_av"] = 1
 
 # some summary statistics
 # df['chosen'] = df['chosen'].astype('category')
@@ -361,14 +257,21 @@ df = df.astype({col: int for col in df.columns if df[col].dtype == bool})
 print(df.dtypes)
 
 
-# pepare data for biogeme with no null values and sorted by id
+# no trip attributes in the task table
+tasks = tasks.drop(columns=["time", "cost"])
+
+# pepare data for biogeme with no null values and sorted by id, for the individuals with choices
+df = df[df["id"].isin(tasks["id"])]
 df = df.drop(df.columns[df.isnull().any()], axis=1)
 df = df.select_dtypes(exclude=["object"])
 df = df.sort_values("id")
+tasks = tasks.drop(tasks.columns[tasks.isnull().any()], axis=1)
+tasks = tasks.sort_values(["id", "scenario"])
 
-# export the prepared dataset
-df.to_pickle("../data/prepared_data.pkl")
-df.to_csv("../data/prepared_data.csv")
+# export the prepared dataset: typed columnar person and task tables for the model scripts (int8 dummies, float32
+# continuous variables, with manifests of the column groups), and csv of the person table for 0-visualize-data.R
+write_prepared_data(df, tasks, "../data")
+df.to_csv("../data/prepared_persons.csv")
 
 
 # ---------------------------------------------------------------------------------------------------------------------#
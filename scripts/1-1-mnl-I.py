@@ -17,6 +17,9 @@ from biogeme.expressions import (
     Variable,
 )
 
+# import prepared data reader
+from avchoice import read_prepared_data, variable_names
+
 # configure logging
 logging.basicConfig(
     filename='../outputs/1-1-mnl-I.log',  
@@ -26,13 +29,6 @@ logging.basicConfig(
 logging.info("Script execution started.")
 
 # ---------------------------------------------------------------------------------------------------------------------#
-# import prepared data
-df = pd.read_pickle("../data/prepared_data.pkl")
-df.describe
-
-# define the data as biogeme global database
-database = db.Database("mydata", df)
-
 # define the variables
 hv_tt = Variable("hv_tt")
 hv_tc = Variable("hv_tc")
@@ -45,6 +41,13 @@ av_av = Variable("av_av")
 avwl_av = Variable("avwl_av")
 chosen = Variable("chosen")
 
+# import prepared data, only the columns of the variables (memory-mapped from the columnar file)
+df = read_prepared_data(["id"] + variable_names(globals()))
+df.describe
+
+# define the data as biogeme global database
+database = db.Database("mydata", df)
+
 # ---------------------------------------------------------------------------------------------------------------------#
 ## 1-1-mnl-I
 # simple multinomial logit model with time and cost parameters only
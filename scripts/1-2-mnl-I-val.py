@@ -19,6 +19,9 @@ from biogeme.expressions import (
     Variable,
 )
 
+# import prepared data reader
+from avchoice import read_prepared_data, variable_names
+
 # configure logging
 logging.basicConfig(
     filename='../outputs/1-2-mnl-I-val.log',  
@@ -28,13 +31,6 @@ logging.basicConfig(
 logging.info("Script execution started.")
 
 # ---------------------------------------------------------------------------------------------------------------------#
-# import prepared data
-df = pd.read_pickle("../data/prepared_data.pkl")
-df.describe
-
-# define the data as biogeme global database
-database = db.Database("mydata", df)
-
 # define the variables
 hv_tt = Variable("hv_tt")
 hv_tc = Variable("hv_tc")
@@ -47,6 +43,13 @@ av_av = Variable("av_av")
 avwl_av = Variable("avwl_av")
 chosen = Variable("chosen")
 
+# import prepared data, only the columns of the variables (memory-mapped from the columnar file)
+df = read_prepared_data(["id"] + variable_names(globals()))
+df.describe
+
+# define the data as biogeme global database
+database = db.Database("mydata", df)
+
 # ---------------------------------------------------------------------------------------------------------------------#
 ## 1-2-mnl-I-val
 # 5-fold cross-validation of 1-1-mnl-I 
@@ -17,6 +17,9 @@ from biogeme.expressions import (
     Variable,
 )
 
+# import prepared data reader
+from avchoice import read_prepared_data, variable_names
+
 # configure logging
 logging.basicConfig(
     filename='../outputs/2-2-mnl-II-final.log',  
@@ -26,13 +29,6 @@ logging.basicConfig(
 logging.info("Script execution started.")
 
 # ---------------------------------------------------------------------------------------------------------------------#
-# import prepared data
-df = pd.read_pickle("../data/prepared_data.pkl")
-df.describe
-
-# define the data as biogeme global database
-database = db.Database("mydata", df)
-
 # define the variables
 hv_tt = Variable("hv_tt")
 hv_tc = Variable("hv_tc")
@@ -80,6 +76,13 @@ av_fam = Variable("av_fam_std")
 tba_tot_diff = Variable("tba_tot_diff")
 ttu_diff = Variable("ttu_diff_std")
 
+# import prepared data, only the columns of the variables (memory-mapped from the columnar file)
+df = read_prepared_data(["id"] + variable_names(globals()))
+df.describe
+
+# define the data as biogeme global database
+database = db.Database("mydata", df)
+
 # ---------------------------------------------------------------------------------------------------------------------#
 ## 2-2-mnl-II-final
 # 2-1-mnl-II-initial with significant parameters only 
@@ -242,8 +245,8 @@ for slide in validation_results:
     )
     logging.info(log_message)  
 
-# delete intermediate and unnecessary files
-extensions = ["*.html", "*.pickle", "*.iter"]
+# delete intermediate and unnecessary files of this model only, as other scripts may run concurrently
+extensions = ["2-2-mnl-II-final*.html", "2-2-mnl-II-final*.pickle", "__2-2-mnl-II-final*.iter"]
 for ext in extensions:
     for file_path in glob.glob(os.path.join(ext)):
         try:
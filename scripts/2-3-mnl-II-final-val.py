@@ -18,6 +18,9 @@ from biogeme.expressions import (
     Variable,
 )
 
+# import prepared data reader
+from avchoice import read_prepared_data, variable_names
+
 # configure logging
 logging.basicConfig(
     filename='../outputs/2-3-mnl-II-final-val.log',  
@@ -27,13 +30,6 @@ logging.basicConfig(
 logging.info("Script execution started.")
 
 # ---------------------------------------------------------------------------------------------------------------------#
-# import prepared data
-df = pd.read_pickle("../data/prepared_data.pkl")
-df.describe
-
-# define the data as biogeme global database
-database = db.Database("mydata", df)
-
 # define the variables
 hv_tt = Variable("hv_tt")
 hv_tc = Variable("hv_tc")
@@ -81,6 +77,13 @@ av_fam = Variable("av_fam_std")
 tba_tot_diff = Variable("tba_tot_diff")
 ttu_diff = Variable("ttu_diff_std")
 
+# import prepared data, only the columns of the variables (memory-mapped from the columnar file)
+df = read_prepared_data(["id"] + variable_names(globals()))
+df.describe
+
+# define the data as biogeme global database
+database = db.Database("mydata", df)
+
 # ---------------------------------------------------------------------------------------------------------------------#
 ## 2-3-mnl-II-final-val
 # 5-fold cross-validation of 2-2-mnl-II-final
@@ -23,6 +23,11 @@ from biogeme.expressions import (
     exp,
 )
 
+# import native mixed logit engine
+from avchoice import DrawCache, PanelMixedLogit, ResultsStore, read_prepared_data, variable_names
+from avchoice.draws import random_number_generators
+from avchoice.startup import StartupProfile
+
 # configure logging
 logging.basicConfig(
     filename='../outputs/3-1-mxl-III.log',  
@@ -31,14 +36,11 @@ logging.basicConfig(
 )
 logging.info("Script execution started.")
 
-# ---------------------------------------------------------------------------------------------------------------------#
-# import prepared data
-df = pd.read_pickle("../data/prepared_data.pkl")
-df.describe
-
-# define the data as biogeme global database
-database = db.Database("mydata", df)
+# time of the startup phases, reported if AVCHOICE_PROFILE_STARTUP is set (run-pipeline.py --profile-startup)
+startup = StartupProfile()
+startup.mark("imports")
 
+# ---------------------------------------------------------------------------------------------------------------------#
 # define the variables
 hv_tt = Variable("hv_tt")
 hv_tc = Variable("hv_tc")
@@ -54,6 +56,34 @@ chosen = Variable("chosen")
 # specify number of draws
 number_of_draws = 20000
 
+# specify types of draws, e.g. TRIANGULAR_HALTON or NORMAL_SHALTON for quasi-random draws (see avchoice/draws.py)
+triangular_draws = "TRIANGULAR"
+normal_draws = "NORMAL"
+
+# estimation engine: "native" (numpy engine of avchoice) or "biogeme"
+estimation_engine = "native"
+
+# kernel of the native engine: "numpy", or "numba" for the compiled kernel of the probabilities and scores
+native_kernel = "numpy"
+
+# both engines take their draws from a persistent cache, so that the estimation, validation and elasticity
+# scripts use the same seeded draws for each person, and the draws are only generated once
+draw_seed = 0
+draw_cache = DrawCache("../data/draws", seed=draw_seed)
+
+# store of the native estimation results, read by the validation, elasticity and likelihood ratio test scripts; the
+# model is estimated again only if its specification, data or draws changed (or if reestimate is True)
+results_store = ResultsStore("../outputs")
+reestimate = False
+
+# import prepared data, only the columns of the variables (memory-mapped from the columnar file)
+df = read_prepared_data(["id"] + variable_names(globals()))
+df.describe
+
+# define the data as biogeme global database
+database = db.Database("mydata", df)
+startup.mark("data")
+
 # ---------------------------------------------------------------------------------------------------------------------#
 ## 3-1-mxl-III
 # mixed logit model with time and cost parameters only
@@ -63,46 +93,34 @@ number_of_draws = 20000
 # VOT space specification
 
 
-# define triangular distribution generator
-def the_triangular_generator(sample_size, number_of_draws):
-    """
-    Provide my own random number generator to the database.
-    """
-    return np.random.triangular(-1, 0, 1, (sample_size, number_of_draws))
-
-
-myRandomNumberGenerators = {
-    "TRIANGULAR": (
-        the_triangular_generator,
-        "Draws from a triangular distribution",
-    )
-}
+# random number generators: triangular and normal draws from pseudo-random or quasi-random sequences
+myRandomNumberGenerators = random_number_generators()
 database.set_random_number_generators(myRandomNumberGenerators)
 
 # parameters to be estimated
 # alternative specific constants
 asc_av = Beta("asc_av", -0.789, None, None, 0)
 s_asc_av = Beta("s_asc_av", 0.229, None, None, 0)
-asc_av_rnd = asc_av + s_asc_av * bioDraws("asv_av_rnd", "NORMAL")
+asc_av_rnd = asc_av + s_asc_av * bioDraws("asv_av_rnd", normal_draws)
 
 asc_avwl = Beta("asc_avwl", -0.584, None, None, 0)
 s_asc_avwl = Beta("s_asc_avwl", 1.54, None, None, 0)
-asc_avwl_rnd = asc_avwl + s_asc_avwl * bioDraws("asv_avwl_rnd", "NORMAL")
+asc_avwl_rnd = asc_avwl + s_asc_avwl * bioDraws("asv_avwl_rnd", normal_draws)
 
 # travel time and cost parameters
 b_cost = Beta("b_cost", -0.00584, None, None, 0)
 
 b_vot_hv = Beta("b_vot_hv", 48.9, None, None, 0)
 sigma_vot_hv = Beta("sigma_vot_hv", 171, None, None, 0)
-b_vot_hv_rnd = b_vot_hv + sigma_vot_hv * bioDraws("b_vot_hv_rnd", "TRIANGULAR")
+b_vot_hv_rnd = b_vot_hv + sigma_vot_hv * bioDraws("b_vot_hv_rnd", triangular_draws)
 
 b_vot_av = Beta("b_vot_av", 34, None, None, 0)
 sigma_vot_av = Beta("sigma_vot_av", -21.6, None, None, 0)
-b_vot_av_rnd = b_vot_av + sigma_vot_av * bioDraws("b_vot_av_rnd", "TRIANGULAR")
+b_vot_av_rnd = b_vot_av + sigma_vot_av * bioDraws("b_vot_av_rnd", triangular_draws)
 
 b_vot_avwl = Beta("b_vot_avwl", 32.1, None, None, 0)
 sigma_vot_avwl = Beta("sigma_vot_avwl", -13.9, None, None, 0)
-b_vot_avwl_rnd = b_vot_avwl + sigma_vot_avwl * bioDraws("b_vot_avwl_rnd", "TRIANGULAR")
+b_vot_avwl_rnd = b_vot_avwl + sigma_vot_avwl * bioDraws("b_vot_avwl_rnd", triangular_draws)
 
 # define utility functions
 v1 = b_cost * b_vot_hv_rnd * hv_tt + b_cost * hv_tc
@@ -124,18 +142,38 @@ condprobIndiv = PanelLikelihoodTrajectory(obsprob)
 logprob = log(MonteCarlo(condprobIndiv))
 
 # estimate the model
-biogeme = bio.BIOGEME(database, logprob, number_of_draws=number_of_draws)
-# biogeme.loadSavedIteration()
-biogeme.modelName = "3-1-mxl-III"
+if estimation_engine == "native":
+    engine = PanelMixedLogit.from_biogeme(
+        database,
+        v,
+        av,
+        chosen,
+        number_of_draws,
+        model_name="3-1-mxl-III",
+        draw_cache=draw_cache,
+        kernel=native_kernel,
+    )
+    startup.report("model and draws")
+    results = results_store.get_or_estimate(engine, force=reestimate)
+
+    # get the results in a pandas table
+    print(results.get_estimated_parameters())
+
+else:
+    draw_cache.attach(database)
+    biogeme = bio.BIOGEME(database, logprob, number_of_draws=number_of_draws)
+    startup.report("model and draws")
+    # biogeme.loadSavedIteration()
+    biogeme.modelName = "3-1-mxl-III"
 
-# get the results in a pandas table
-print(biogeme.estimate().getEstimatedParameters())
+    # get the results in a pandas table
+    print(biogeme.estimate().getEstimatedParameters())
 
-# move outpts to outputs folder
-shutil.move("3-1-mxl-III.html", "../outputs/3-1-mxl-III.html")
+    # move outpts to outputs folder
+    shutil.move("3-1-mxl-III.html", "../outputs/3-1-mxl-III.html")
 
-# remove intermediate outputs
-os.remove("3-1-mxl-III.pickle")
-os.remove("__3-1-mxl-III.iter")
+    # remove intermediate outputs
+    os.remove("3-1-mxl-III.pickle")
+    os.remove("__3-1-mxl-III.iter")
 
 # ---------------------------------------------------------------------------------------------------------------------#
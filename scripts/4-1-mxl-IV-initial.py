@@ -23,6 +23,12 @@ from biogeme.expressions import (
     exp,
 )
 
+# import draw generators
+from avchoice.draws import random_number_generators
+
+# import prepared data reader
+from avchoice import read_prepared_data, variable_names
+
 # configure logging
 logging.basicConfig(
     filename='../output/4-1-mxl-IV-initial.log',  
@@ -32,13 +38,6 @@ logging.basicConfig(
 logging.info("Script execution started.")
 
 # ---------------------------------------------------------------------------------------------------------------------#
-# import prepared data
-df = pd.read_pickle("../data/prepared_data.pkl")
-df.describe
-
-# define the data as biogeme global database
-database = db.Database("mydata", df)
-
 # define the variables
 hv_tt = Variable("hv_tt")
 hv_tc = Variable("hv_tc")
@@ -89,6 +88,17 @@ ttu_diff = Variable("ttu_diff_std")
 # specify number of draws
 number_of_draws = 1000
 
+# specify types of draws, e.g. TRIANGULAR_HALTON or NORMAL_SHALTON for quasi-random draws (see avchoice/draws.py)
+triangular_draws = "TRIANGULAR"
+normal_draws = "NORMAL"
+
+# import prepared data, only the columns of the variables (memory-mapped from the columnar file)
+df = read_prepared_data(["id"] + variable_names(globals()))
+df.describe
+
+# define the data as biogeme global database
+database = db.Database("mydata", df)
+
 # ---------------------------------------------------------------------------------------------------------------------#
 ## 4-1-mxl-IV-initial
 # mixed logit model with sociodemographics as ASC
@@ -99,20 +109,8 @@ number_of_draws = 1000
 # VOT space specification
 
 
-# define triangular distribution generator
-def the_triangular_generator(sample_size, number_of_draws):
-    """
-    Provide my own random number generator to the database.
-    """
-    return np.random.triangular(-1, 0, 1, (sample_size, number_of_draws))
-
-
-myRandomNumberGenerators = {
-    "TRIANGULAR": (
-        the_triangular_generator,
-        "Draws from a triangular distribution",
-    )
-}
+# random number generators: triangular and normal draws from pseudo-random or quasi-random sequences
+myRandomNumberGenerators = random_number_generators()
 database.set_random_number_generators(myRandomNumberGenerators)
 
 # parameters to be estimated
@@ -126,13 +124,13 @@ s_asc_avwl = Beta("s_asc_avwl", 0.108, None, None, 0)
 b_cost = Beta("b_cost", -0.00584, None, None, 0)
 b_vot_hv = Beta("b_vot_hv", 0.731, None, None, 0)
 s_vot_hv = Beta("s_vot_hv", 2.55, None, None, 0)
-b_vot_hv_rnd = b_vot_hv + s_vot_hv * bioDraws("b_vot_hv_rnd", "TRIANGULAR")
+b_vot_hv_rnd = b_vot_hv + s_vot_hv * bioDraws("b_vot_hv_rnd", triangular_draws)
 b_vot_av = Beta("b_vot_av", 0.532, None, None, 0)
 s_vot_av = Beta("s_vot_av", 0.276, None, None, 0)
-b_vot_av_rnd = b_vot_av + s_vot_av * bioDraws("b_vot_av_rnd", "TRIANGULAR")
+b_vot_av_rnd = b_vot_av + s_vot_av * bioDraws("b_vot_av_rnd", triangular_draws)
 b_vot_avwl = Beta("b_vot_avwl", 0.492, None, None, 0)
 s_vot_avwl = Beta("s_vot_avwl", 0.108, None, None, 0)
-b_vot_avwl_rnd = b_vot_avwl + s_vot_avwl * bioDraws("b_vot_avwl_rnd", "TRIANGULAR")
+b_vot_avwl_rnd = b_vot_avwl + s_vot_avwl * bioDraws("b_vot_avwl_rnd", triangular_draws)
 
 # socio-demographic parameters
 b_age_grp_2_av = Beta("b_age_grp_2_av", -0.559, None, None, 0)
@@ -208,7 +206,7 @@ b_tba_tot_diff_avwl = Beta("b_tba_tot_diff_avwl", 0, None, None, 0)
 # random asc parameters
 asc_av_rnd = (
     asc_av
-    + s_asc_av * bioDraws("asv_av_rnd", "NORMAL")
+    + s_asc_av * bioDraws("asv_av_rnd", normal_draws)
     + b_age_grp_2_av * age_grp_2
     + b_age_grp_3_av * age_grp_3
     + b_race_1_av * race_1
@@ -246,7 +244,7 @@ asc_av_rnd = (
 )
 asc_avwl_rnd = (
     asc_avwl
-    + s_asc_avwl * bioDraws("asv_avwl_rnd", "NORMAL")
+    + s_asc_avwl * bioDraws("asv_avwl_rnd", normal_draws)
     + b_age_grp_2_avwl * age_grp_2
     + b_age_grp_3_avwl * age_grp_3
     + b_race_1_avwl * race_1
@@ -3,6 +3,9 @@
 from scipy.stats import chi2
 import logging
 
+# import store of the native estimation results
+from avchoice import ResultsStore
+
 # configure logging
 logging.basicConfig(
     filename='../outputs/4-5-lr-test.log',  
@@ -21,12 +24,41 @@ num_params_unconstrained = 30
 ll_constrained = -2242.22
 ll_unconstrained = -2265.24
 
+# statistics of the native estimations, when both models are in the results store, estimated on the same data with
+# the same draws (the draws shared by the models)
+results_store = ResultsStore("../outputs")
+results_constrained = results_store.get("4-4-mxl-IV-final-lr-test")
+results_unconstrained = results_store.get("4-2-mxl-IV-final")
+comparable = results_constrained is not None and results_unconstrained is not None
+if comparable:
+    fingerprint_constrained = results_store.fingerprint("4-4-mxl-IV-final-lr-test")
+    fingerprint_unconstrained = results_store.fingerprint("4-2-mxl-IV-final")
+    draws_constrained = fingerprint_constrained["draws"]
+    draws_unconstrained = fingerprint_unconstrained["draws"]
+    shared = set(draws_constrained["draw_types"]) & set(draws_unconstrained["draw_types"])
+    comparable = (
+        fingerprint_constrained["data_hash"] == fingerprint_unconstrained["data_hash"]
+        and draws_constrained["number_of_draws"] == draws_unconstrained["number_of_draws"]
+        and draws_constrained["draw_seed"] == draws_unconstrained["draw_seed"]
+        and all(draws_constrained["draw_types"][name] == draws_unconstrained["draw_types"][name] for name in shared)
+    )
+    if not comparable:
+        logging.warning("Stored results of the models have other data or draws, their log likelihoods are not used.")
+if comparable:
+    num_params_constrained = len(results_constrained.beta_names)
+    num_params_unconstrained = len(results_unconstrained.beta_names)
+    ll_constrained = results_constrained.loglike
+    ll_unconstrained = results_unconstrained.loglike
+    logging.info("Log likelihoods read from the results store.")
+
 
 # difference in number of parameters between the two models
 num_params_difference = num_params_unconstrained - num_params_constrained
 
 # likelihood ratio test statistic
-lr_statistic = -2 * ((ll_unconstrained) - (ll_constrained))
+lr_statistic = 2 * ((ll_unconstrained) - (ll_constrained))
+if lr_statistic < 0:
+    logging.warning("The constrained model has the higher log likelihood (simulation noise or no convergence).")
 
 # p-value from the Chi-squared distribution
 p_value = 1 - chi2.cdf(lr_statistic, num_params_difference)
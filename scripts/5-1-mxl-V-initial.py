@@ -23,6 +23,12 @@ from biogeme.expressions import (
     exp,
 )
 
+# import draw generators
+from avchoice.draws import random_number_generators
+
+# import prepared data reader
+from avchoice import read_prepared_data, variable_names
+
 # configure logging
 logging.basicConfig(
     filename='../outputs/5-1-mxl-V-initial.log',  
@@ -32,13 +38,6 @@ logging.basicConfig(
 logging.info("Script execution started.")
 
 # ---------------------------------------------------------------------------------------------------------------------#
-# import prepared data
-df = pd.read_pickle("../data/prepared_data.pkl")
-df.describe
-
-# define the data as biogeme global database
-database = db.Database("mydata", df)
-
 # define the variables
 hv_tt = Variable("hv_tt")
 hv_tc = Variable("hv_tc")
@@ -74,6 +73,17 @@ tba_tot_av = Variable("tba_tot_av")
 # specify number of draws
 number_of_draws = 5000
 
+# specify types of draws, e.g. TRIANGULAR_HALTON or NORMAL_SHALTON for quasi-random draws (see avchoice/draws.py)
+triangular_draws = "TRIANGULAR"
+normal_draws = "NORMAL"
+
+# import prepared data, only the columns of the variables (memory-mapped from the columnar file)
+df = read_prepared_data(["id"] + variable_names(globals()))
+df.describe
+
+# define the data as biogeme global database
+database = db.Database("mydata", df)
+
 # ---------------------------------------------------------------------------------------------------------------------#
 ## 5-1-mxl-V-initial
 # mixed logit model considering heterogeniety in VOT parameters
@@ -84,30 +94,18 @@ number_of_draws = 5000
 # heterogeneity in VOT
 
 
-# define triangular distribution generator
-def the_triangular_generator(sample_size, number_of_draws):
-    """
-    Provide my own random number generator to the database.
-    """
-    return np.random.triangular(-1, 0, 1, (sample_size, number_of_draws))
-
-
-myRandomNumberGenerators = {
-    "TRIANGULAR": (
-        the_triangular_generator,
-        "Draws from a triangular distribution",
-    )
-}
+# random number generators: triangular and normal draws from pseudo-random or quasi-random sequences
+myRandomNumberGenerators = random_number_generators()
 database.set_random_number_generators(myRandomNumberGenerators)
 
 # parameters to be estimated
 # alternative specific constants
 asc_av = Beta("asc_av", 0, None, None, 0)
 s_asc_av = Beta("s_asc_av", 1, None, None, 0)
-asc_av_rnd = asc_av + s_asc_av * bioDraws("asv_av_rnd", "NORMAL")
+asc_av_rnd = asc_av + s_asc_av * bioDraws("asv_av_rnd", normal_draws)
 asc_avwl = Beta("asc_avwl", 0, None, None, 0)
 s_asc_avwl = Beta("s_asc_avwl", 1, None, None, 0)
-asc_avwl_rnd = asc_avwl + s_asc_avwl * bioDraws("asv_av_rnd", "NORMAL")
+asc_avwl_rnd = asc_avwl + s_asc_avwl * bioDraws("asv_av_rnd", normal_draws)
 
 # travel time and cost parameters
 b_cost = Beta("b_cost", -0.00324, None, None, 0)
@@ -154,7 +152,7 @@ b_tba_tot_avwl = Beta("b_tba_tot_avwl", 0, None, None, 0)
 # random VOT parameters
 b_vot_hv_rnd = (
     b_vot_hv
-    + s_vot_hv * bioDraws("b_vot_hv_rnd", "TRIANGULAR")
+    + s_vot_hv * bioDraws("b_vot_hv_rnd", triangular_draws)
     + b_tba_g1_hv * tba_g1_hv
     + b_tba_g2_hv * tba_g2_hv
     + b_tba_g3_hv * tba_g3_hv
@@ -166,7 +164,7 @@ b_vot_hv_rnd = (
 )
 b_vot_av_rnd = (
     b_vot_av
-    + s_vot_av * bioDraws("b_vot_av_rnd", "TRIANGULAR")
+    + s_vot_av * bioDraws("b_vot_av_rnd", triangular_draws)
     + b_tba_g1_av * tba_g1_av
     + b_tba_g2_av * tba_g2_av
     + b_tba_g3_av * tba_g3_av
@@ -178,7 +176,7 @@ b_vot_av_rnd = (
 )
 b_vot_avwl_rnd = (
     b_vot_avwl
-    + s_vot_avwl * bioDraws("b_vot_avwl_rnd", "TRIANGULAR")
+    + s_vot_avwl * bioDraws("b_vot_avwl_rnd", triangular_draws)
     + b_tba_g1_avwl * tba_g1_av
     + b_tba_g2_avwl * tba_g2_av
     + b_tba_g3_avwl * tba_g3_av
@@ -23,6 +23,11 @@ from biogeme.expressions import (
     exp,
 )
 
+# import native mixed logit engine
+from avchoice import DrawCache, PanelMixedLogit, ResultsStore, read_prepared_data, variable_names
+from avchoice.draws import random_number_generators
+from avchoice.startup import StartupProfile
+
 # configure logging
 logging.basicConfig(
     filename='../outputs/5-2-mxl-V-final.log',  
@@ -31,14 +36,11 @@ logging.basicConfig(
 )
 logging.info("Script execution started.")
 
-# ---------------------------------------------------------------------------------------------------------------------#
-# import prepared data
-df = pd.read_pickle("../data/prepared_data.pkl")
-df.describe
-
-# define the data as biogeme global database
-database = db.Database("mydata", df)
+# time of the startup phases, reported if AVCHOICE_PROFILE_STARTUP is set (run-pipeline.py --profile-startup)
+startup = StartupProfile()
+startup.mark("imports")
 
+# ---------------------------------------------------------------------------------------------------------------------#
 # define the variables
 hv_tt = Variable("hv_tt")
 hv_tc = Variable("hv_tc")
@@ -74,34 +76,50 @@ tba_tot_av = Variable("tba_tot_av")
 # specify number of draws
 number_of_draws = 10000
 
+# specify types of draws, e.g. TRIANGULAR_HALTON or NORMAL_SHALTON for quasi-random draws (see avchoice/draws.py)
+triangular_draws = "TRIANGULAR"
+normal_draws = "NORMAL"
+
+# estimation engine: "native" (numpy engine of avchoice) or "biogeme"
+estimation_engine = "native"
+
+# kernel of the native engine: "numpy", or "numba" for the compiled kernel of the probabilities and scores
+native_kernel = "numpy"
+
+# both engines take their draws from a persistent cache, so that the estimation, validation and elasticity
+# scripts use the same seeded draws for each person, and the draws are only generated once
+draw_seed = 0
+draw_cache = DrawCache("../data/draws", seed=draw_seed)
+
+# store of the native estimation results, read by the validation, elasticity and likelihood ratio test scripts; the
+# model is estimated again only if its specification, data or draws changed (or if reestimate is True)
+results_store = ResultsStore("../outputs")
+reestimate = False
+
+# import prepared data, only the columns of the variables (memory-mapped from the columnar file)
+df = read_prepared_data(["id"] + variable_names(globals()))
+df.describe
+
+# define the data as biogeme global database
+database = db.Database("mydata", df)
+startup.mark("data")
+
 # ---------------------------------------------------------------------------------------------------------------------#
 ## 5-2-mxl-V-final
 # 5-2-mxl-V-final with significant parameters only 
 
-# define triangular distribution generator
-def the_triangular_generator(sample_size, number_of_draws):
-    """
-    Provide my own random number generator to the database.
-    """
-    return np.random.triangular(-1, 0, 1, (sample_size, number_of_draws))
-
-
-myRandomNumberGenerators = {
-    "TRIANGULAR": (
-        the_triangular_generator,
-        "Draws from a triangular distribution",
-    )
-}
+# random number generators: triangular and normal draws from pseudo-random or quasi-random sequences
+myRandomNumberGenerators = random_number_generators()
 database.set_random_number_generators(myRandomNumberGenerators)
 
 # parameters to be estimated
 # alternative specific constants
 asc_av = Beta("asc_av", 0, None, None, 0)
 s_asc_av = Beta("s_asc_av", 1, None, None, 0)
-asc_av_rnd = asc_av + s_asc_av * bioDraws("asv_av_rnd", "NORMAL")
+asc_av_rnd = asc_av + s_asc_av * bioDraws("asv_av_rnd", normal_draws)
 asc_avwl = Beta("asc_avwl", 0, None, None, 0)
 s_asc_avwl = Beta("s_asc_avwl", 1, None, None, 0)
-asc_avwl_rnd = asc_avwl + s_asc_avwl * bioDraws("asv_av_rnd", "NORMAL")
+asc_avwl_rnd = asc_avwl + s_asc_avwl * bioDraws("asv_av_rnd", normal_draws)
 
 # travel time and cost parameters
 b_cost = Beta("b_cost", -0.00324, None, None, 0)
@@ -148,18 +166,18 @@ b_tba_tot_avwl = Beta("b_tba_tot_avwl", 0, None, None, 0)
 # random VOT parameters
 b_vot_hv_rnd = (
     b_vot_hv
-    + s_vot_hv * bioDraws("b_vot_hv_rnd", "TRIANGULAR")
+    + s_vot_hv * bioDraws("b_vot_hv_rnd", triangular_draws)
     + b_ttu_hv * ttu_hv
 )
 b_vot_av_rnd = (
     b_vot_av
-    + s_vot_av * bioDraws("b_vot_av_rnd", "TRIANGULAR")
+    + s_vot_av * bioDraws("b_vot_av_rnd", triangular_draws)
     + b_tba_g4_av * tba_g4_av
     + b_ttu_av * ttu_av
 )
 b_vot_avwl_rnd = (
     b_vot_avwl
-    + s_vot_avwl * bioDraws("b_vot_avwl_rnd", "TRIANGULAR")
+    + s_vot_avwl * bioDraws("b_vot_avwl_rnd", triangular_draws)
     + b_tba_g4_avwl * tba_g4_av
     + b_ttu_avwl * ttu_av
 )
@@ -184,18 +202,38 @@ condprobIndiv = PanelLikelihoodTrajectory(obsprob)
 logprob = log(MonteCarlo(condprobIndiv))
 
 # estimate the model
-biogeme = bio.BIOGEME(database, logprob, number_of_draws=number_of_draws)
-# biogeme.loadSavedIteration()
-biogeme.modelName = "5-2-mxl-V-final"
+if estimation_engine == "native":
+    engine = PanelMixedLogit.from_biogeme(
+        database,
+        v,
+        av,
+        chosen,
+        number_of_draws,
+        model_name="5-2-mxl-V-final",
+        draw_cache=draw_cache,
+        kernel=native_kernel,
+    )
+    startup.report("model and draws")
+    results = results_store.get_or_estimate(engine, force=reestimate, second_derivatives="exact")
+
+    # get the results in a pandas table, with robust t-stats from the analytic hessian and BHHH matrix
+    print(results.get_estimated_parameters())
+
+else:
+    draw_cache.attach(database)
+    biogeme = bio.BIOGEME(database, logprob, number_of_draws=number_of_draws)
+    startup.report("model and draws")
+    # biogeme.loadSavedIteration()
+    biogeme.modelName = "5-2-mxl-V-final"
 
-# get the results in a pandas table
-print(biogeme.estimate().getEstimatedParameters())
+    # get the results in a pandas table
+    print(biogeme.estimate().getEstimatedParameters())
 
-# move outpts to outputs folder
-shutil.move("5-2-mxl-V-final.html", "../outputs/5-2-mxl-V-final.html")
+    # move outpts to outputs folder
+    shutil.move("5-2-mxl-V-final.html", "../outputs/5-2-mxl-V-final.html")
 
-# remove intermediate outputs
-os.remove("5-2-mxl-V-final.pickle")
-os.remove("__5-2-mxl-V-final.iter")
+    # remove intermediate outputs
+    os.remove("5-2-mxl-V-final.pickle")
+    os.remove("__5-2-mxl-V-final.iter")
 
 # ---------------------------------------------------------------------------------------------------------------------#
@@ -4,7 +4,6 @@ import pandas as pd
 import shutil
 import os
 import numpy as np
-from sklearn.model_selection import GroupKFold
 import logging
 
 # import biogeme modules
@@ -23,6 +22,9 @@ from biogeme.expressions import (
     exp,
 )
 
+# import fold-parallel cross-validation and draw cache
+from avchoice import DrawCache, ResultsStore, cross_validate, read_prepared_data, variable_names
+
 # configure logging
 logging.basicConfig(
     filename='../outputs/5-3-mxl-V-final-val.log',  
@@ -32,13 +34,6 @@ logging.basicConfig(
 logging.info("Script execution started.")
 
 # ---------------------------------------------------------------------------------------------------------------------#
-# import prepared data
-df = pd.read_pickle("../data/prepared_data.pkl")
-df.describe
-
-# define the data as biogeme global database
-database = db.Database("mydata", df)
-
 # define the variables
 hv_tt = Variable("hv_tt")
 hv_tc = Variable("hv_tc")
@@ -74,25 +69,45 @@ tba_tot_av = Variable("tba_tot_av")
 # specify number of draws
 number_of_draws = 10000
 
-# ---------------------------------------------------------------------------------------------------------------------#
-## 5-3-mxl-V-final-val
-# 5-fold cross-validation of 5-2-mxl-V-final
+# specify types of draws, e.g. TRIANGULAR_HALTON or NORMAL_SHALTON for quasi-random draws (see avchoice/draws.py)
+triangular_draws = "TRIANGULAR"
+normal_draws = "NORMAL"
 
-# define triangular distribution generator
-def the_triangular_generator(sample_size, number_of_draws):
-    """
-    Provide my own random number generator to the database.
-    """
-    return np.random.triangular(-1, 0, 1, (sample_size, number_of_draws))
+# estimation engine: "native" (numpy engine of avchoice) or "biogeme"
+estimation_engine = "native"
 
+# kernel of the native engine: "numpy", or "numba" for the compiled kernel of the probabilities and scores
+native_kernel = "numpy"
 
-myRandomNumberGenerators = {
-    "TRIANGULAR": (
-        the_triangular_generator,
-        "Draws from a triangular distribution",
-    )
-}
+# number of folds estimated concurrently, each in its own process (None: one per fold within the number of cores)
+cv_workers = None
+
+# the native engine takes its draws from the persistent cache of the estimation script, so that each person keeps
+# the same draws in the full sample and in every fold
+draw_seed = 0
+draw_cache = DrawCache("../data/draws", seed=draw_seed)
+
+# start the folds from the full-sample estimates of 5-2-mxl-V-final (from the store of its native estimation),
+# and optionally BFGS from the full-sample inverse hessian
+results_store = ResultsStore("../outputs")
+warm_start_hessian = True
 
+# the folds of the native engine are checkpointed, and resume from their checkpoints if the script is interrupted
+checkpoint_directory = "../outputs/checkpoints"
+
+# telemetry of the folds of the native engine, next to the log (see telemetry-summary.py)
+telemetry_directory = "../outputs"
+
+# import prepared data, only the columns of the variables (memory-mapped from the columnar file)
+df = read_prepared_data(["id"] + variable_names(globals()))
+df.describe
+
+# define the data as biogeme global database
+database = db.Database("mydata", df)
+
+# ---------------------------------------------------------------------------------------------------------------------#
+## 5-3-mxl-V-final-val
+# 5-fold cross-validation of 5-2-mxl-V-final
 
 # function to get utility equations
 def get_biogeme_model():
@@ -101,10 +116,10 @@ def get_biogeme_model():
     # alternative specific constants
     asc_av = Beta("asc_av", 0, None, None, 0)
     s_asc_av = Beta("s_asc_av", 1, None, None, 0)
-    asc_av_rnd = asc_av + s_asc_av * bioDraws("asv_av_rnd", "NORMAL")
+    asc_av_rnd = asc_av + s_asc_av * bioDraws("asv_av_rnd", normal_draws)
     asc_avwl = Beta("asc_avwl", 0, None, None, 0)
     s_asc_avwl = Beta("s_asc_avwl", 1, None, None, 0)
-    asc_avwl_rnd = asc_avwl + s_asc_avwl * bioDraws("asv_av_rnd", "NORMAL")
+    asc_avwl_rnd = asc_avwl + s_asc_avwl * bioDraws("asv_av_rnd", normal_draws)
 
     # travel time and cost parameters
     b_cost = Beta("b_cost", -0.00324, None, None, 0)
@@ -151,18 +166,18 @@ def get_biogeme_model():
     # random VOT parameters
     b_vot_hv_rnd = (
         b_vot_hv
-        + s_vot_hv * bioDraws("b_vot_hv_rnd", "TRIANGULAR")
+        + s_vot_hv * bioDraws("b_vot_hv_rnd", triangular_draws)
         + b_ttu_hv * ttu_hv
     )
     b_vot_av_rnd = (
         b_vot_av
-        + s_vot_av * bioDraws("b_vot_av_rnd", "TRIANGULAR")
+        + s_vot_av * bioDraws("b_vot_av_rnd", triangular_draws)
         + b_tba_g4_av * tba_g4_av
         + b_ttu_av * ttu_av
     )
     b_vot_avwl_rnd = (
         b_vot_avwl
-        + s_vot_avwl * bioDraws("b_vot_avwl_rnd", "TRIANGULAR")
+        + s_vot_avwl * bioDraws("b_vot_avwl_rnd", triangular_draws)
         + b_tba_g4_avwl * tba_g4_av
         + b_ttu_avwl * ttu_av
     )
@@ -178,53 +193,29 @@ def get_biogeme_model():
     # availability of each alternatives
     av = {1: hv_av, 2: av_av, 3: avwl_av}
 
-    # define the model
-    obsprob = models.logit(v, av, chosen)
-
-    # return model
-    return obsprob
-
-# split data for five-fold cross-validaiton
-kf = GroupKFold(n_splits=5)
-
-# fit model for each splits
-for train_index, test_index in kf.split(df, groups=df["id"]):
-    
-    # train and test splits
-    train_data, test_data = df.iloc[train_index], df.iloc[test_index]
-
-    # set train split as the database
-    database = db.Database("mydata", train_data)
-    database.panel("id")
-    database.set_random_number_generators(myRandomNumberGenerators)
-
-    # define loglikelihood
-    obsprob = get_biogeme_model()
-    condprobIndiv = PanelLikelihoodTrajectory(obsprob)
-    logprob = log(MonteCarlo(condprobIndiv))
-    
-    # estimate the model on train data
-    biogeme = bio.BIOGEME(database, logprob, number_of_draws=number_of_draws)
-    biogeme.modelName = "5-3-mxl-V-final-val"
-    results = biogeme.estimate()
-    betas = results.get_beta_values()
-    train_loglik = results.data.logLike
-    logging.info(f"Log likelihood for {database.get_number_of_observations()} training data: {train_loglik}")
-
-    # set test split as the database
-    database = db.Database("mydata", test_data)
-    database.panel("id")
-    database.set_random_number_generators(myRandomNumberGenerators)
-
-    # simulate log likelihood for test data
-    simulate = {"Loglikelihood": logprob}
-    sim_biogeme = bio.BIOGEME(database,simulate)
-    sim_result = sim_biogeme.simulate(the_beta_values=betas)
-    test_loglik = sim_result["Loglikelihood"].sum()
-    logging.info(f"Log likelihood for {database.get_number_of_observations()} validation data: {test_loglik}")
-
-    # remove intermediate outputs
-    os.remove("5-3-mxl-V-final-val.pickle")
-    os.remove("5-3-mxl-V-final-val.html")
+    # return utilities and availabilities
+    return v, av
+
+# full-sample estimates
+warm_start = results_store.get("5-2-mxl-V-final")
+
+# estimate the five folds concurrently, and gather the train and validation log likelihoods
+cv_results = cross_validate(
+    df,
+    get_biogeme_model,
+    chosen,
+    number_of_draws,
+    "5-3-mxl-V-final-val",
+    n_splits=5,
+    workers=cv_workers,
+    engine=estimation_engine,
+    kernel=native_kernel,
+    draw_cache=draw_cache,
+    warm_start=warm_start,
+    warm_start_hessian=warm_start_hessian,
+    checkpoint_directory=checkpoint_directory,
+    telemetry_directory=telemetry_directory,
+)
+print(cv_results)
 
 # ---------------------------------------------------------------------------------------------------------------------#
@@ -0,0 +1,12 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Helper modules shared by the choice modeling scripts.
+# ---------------------------------------------------------------------------------------------------------------------#
+from .cross_validation import cross_validate
+from .draw_cache import DrawCache
+from .draws import generate_draws, random_number_generators
+from .factor_scores import FactorScoreCache
+from .mixed_logit import EstimationResults, PanelMixedLogit
+from .prepared_data import read_prepared_data, variable_names, write_prepared_data
+from .results_store import ResultsStore
+from .specification import ModelSpecification
+from .terms import Term, linearize
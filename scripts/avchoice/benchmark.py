@@ -0,0 +1,420 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Benchmarks of the native engine on the model families, compared with a stored baseline.
+#
+# Each benchmark estimates the model of a family (1-1 and 2-2 multinomial logit, 3-1, 4-2 and 5-2 mixed logit) on
+# synthetic data of a fixed size (see synthetic.py), with a fixed number of draws, and records the latency of an
+# evaluation of the log likelihood and of its gradient (median of repeated evaluations at the starting values), the
+# iterations to convergence, the final log likelihood and the peak resident memory. Each benchmark runs in its own
+# process, so that the peak memory is that of the benchmark only.
+#
+# The models are those of the scripts, declared as specifications (see specification.py) so that the workload of the
+# benchmarks does not change with a script. A benchmark is compared with the baseline only when its workload (model,
+# data size, draws, seed, floating point type and threads) is the same, and is flagged as a regression when a latency,
+# the memory or the iterations grow by more than the threshold, or when the log likelihood changes. The kernel of the
+# evaluations is not part of the workload, so that a run with the numba kernel is compared with a baseline of numpy.
+# ---------------------------------------------------------------------------------------------------------------------#
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from .mxl_iv import MXL_IV_FINAL
+from .specification import ModelSpecification
+
+logger = logging.getLogger(__name__)
+
+# utilities of the VOT-space models, with the random or fixed VOTs (vot_hv, vot_av, vot_avwl) and alternative specific
+# constants (asc_av, asc_avwl) as components
+_UTILITIES = {
+    1: [("b_cost", "vot_hv", "hv_tt"), ("b_cost", "hv_tc")],
+    2: [("asc_av_par",), ("b_cost", "vot_av", "av_tt"), ("b_cost", "av_tc")],
+    3: [("asc_avwl_par",), ("b_cost", "vot_avwl", "avwl_tt"), ("b_cost", "avwl_tc")],
+}
+_AVAILABILITY = {1: "hv_av", 2: "av_av", 3: "avwl_av"}
+
+# 1-1: multinomial logit with time and cost parameters only
+MNL_I = ModelSpecification(
+    name="1-1-mnl-I",
+    betas={"asc_av": 0, "asc_avwl": 0, "b_vot_hv": 0, "b_vot_av": 0, "b_vot_avwl": 0, "b_cost": 0},
+    draws={},
+    components={
+        "vot_hv": [("b_vot_hv",)],
+        "vot_av": [("b_vot_av",)],
+        "vot_avwl": [("b_vot_avwl",)],
+        "asc_av_par": [("asc_av",)],
+        "asc_avwl_par": [("asc_avwl",)],
+    },
+    utilities=_UTILITIES,
+    availability=_AVAILABILITY,
+)
+
+# 2-2: multinomial logit with the significant socio-demographic and attitudinal covariates of the constants
+MNL_II_FINAL = ModelSpecification(
+    name="2-2-mnl-II-final",
+    betas={
+        "asc_av": 0,
+        "asc_avwl": 0,
+        "b_vot_hv": 0,
+        "b_vot_av": 0,
+        "b_vot_avwl": 0,
+        "b_cost": 0,
+        "b_age_grp_2_av": -0.559,
+        "b_age_grp_3_av": -1.46,
+        "b_gender_1_av": -0.19,
+        "b_school_2_av": 1.13,
+        "b_school_3_av": 0.226,
+        "b_hh_child_av": 0.226,
+        "b_crash_exp_av": 0,
+        "b_mode_commute_3_av": 0,
+        "b_mode_social_3_av": 0,
+        "b_av_usefulness_av": 0,
+        "b_av_concern_av": 0,
+        "b_polychronicity_av": 0,
+        "b_envt_concern_av": 0,
+        "b_tba_tot_diff_av": 0,
+        "b_ttu_diff_av": 0,
+        "b_age_grp_2_avwl": -0.663,
+        "b_age_grp_3_avwl": -2.08,
+        "b_gender_1_avwl": -0.231,
+        "b_school_3_avwl": -0.0875,
+        "b_citation_avwl": 0,
+        "b_crash_exp_avwl": 0,
+        "b_mode_shopping_3_avwl": 0,
+        "b_mode_social_3_avwl": 0,
+        "b_av_usefulness_avwl": 0,
+        "b_av_concern_avwl": 0,
+        "b_envt_concern_avwl": 0,
+        "b_av_fam_avwl": 0,
+        "b_tba_tot_diff_avwl": 0,
+        "b_ttu_diff_avwl": 0,
+    },
+    draws={},
+    components={
+        "vot_hv": [("b_vot_hv",)],
+        "vot_av": [("b_vot_av",)],
+        "vot_avwl": [("b_vot_avwl",)],
+        "asc_av_par": [
+            ("asc_av",),
+            ("b_age_grp_2_av", "age_grp_2"),
+            ("b_age_grp_3_av", "age_grp_3"),
+            ("b_gender_1_av", "gender_1"),
+            ("b_school_2_av", "school_2"),
+            ("b_school_3_av", "school_3"),
+            ("b_hh_child_av", "hh_child"),
+            ("b_crash_exp_av", "crash_exp"),
+            ("b_mode_commute_3_av", "mode_commute_3"),
+            ("b_mode_social_3_av", "mode_social_3"),
+            ("b_av_usefulness_av", "av_usefulness_std"),
+            ("b_av_concern_av", "av_concern_std"),
+            ("b_polychronicity_av", "polychronicity_std"),
+            ("b_envt_concern_av", "envt_concern_std"),
+            ("b_tba_tot_diff_av", "tba_tot_diff"),
+            ("b_ttu_diff_av", "ttu_diff_std"),
+        ],
+        "asc_avwl_par": [
+            ("asc_avwl",),
+            ("b_age_grp_2_avwl", "age_grp_2"),
+            ("b_age_grp_3_avwl", "age_grp_3"),
+            ("b_gender_1_avwl", "gender_1"),
+            ("b_school_3_avwl", "school_3"),
+            ("b_citation_avwl", "citation"),
+            ("b_crash_exp_avwl", "crash_exp"),
+            ("b_mode_shopping_3_avwl", "mode_shopping_3"),
+            ("b_mode_social_3_avwl", "mode_social_3"),
+            ("b_av_usefulness_avwl", "av_usefulness_std"),
+            ("b_av_concern_avwl", "av_concern_std"),
+            ("b_envt_concern_avwl", "envt_concern_std"),
+            ("b_av_fam_avwl", "av_fam_std"),
+            ("b_tba_tot_diff_avwl", "tba_tot_diff"),
+            ("b_ttu_diff_avwl", "ttu_diff_std"),
+        ],
+    },
+    utilities=_UTILITIES,
+    availability=_AVAILABILITY,
+)
+
+# 3-1: mixed logit with triangular VOTs and normal constants
+MXL_III = ModelSpecification(
+    name="3-1-mxl-III",
+    betas={
+        "asc_av": -0.789,
+        "s_asc_av": 0.229,
+        "asc_avwl": -0.584,
+        "s_asc_avwl": 1.54,
+        "b_cost": -0.00584,
+        "b_vot_hv": 48.9,
+        "sigma_vot_hv": 171,
+        "b_vot_av": 34,
+        "sigma_vot_av": -21.6,
+        "b_vot_avwl": 32.1,
+        "sigma_vot_avwl": -13.9,
+    },
+    draws={
+        "b_vot_hv_rnd": "triangular",
+        "b_vot_av_rnd": "triangular",
+        "b_vot_avwl_rnd": "triangular",
+        "asv_av_rnd": "normal",
+        "asv_avwl_rnd": "normal",
+    },
+    components={
+        "vot_hv": [("b_vot_hv",), ("sigma_vot_hv", "b_vot_hv_rnd")],
+        "vot_av": [("b_vot_av",), ("sigma_vot_av", "b_vot_av_rnd")],
+        "vot_avwl": [("b_vot_avwl",), ("sigma_vot_avwl", "b_vot_avwl_rnd")],
+        "asc_av_par": [("asc_av",), ("s_asc_av", "asv_av_rnd")],
+        "asc_avwl_par": [("asc_avwl",), ("s_asc_avwl", "asv_avwl_rnd")],
+    },
+    utilities=_UTILITIES,
+    availability=_AVAILABILITY,
+)
+
+# 5-2: mixed logit with VOTs interacted with the time usefulness and in-vehicle activities, the constants sharing
+# their draws
+MXL_V_FINAL = ModelSpecification(
+    name="5-2-mxl-V-final",
+    betas={
+        "asc_av": 0,
+        "s_asc_av": 1,
+        "asc_avwl": 0,
+        "s_asc_avwl": 1,
+        "b_cost": -0.00324,
+        "b_vot_hv": 30,
+        "s_vot_hv": 1,
+        "b_vot_av": 30,
+        "s_vot_av": 1,
+        "b_vot_avwl": 30,
+        "s_vot_avwl": 1,
+        "b_tba_g4_av": 0,
+        "b_tba_g4_avwl": 0,
+        "b_ttu_hv": 0,
+        "b_ttu_av": 0,
+        "b_ttu_avwl": 0,
+    },
+    draws={
+        "b_vot_hv_rnd": "triangular",
+        "b_vot_av_rnd": "triangular",
+        "b_vot_avwl_rnd": "triangular",
+        "asv_av_rnd": "normal",
+    },
+    components={
+        "vot_hv": [("b_vot_hv",), ("s_vot_hv", "b_vot_hv_rnd"), ("b_ttu_hv", "ttu_hv_std")],
+        "vot_av": [
+            ("b_vot_av",),
+            ("s_vot_av", "b_vot_av_rnd"),
+            ("b_tba_g4_av", "tba_g4_av_cat"),
+            ("b_ttu_av", "ttu_av_std"),
+        ],
+        "vot_avwl": [
+            ("b_vot_avwl",),
+            ("s_vot_avwl", "b_vot_avwl_rnd"),
+            ("b_tba_g4_avwl", "tba_g4_av_cat"),
+            ("b_ttu_avwl", "ttu_av_std"),
+        ],
+        "asc_av_par": [("asc_av",), ("s_asc_av", "asv_av_rnd")],
+        "asc_avwl_par": [("asc_avwl",), ("s_asc_avwl", "asv_av_rnd")],
+    },
+    utilities=_UTILITIES,
+    availability=_AVAILABILITY,
+)
+
+# benchmarks: name -> (specification, number of draws); with the default 2000 persons, the estimations stop in less
+# than 150 iterations, whereas with the 696 persons of the survey the VOTs of the synthetic data are too weakly
+# identified and the optimizer often runs to its maximum of iterations
+BENCHMARKS = {
+    "1-1": (MNL_I, 1),
+    "2-2": (MNL_II_FINAL, 1),
+    "3-1": (MXL_III, 100),
+    "4-2": (MXL_IV_FINAL, 100),
+    "5-2": (MXL_V_FINAL, 100),
+}
+
+# metrics compared with the baseline, a larger value being worse
+METRICS = ["function_ms", "gradient_ms", "iterations", "peak_memory_mb"]
+
+
+def machine():
+    """
+    Description of the machine, recorded with the results since the latencies are only comparable on one machine.
+    """
+    from .telemetry import threads
+
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "library_threads": threads()["library_threads"],
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def run_benchmark(
+    name, persons=2000, number_of_draws=None, repeats=5, seed=0, dtype="float64", threads=1, kernel="numpy"
+):
+    """
+    Run a benchmark in the current process.
+
+    :param name: benchmark, e.g. "4-2".
+    :param persons: respondents of the synthetic data (4 choice tasks each).
+    :param number_of_draws: draws of the mixed logit models, by default those of the benchmark.
+    :param repeats: evaluations of the log likelihood and its gradient timed at the starting values.
+    :param seed: seed of the data and of the draws.
+    :param dtype: floating point type of the evaluation, "float64" or "float32" (see PanelMixedLogit).
+    :param threads: threads evaluating the blocks of persons (see PanelMixedLogit).
+    :param kernel: kernel of the evaluations, "numpy" or "numba" (see PanelMixedLogit).
+    :return: dict of the workload and of the metrics.
+    """
+    from .mixed_logit import PanelMixedLogit
+    from .results_store import specification_hash
+    from .synthetic import model_data
+    from .telemetry import peak_memory
+
+    specification, default_draws = BENCHMARKS[name]
+    if specification.draws and number_of_draws is not None:
+        default_draws = number_of_draws
+    data = model_data(persons, seed=seed)
+    distributions = {"triangular": "TRIANGULAR", "normal": "NORMAL"}
+    engine = PanelMixedLogit.from_specification(
+        data, specification, default_draws, distributions, seed=seed, dtype=dtype, threads=threads, kernel=kernel
+    )
+
+    # latencies at the starting values, after a first evaluation
+    engine.person_scores(engine.start)
+    function, gradient = [], []
+    for _ in range(repeats):
+        before = dict(engine.timings)
+        engine.person_scores(engine.start)
+        function.append(engine.timings["function"] - before["function"])
+        gradient.append(engine.timings["gradient"] - before["gradient"])
+
+    started = time.perf_counter()
+    evaluations = engine.timings["evaluations"]
+    results = engine.estimate(second_derivatives=None)
+    return {
+        "benchmark": name,
+        "model": specification.name,
+        "spec_hash": specification_hash(engine),
+        "persons": persons,
+        "draws": engine.number_of_draws,
+        "seed": seed,
+        "dtype": dtype,
+        "threads": threads,
+        "kernel": kernel,
+        "function_ms": 1000 * float(np.median(function)),
+        "gradient_ms": 1000 * float(np.median(gradient)),
+        "iterations": int(results.iterations),
+        "evaluations": engine.timings["evaluations"] - evaluations,
+        "estimation_s": time.perf_counter() - started,
+        "loglike": results.loglike,
+        "converged": bool(results.converged),
+        "peak_memory_mb": peak_memory(),
+    }
+
+
+# run of a benchmark in a new process, which prints its result on the last line
+_CHILD = (
+    "import json, sys; from avchoice.benchmark import run_benchmark; "
+    "print(json.dumps(run_benchmark(*json.loads(sys.argv[1]))))"
+)
+
+
+def run_suite(
+    names=None, persons=2000, number_of_draws=None, repeats=5, seed=0, dtype="float64", threads=1, kernel="numpy"
+):
+    """
+    Run benchmarks, each in a new process.
+
+    :param names: benchmarks, by default all of BENCHMARKS.
+    :return: dict with the machine and the results, dict benchmark -> result (see run_benchmark).
+    """
+    names = list(BENCHMARKS) if not names else names
+    unknown = sorted(set(names) - set(BENCHMARKS))
+    if unknown:
+        raise ValueError(f"Unknown benchmarks {unknown}, expected some of {list(BENCHMARKS)}.")
+    results = {}
+    for name in names:
+        logger.info(f"Benchmark {name}: {persons} persons")
+        arguments = json.dumps([name, persons, number_of_draws, repeats, seed, dtype, threads, kernel])
+        process = subprocess.run(
+            [sys.executable, "-c", _CHILD, arguments],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stdout=subprocess.PIPE,
+            text=True,
+            check=True,
+        )
+        results[name] = json.loads(process.stdout.splitlines()[-1])
+        logger.info(f"Benchmark {name}: {json.dumps(results[name])}")
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": machine(),
+        "results": results,
+    }
+
+
+def save_results(suite, path):
+    """
+    Save the results of a suite, e.g. as the baseline, through a temporary file.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(suite, file, indent=4)
+    os.replace(temporary, path)
+
+
+def load_results(path):
+    """
+    Results of a suite saved by save_results, or None if there is no file.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(suite, baseline, threshold=0.2, loglike_tolerance=1e-4):
+    """
+    Comparison of the results of a suite with the baseline, one row per benchmark and metric.
+
+    :param threshold: relative growth of a metric flagged as a regression (a decrease of the same size being an
+        improvement).
+    :param loglike_tolerance: absolute change of the final log likelihood flagged as a regression.
+    :return: data frame with the benchmark, metric, baseline, current, ratio and status: ok, regression, improvement,
+        new (not in the baseline) or workload changed (not comparable).
+    """
+    rows = []
+    workload = ["model", "spec_hash", "persons", "draws", "seed", "threads"]
+    reference = (baseline or {}).get("results", {})
+    for name, result in suite["results"].items():
+        base = reference.get(name)
+        if base is None or any(base.get(key) != result.get(key) for key in workload):
+            status = "new" if base is None else "workload changed"
+            for metric in METRICS + ["loglike"]:
+                rows.append({"benchmark": name, "metric": metric, "current": result[metric], "status": status})
+            continue
+        for metric in METRICS:
+            if base[metric]:
+                ratio = result[metric] / base[metric]
+            else:
+                ratio = np.inf if result[metric] else 1.0
+            status = "regression" if ratio > 1 + threshold else "improvement" if ratio < 1 - threshold else "ok"
+            row = {"benchmark": name, "metric": metric, "baseline": base[metric], "current": result[metric]}
+            rows.append({**row, "ratio": ratio, "status": status})
+        changed = abs(result["loglike"] - base["loglike"]) > loglike_tolerance
+        row = {"benchmark": name, "metric": "loglike", "baseline": base["loglike"], "current": result["loglike"]}
+        rows.append({**row, "status": "regression" if changed else "ok"})
+    table = pd.DataFrame(rows, columns=["benchmark", "metric", "baseline", "current", "ratio", "status"])
+    if baseline is not None and baseline.get("machine") != suite.get("machine"):
+        logger.warning("The baseline was run on another machine, its latencies may not be comparable.")
+    return table
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
@@ -0,0 +1,124 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Checkpoints of the native estimations, from which an interrupted estimation resumes.
+#
+# The estimation of 4-2 takes about an hour, and the cross-validation of 4-3 about three hours. The state of the
+# optimizer (parameters, inverse hessian of BFGS or trust radius, iteration and elapsed time) is saved every few
+# iterations or minutes, through a temporary file so that a crash while saving never leaves a partial checkpoint. The
+# checkpoint carries the fingerprint of the estimation (specification with the draws, data, algorithm and parameters),
+# and is only used by an estimation with the same fingerprint. It is removed once the estimation has finished.
+# ---------------------------------------------------------------------------------------------------------------------#
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from .results_store import data_hash, specification_hash
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint:
+    """
+    Periodic checkpoint of a native estimation.
+
+    :param path: .npz file of the checkpoint.
+    :param every_iterations: iterations between two checkpoints.
+    :param every_seconds: seconds between two checkpoints, whichever comes first.
+    """
+
+    def __init__(self, path, every_iterations=5, every_seconds=300):
+        self.path = path
+        self.every_iterations = every_iterations
+        self.every_seconds = every_seconds
+        self._fingerprint = None
+        self._last = (0, time.perf_counter())
+
+    def __repr__(self):
+        return f"Checkpoint({self.path!r})"
+
+    def start(self, engine, algorithm):
+        """
+        Start the checkpoints of an estimation, and return the state saved by an interrupted run of the same
+        estimation, or None.
+
+        :return: dict with x, iteration, seconds, and inverse_hessian (BFGS) or trust_radius (trust region).
+        """
+        self._fingerprint = {
+            "model_name": engine.model_name,
+            "spec_hash": specification_hash(engine),
+            "data_hash": data_hash(engine),
+            "algorithm": algorithm,
+            "beta_names": engine.beta_names,
+        }
+        self._last = (0, time.perf_counter())
+        state = self.load()
+        if state is None:
+            return None
+        if state["fingerprint"] != self._fingerprint:
+            logger.info(f"Checkpoint {self.path} is from another estimation, the estimation starts from the beginning.")
+            return None
+        self._last = (state["iteration"], time.perf_counter())
+        return state
+
+    def load(self):
+        """
+        State saved in the checkpoint, or None if there is no readable checkpoint.
+        """
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with np.load(self.path) as saved:
+                state = {name: saved[name] for name in saved.files}
+        except (OSError, ValueError, EOFError) as error:
+            logger.warning(f"Checkpoint {self.path} cannot be read ({error}), it is ignored.")
+            return None
+        state["fingerprint"] = json.loads(str(state["fingerprint"]))
+        state["iteration"] = int(state["iteration"])
+        state["seconds"] = float(state["seconds"])
+        if "trust_radius" in state:
+            state["trust_radius"] = float(state["trust_radius"])
+        return state
+
+    def due(self, iteration):
+        """
+        True if a checkpoint is due after the iteration.
+        """
+        last_iteration, last_time = self._last
+        return (
+            iteration - last_iteration >= self.every_iterations
+            or time.perf_counter() - last_time >= self.every_seconds
+        )
+
+    def save(self, iteration, x, seconds, inverse_hessian=None, trust_radius=None):
+        """
+        Save the state of the optimizer after an iteration, through a temporary file.
+        """
+        arrays = {"inverse_hessian": inverse_hessian, "trust_radius": trust_radius}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            np.savez(
+                file,
+                fingerprint=json.dumps(self._fingerprint),
+                iteration=iteration,
+                x=x,
+                seconds=seconds,
+                **{name: array for name, array in arrays.items() if array is not None},
+            )
+        os.replace(temporary, self.path)
+        self._last = (iteration, time.perf_counter())
+        logger.info(f"Checkpoint saved at iteration {iteration} in {self.path}")
+
+    def remove(self):
+        """
+        Remove the checkpoint, once the estimation has finished.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
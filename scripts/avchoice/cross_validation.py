@@ -0,0 +1,268 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Fold-parallel cross-validation of the panel mixed logit models (3-2, 4-3 and 5-3).
+#
+# The folds of a GroupKFold split are independent, so they are estimated concurrently in a pool of processes. The
+# workers are forked from the script after the prepared data is loaded: they read the data frame and the model
+# function from the memory of the parent process (copy-on-write), and only the row indices of the folds and the
+# results are sent between the processes.
+# ---------------------------------------------------------------------------------------------------------------------#
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .terms import linearize
+
+logger = logging.getLogger(__name__)
+
+# state of the cross-validation, inherited by the forked workers
+_shared = {}
+
+
+def _database(data, random_number_generators):
+    """
+    Biogeme panel database of a split.
+    """
+    import biogeme.database as db
+
+    database = db.Database("mydata", data)
+    database.panel(_shared["panel"])
+    database.set_random_number_generators(random_number_generators)
+    return database
+
+
+def _native_fold(fold, train_data, test_data):
+    """
+    Estimate a fold with the native engine, and simulate the log likelihood of its validation split.
+    """
+    from .checkpoint import Checkpoint
+    from .draws import random_number_generators
+    from .mixed_logit import PanelMixedLogit
+    from .telemetry import Telemetry
+
+    v, av = _shared["get_model"]()
+    choice, number_of_draws = _shared["choice"], _shared["number_of_draws"]
+    draw_cache, population_ids = _shared["draw_cache"], _shared["population_ids"]
+    model_name = f"{_shared['model_name']}-fold-{fold}"
+
+    database = _database(train_data, random_number_generators())
+    engine = PanelMixedLogit.from_biogeme(
+        database,
+        v,
+        av,
+        choice,
+        number_of_draws,
+        model_name,
+        draw_cache=draw_cache,
+        population_ids=population_ids,
+        threads=_shared["threads"],
+        kernel=_shared["kernel"],
+    )
+    start, inverse_hessian = None, None
+    warm_start = _shared["warm_start"]
+    if warm_start is not None:
+        start = warm_start.get_beta_values()
+        if _shared["warm_start_hessian"]:
+            inverse_hessian = warm_start.inverse_hessian(engine.beta_names, engine.n_persons)
+    checkpoint, telemetry = None, None
+    if _shared["checkpoint_directory"] is not None:
+        checkpoint = Checkpoint(os.path.join(_shared["checkpoint_directory"], f"{model_name}.npz"))
+    if _shared["telemetry_directory"] is not None:
+        telemetry = Telemetry(os.path.join(_shared["telemetry_directory"], f"{model_name}.telemetry.jsonl"))
+    results = engine.estimate(
+        start, second_derivatives=None, inverse_hessian=inverse_hessian, checkpoint=checkpoint, telemetry=telemetry
+    )
+
+    database = _database(test_data, random_number_generators())
+    engine = PanelMixedLogit.from_biogeme(
+        database,
+        v,
+        av,
+        choice,
+        number_of_draws,
+        model_name,
+        draw_cache=draw_cache,
+        population_ids=population_ids,
+        threads=_shared["threads"],
+        kernel=_shared["kernel"],
+    )
+    test_loglik = engine.loglikelihood(results.get_beta_values())
+    return results.loglike, test_loglik, results.iterations
+
+
+def _biogeme_fold(fold, train_data, test_data):
+    """
+    Estimate a fold with Biogeme, and simulate the log likelihood of its validation split.
+    """
+    import biogeme.biogeme as bio
+    import biogeme.models as models
+    from biogeme.expressions import MonteCarlo, PanelLikelihoodTrajectory, log
+
+    from .draws import random_number_generators
+
+    v, av = _shared["get_model"]()
+    logprob = log(MonteCarlo(PanelLikelihoodTrajectory(models.logit(v, av, _shared["choice"]))))
+
+    # one model name per fold, so that the workers do not write to the same files
+    model_name = f"{_shared['model_name']}-fold-{fold}"
+
+    database = _database(train_data, random_number_generators())
+    if _shared["draw_cache"] is not None:
+        _shared["draw_cache"].attach(database, _shared["population_ids"])
+    biogeme = bio.BIOGEME(database, logprob, number_of_draws=_shared["number_of_draws"])
+    biogeme.modelName = model_name
+    if _shared["warm_start"] is not None:
+        biogeme.change_init_values(_shared["warm_start"].get_beta_values())
+    results = biogeme.estimate()
+
+    database = _database(test_data, random_number_generators())
+    if _shared["draw_cache"] is not None:
+        _shared["draw_cache"].attach(database, _shared["population_ids"])
+    sim_biogeme = bio.BIOGEME(database, {"Loglikelihood": logprob}, number_of_draws=_shared["number_of_draws"])
+    sim_result = sim_biogeme.simulate(the_beta_values=results.get_beta_values())
+
+    # remove intermediate outputs
+    os.remove(f"{model_name}.pickle")
+    os.remove(f"{model_name}.html")
+    if os.path.exists(f"__{model_name}.iter"):
+        os.remove(f"__{model_name}.iter")
+    iterations = results.data.optimizationMessages.get("Number of iterations")
+    return results.data.logLike, sim_result["Loglikelihood"].sum(), iterations
+
+
+def _fold(fold, train_index, test_index):
+    """
+    Estimate and validate one fold, in a worker.
+    """
+    started = time.perf_counter()
+    data, panel = _shared["data"], _shared["panel"]
+    train_data, test_data = data.iloc[train_index], data.iloc[test_index]
+
+    # limit the threads of numpy in each worker, so that the workers do not compete for the cores
+    from threadpoolctl import threadpool_limits
+
+    with threadpool_limits(limits=_shared["threads"]):
+        if _shared["engine"] == "native":
+            train_loglik, test_loglik, iterations = _native_fold(fold, train_data, test_data)
+        elif _shared["engine"] == "biogeme":
+            train_loglik, test_loglik, iterations = _biogeme_fold(fold, train_data, test_data)
+        else:
+            raise ValueError(f"Unknown estimation engine {_shared['engine']}, expected native or biogeme.")
+
+    logger.info(f"Fold {fold}: log likelihood for {len(train_data)} training data: {train_loglik}")
+    logger.info(f"Fold {fold}: log likelihood for {len(test_data)} validation data: {test_loglik}")
+    return {
+        "Fold": fold,
+        "Train persons": train_data[panel].nunique(),
+        "Train observations": len(train_data),
+        "Train log likelihood": train_loglik,
+        "Validation persons": test_data[panel].nunique(),
+        "Validation observations": len(test_data),
+        "Validation log likelihood": test_loglik,
+        "Iterations": iterations,
+        "Time (s)": time.perf_counter() - started,
+    }
+
+
+def cross_validate(
+    data,
+    get_model,
+    choice,
+    number_of_draws,
+    model_name,
+    n_splits=5,
+    workers=None,
+    engine="native",
+    kernel="numpy",
+    draw_cache=None,
+    warm_start=None,
+    warm_start_hessian=False,
+    checkpoint_directory=None,
+    telemetry_directory=None,
+    panel="id",
+):
+    """
+    Estimate the folds of a GroupKFold cross-validation concurrently, and gather their log likelihoods in one table.
+
+    :param data: prepared data frame, shared read-only by the workers.
+    :param get_model: function returning the utilities and availabilities of the model, (v, av).
+    :param workers: number of processes, by default one per fold within the number of cores (AVCHOICE_CPUS when set,
+        e.g. by the pipeline runner). With 1 worker, or
+        where processes cannot be forked, the folds are estimated one after another.
+    :param engine: "native" (numpy engine of avchoice) or "biogeme".
+    :param kernel: kernel of the native engine, "numpy" or "numba" (see PanelMixedLogit).
+    :param draw_cache: DrawCache of the draws of both engines; each person keeps its draws of the full sample in every
+        fold.
+    :param warm_start: EstimationResults of the full sample (see EstimationResults.load), whose estimates are the
+        starting values of every fold. The folds then converge in a few iterations instead of crossing the flat
+        region around the initial values of get_model.
+    :param warm_start_hessian: with the native engine, also start BFGS from the inverse hessian of the full sample.
+    :param checkpoint_directory: directory of the checkpoints of the folds of the native engine (see checkpoint.py),
+        from which the interrupted folds resume when the cross-validation is run again.
+    :param telemetry_directory: directory of the telemetry of the folds of the native engine (see telemetry.py).
+    """
+    # cores given to the script by the pipeline runner (see pipeline.py), or all the cores
+    cpus = int(os.environ.get("AVCHOICE_CPUS", 0)) or os.cpu_count() or 1
+    if workers is None:
+        workers = min(n_splits, cpus)
+    if workers > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        logger.warning("Processes cannot be forked on this platform, the folds are estimated one after another.")
+        workers = 1
+
+    _shared.update(
+        data=data,
+        get_model=get_model,
+        choice=choice,
+        number_of_draws=number_of_draws,
+        model_name=model_name,
+        engine=engine,
+        kernel=kernel,
+        draw_cache=draw_cache,
+        warm_start=warm_start,
+        warm_start_hessian=warm_start_hessian,
+        checkpoint_directory=checkpoint_directory,
+        telemetry_directory=telemetry_directory,
+        panel=panel,
+        population_ids=data[panel].unique(),
+        threads=max(1, cpus // workers),
+    )
+    if draw_cache is not None:
+        # generate the draws of the full sample once, before the workers read them
+        v, av = get_model()
+        draw_types = {}
+        for utility in v.values():
+            linearize(utility, draw_types=draw_types)
+        if draw_types:
+            draw_cache.table(draw_types, number_of_draws, np.sort(_shared["population_ids"]))
+
+    # imported here, as scikit-learn takes longer to import than the rest of the package
+    from sklearn.model_selection import GroupKFold
+
+    folds = list(GroupKFold(n_splits=n_splits).split(data, groups=data[panel]))
+    logger.info(f"Cross-validation of {model_name}: {n_splits} folds, {workers} workers")
+    if warm_start is not None:
+        logger.info(f"Folds started from the estimates of {warm_start.model_name}")
+    if warm_start_hessian and engine == "biogeme":
+        logger.warning("Biogeme cannot start BFGS from a given matrix, the full-sample hessian is not used.")
+
+    if workers == 1:
+        rows = [_fold(fold, train_index, test_index) for fold, (train_index, test_index) in enumerate(folds, 1)]
+    else:
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [
+                pool.submit(_fold, fold, train_index, test_index)
+                for fold, (train_index, test_index) in enumerate(folds, 1)
+            ]
+            rows = [future.result() for future in futures]
+
+    table = pd.DataFrame(rows).set_index("Fold")
+    logger.info(f"Cross-validation results:\n{table.to_string()}")
+    return table
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
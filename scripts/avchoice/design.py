@@ -0,0 +1,56 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Experimental design of the stated choice scenarios.
+#
+# Each respondent saw 12 scenarios pivoted around the travel time and cost of their own trip: the attributes of the
+# alternatives are the time or cost of the trip times 0.8, 1.0 or 1.2. The design is a table of these multipliers,
+# one row per scenario and one column per attribute of an alternative, and the attributes of all the choice tasks are
+# expanded by one lookup of the rows of the design and one multiplication.
+# ---------------------------------------------------------------------------------------------------------------------#
+import pandas as pd
+
+# multipliers of the trip attributes, by scenario, for the current vehicle (hv), the autonomous vehicle with the current
+# interior (av) and the autonomous vehicle with a work and leisure interior (avwl)
+DESIGN = pd.DataFrame(
+    {
+        "hv_tt": [1.0, 1.2, 1.0, 0.8, 1.0, 1.0, 1.2, 0.8, 1.2, 0.8, 1.2, 0.8],
+        "hv_tc": [1.0, 1.0, 1.2, 0.8, 1.0, 1.2, 0.8, 1.0, 0.8, 0.8, 1.2, 1.2],
+        "av_tt": [1.2, 1.0, 0.8, 1.0, 1.2, 0.8, 0.8, 1.2, 1.0, 1.0, 1.0, 1.0],
+        "av_tc": [1.2, 1.0, 0.8, 1.0, 0.8, 1.2, 1.0, 1.0, 0.8, 1.2, 1.2, 0.8],
+        "avwl_tt": [1.0, 1.2, 1.0, 0.8, 1.0, 1.0, 1.2, 0.8, 0.8, 1.2, 0.8, 1.2],
+        "avwl_tc": [1.2, 0.8, 1.2, 0.8, 0.8, 0.8, 1.2, 1.2, 1.0, 1.0, 1.0, 1.0],
+    },
+    index=pd.RangeIndex(1, 13, name="scenario"),
+)
+
+# trip attribute of the respondent multiplied by each column of the design
+BASES = {
+    "hv_tt": "time",
+    "hv_tc": "cost",
+    "av_tt": "time",
+    "av_tc": "cost",
+    "avwl_tt": "time",
+    "avwl_tc": "cost",
+}
+
+
+def expand_design(tasks, design=None, bases=None, scenario="scenario"):
+    """
+    Attributes of the alternatives of choice tasks, as a data frame with the index of the tasks and one column per
+    column of the design.
+
+    :param tasks: data frame of the choice tasks, with the scenario and the trip attributes of the respondent.
+    :param design: multipliers by scenario (rows) and attribute (columns), by default DESIGN.
+    :param bases: dict attribute -> column of tasks multiplied by the design, by default BASES.
+    """
+    design = DESIGN if design is None else design
+    bases = BASES if bases is None else bases
+    rows = design.index.get_indexer(tasks[scenario])
+    if (rows < 0).any():
+        unknown = sorted(set(tasks[scenario][rows < 0]))
+        raise ValueError(f"Scenarios {unknown} are not in the design.")
+    base = tasks[[bases[attribute] for attribute in design.columns]].to_numpy(dtype=float)
+    values = base * design.to_numpy()[rows]
+    return pd.DataFrame(values, index=tasks.index, columns=design.columns)
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
@@ -0,0 +1,119 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Persistent store of seeded draws, shared by the estimation, validation and elasticity scripts.
+#
+# The draws of a model are identified by the seed, the types of draws of its random parameters, the number of draws
+# and the sorted ids of the persons. They are generated once, saved as a .npy file of shape
+# (random parameters x persons x draws), and memory-mapped by any later run, so that the simulated log likelihoods of
+# different scripts are computed with the same draws and can be compared.
+# ---------------------------------------------------------------------------------------------------------------------#
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+from .draws import generate_draws
+
+logger = logging.getLogger(__name__)
+
+
+class DrawCache:
+    """
+    Directory of memory-mapped draw tables.
+
+    :param directory: directory of the .npy files.
+    :param seed: seed of the draws.
+    """
+
+    def __init__(self, directory="../data/draws", seed=0):
+        self.directory = directory
+        self.seed = seed
+
+    def key(self, draw_types, number_of_draws, person_ids):
+        """
+        Hash of (seed, types of draws, number of draws, sorted person ids).
+        """
+        digest = hashlib.sha1()
+        digest.update(json.dumps([self.seed, sorted(draw_types.items()), int(number_of_draws)]).encode())
+        digest.update(np.ascontiguousarray(np.sort(np.asarray(person_ids))).tobytes())
+        return digest.hexdigest()[:16]
+
+    def path(self, key):
+        """
+        Path of the draw table with the given key.
+        """
+        return os.path.join(self.directory, f"draws-{key}.npy")
+
+    def table(self, draw_types, number_of_draws, person_ids):
+        """
+        Memory-mapped (random parameters x persons x draws) table, generated and saved if not in the cache.
+
+        The random parameters are sorted by name and the persons by id.
+        """
+        key = self.key(draw_types, number_of_draws, person_ids)
+        path = self.path(key)
+        if not os.path.exists(path):
+            names = sorted(draw_types)
+            draws = generate_draws(draw_types, len(person_ids), number_of_draws, seed=self.seed)
+            os.makedirs(self.directory, exist_ok=True)
+
+            # write to a temporary file and rename it, so that concurrent runs never read a partial table
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as file:
+                np.save(file, np.stack([draws[name] for name in names]))
+            os.replace(temporary, path)
+            with open(path.replace(".npy", ".json"), "w") as file:
+                json.dump(
+                    {
+                        "seed": self.seed,
+                        "draw_types": draw_types,
+                        "names": names,
+                        "number_of_draws": int(number_of_draws),
+                        "number_of_persons": len(person_ids),
+                    },
+                    file,
+                    indent=4,
+                )
+            logger.info(f"Draws saved in {path}")
+        return np.load(path, mmap_mode="r")
+
+    def draws(self, draw_types, number_of_draws, person_ids, population_ids=None):
+        """
+        Dict draw name -> (persons x draws) array for the persons person_ids.
+
+        When population_ids is given (e.g. the full sample of a cross-validation), the draws are those of the
+        population, sliced for person_ids, so that each person keeps the same draws in every fold.
+        """
+        person_ids = np.sort(np.unique(np.asarray(person_ids)))
+        if population_ids is None:
+            population_ids = person_ids
+        population_ids = np.sort(np.unique(np.asarray(population_ids)))
+        table = self.table(draw_types, number_of_draws, population_ids)
+        names = sorted(draw_types)
+        if np.array_equal(person_ids, population_ids):
+            return {name: table[k] for k, name in enumerate(names)}
+        rows = np.minimum(np.searchsorted(population_ids, person_ids), len(population_ids) - 1)
+        if np.any(population_ids[rows] != person_ids):
+            raise ValueError("Some persons are not in the population of the draw cache.")
+        return {name: table[k][rows] for k, name in enumerate(names)}
+
+    def attach(self, database, population_ids=None):
+        """
+        Make a Biogeme panel database take its draws from the cache, instead of generating them each time a BIOGEME
+        object is built (the normal draws of Biogeme take seconds to generate). The Biogeme engine then uses the same
+        seeded draws as the native engine.
+
+        :param population_ids: as in draws, e.g. the full sample of a cross-validation.
+        """
+        person_ids = np.sort(database.data[database.panelColumn].unique())
+
+        def generate_draws(draw_types, names, number_of_draws):
+            draws = self.draws(draw_types, number_of_draws, person_ids, population_ids)
+            database.theDraws = np.stack([draws[name] for name in names], axis=-1)
+            return database.theDraws
+
+        database.generate_draws = generate_draws
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
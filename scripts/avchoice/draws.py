@@ -0,0 +1,156 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Random and quasi-random draws for the triangular and normal random parameters of the mixed logit models.
+#
+# The scripts used np.random.triangular pseudo-random draws, which need thousands of draws per person to stabilize the
+# simulated log likelihood. Scrambled Halton, Sobol and modified Latin hypercube (MLHS) sequences cover [0, 1] much
+# more evenly, and are transformed into triangular or normal draws by the inverse of the cumulative distribution.
+# ---------------------------------------------------------------------------------------------------------------------#
+import warnings
+
+import numpy as np
+from scipy.special import ndtri
+
+
+def inverse_triangular(uniform):
+    """
+    Inverse of the cumulative distribution of the symmetric triangular distribution on [-1, 1] with mode 0.
+    """
+    return np.where(uniform < 0.5, np.sqrt(2.0 * uniform) - 1.0, 1.0 - np.sqrt(2.0 * (1.0 - uniform)))
+
+
+def inverse_normal(uniform):
+    """
+    Inverse of the cumulative distribution of the standard normal distribution.
+    """
+    return ndtri(np.clip(uniform, 1e-12, 1.0 - 1e-12))
+
+
+def pseudo_random_uniform(rng, sample_size, number_of_draws, dimension):
+    """
+    Pseudo-random uniform draws, (sample_size x number_of_draws).
+    """
+    return rng.random((sample_size, number_of_draws))
+
+
+def halton_uniform(rng, sample_size, number_of_draws, dimension):
+    """
+    Scrambled Halton uniform draws, consecutive points of the sequence being allocated to the same person.
+
+    Each random parameter must use its own dimension (prime base) of the sequence: one-dimensional sequences with the
+    same base are strongly correlated across parameters, even when scrambled.
+    """
+    from scipy.stats import qmc
+
+    sampler = qmc.Halton(d=dimension + 1, scramble=True, seed=rng)
+    points = sampler.random(sample_size * number_of_draws)[:, dimension]
+    return points.reshape(sample_size, number_of_draws)
+
+
+def sobol_uniform(rng, sample_size, number_of_draws, dimension):
+    """
+    Scrambled Sobol uniform draws, consecutive points of the sequence being allocated to the same person, and each
+    random parameter using its own dimension of the sequence.
+    """
+    from scipy.stats import qmc
+
+    sampler = qmc.Sobol(d=dimension + 1, scramble=True, seed=rng)
+    with warnings.catch_warnings():
+        # the balance properties of Sobol sequences hold for powers of 2 only, which we do not require here
+        warnings.simplefilter("ignore", UserWarning)
+        points = sampler.random(sample_size * number_of_draws)[:, dimension]
+    return points.reshape(sample_size, number_of_draws)
+
+
+def mlhs_uniform(rng, sample_size, number_of_draws, dimension):
+    """
+    Modified Latin hypercube draws (Hess, Train and Polak, 2006): for each person, a shifted grid of number_of_draws
+    equally spaced points in [0, 1], randomly shuffled.
+    """
+    grid = (np.arange(number_of_draws) + rng.random((sample_size, 1))) / number_of_draws
+    return rng.permuted(grid, axis=1)
+
+
+# sequences of uniform draws and transforms to the distributions of the random parameters
+SEQUENCES = {
+    "": pseudo_random_uniform,
+    "HALTON": halton_uniform,
+    "SOBOL": sobol_uniform,
+    "MLHS": mlhs_uniform,
+}
+DISTRIBUTIONS = {
+    "TRIANGULAR": inverse_triangular,
+    "NORMAL": inverse_normal,
+}
+
+# the names NORMAL, NORMAL_HALTON* and NORMAL_MLHS are reserved by biogeme for its native generators, so the normal
+# draws from the scrambled sequences are prefixed with S (scrambled or seeded)
+NAMES = {
+    ("TRIANGULAR", ""): "TRIANGULAR",
+    ("TRIANGULAR", "HALTON"): "TRIANGULAR_HALTON",
+    ("TRIANGULAR", "SOBOL"): "TRIANGULAR_SOBOL",
+    ("TRIANGULAR", "MLHS"): "TRIANGULAR_MLHS",
+    ("NORMAL", ""): "NORMAL_SEEDED",
+    ("NORMAL", "HALTON"): "NORMAL_SHALTON",
+    ("NORMAL", "SOBOL"): "NORMAL_SOBOL",
+    ("NORMAL", "MLHS"): "NORMAL_SMLHS",
+}
+
+# native biogeme types replaced by their seeded equivalent when the draws are generated outside of biogeme
+ALIASES = {
+    "NORMAL": "NORMAL_SEEDED",
+}
+
+
+def make_generator(distribution, sequence, rng, dimensions=None):
+    """
+    Draw generator with the signature expected by biogeme, generator(sample_size, number_of_draws).
+
+    Biogeme calls the generator once per random parameter; successive calls use successive dimensions of the
+    quasi-random sequences, counted in the dict dimensions shared by the generators.
+    """
+    transform = DISTRIBUTIONS[distribution]
+    uniform = SEQUENCES[sequence]
+    if dimensions is None:
+        dimensions = {}
+
+    def generator(sample_size, number_of_draws):
+        dimension = dimensions.get(sequence, 0)
+        dimensions[sequence] = dimension + 1
+        return transform(uniform(rng, sample_size, number_of_draws, dimension))
+
+    generator.__doc__ = f"{distribution.lower()} draws from {sequence.lower() or 'pseudo-random'} uniform draws"
+    return generator
+
+
+def random_number_generators(seed=None):
+    """
+    Dict of draw generators to be given to database.set_random_number_generators, all sharing one seeded numpy
+    generator: TRIANGULAR, TRIANGULAR_HALTON, TRIANGULAR_SOBOL, TRIANGULAR_MLHS, NORMAL_SEEDED, NORMAL_SHALTON,
+    NORMAL_SOBOL and NORMAL_SMLHS.
+    """
+    rng = np.random.default_rng(seed)
+    dimensions = {}
+    generators = {}
+    for (distribution, sequence), name in NAMES.items():
+        generator = make_generator(distribution, sequence, rng, dimensions)
+        generators[name] = (generator, f"Draws from a {generator.__doc__}")
+    return generators
+
+
+def generate_draws(draw_types, number_of_persons, number_of_draws, generators=None, seed=None):
+    """
+    Draws for each random parameter without a biogeme database, dict name -> (persons x draws) array.
+
+    :param draw_types: dict draw name -> type of draws, e.g. {"b_vot_hv_rnd": "TRIANGULAR_HALTON"}.
+    """
+    if generators is None:
+        generators = random_number_generators(seed)
+    draws = {}
+    for name in sorted(draw_types):
+        draw_type = draw_types[name]
+        generator = generators[draw_type] if draw_type in generators else generators[ALIASES[draw_type]]
+        draws[name] = generator[0](number_of_persons, number_of_draws)
+    return draws
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
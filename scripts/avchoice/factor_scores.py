@@ -0,0 +1,195 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Cached fit of the measurement model of the latent variables (0-prepare-data.py).
+#
+# The confirmatory factor analysis is identified by a hash of the description of the measurement model, the estimation
+# objective and the version of semopy. Its fitted parameters and factor scores are saved with a hash of the indicator
+# data, so that a run with the same model and data reads the factor scores instead of fitting the model again. When
+# only the data changed (e.g. new respondents), the fit starts from the saved parameters.
+#
+# The order of the parameters of semopy depends on the hash seed of the process, so the parameters are saved with
+# their locations in the matrices of the model, by the names of the variables, and read back by these locations.
+# ---------------------------------------------------------------------------------------------------------------------#
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def measurement_hash(description, indicators, obj):
+    """
+    Hash of the measurement model: description, indicator columns, objective and version of semopy.
+    """
+    import semopy
+
+    specification = {
+        "description": description,
+        "indicators": sorted(indicators),
+        "obj": obj,
+        "semopy": semopy.__version__,
+    }
+    return hashlib.sha1(json.dumps(specification, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def indicator_hash(data, indicators, panel="id"):
+    """
+    Hash of the ids and of the values of the indicator columns.
+    """
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(data[panel].to_numpy()).tobytes())
+    for name in sorted(indicators):
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(data[name].to_numpy(dtype=float)).tobytes())
+    return digest.hexdigest()
+
+
+def parameter_keys(model):
+    """
+    Locations of the active parameters of a semopy model, in the order of model.param_vals: for each parameter, its
+    matrix and the names of the variables of its row and column, e.g. "lambda:x1:eta1", the variables being sorted in
+    the symmetric matrices.
+    """
+    keys = []
+    for parameter in model.parameters.values():
+        if not parameter.active:
+            continue
+        locations = []
+        for location in parameter.locations:
+            matrix = next(name for name in model.matrices_names if getattr(model, f"mx_{name}") is location.matrix)
+            rows, columns = getattr(model, f"names_{matrix}")
+            names = [rows[location.indices[0]], columns[location.indices[1]]]
+            if location.symmetric:
+                names.sort()
+            locations.append(":".join([matrix] + names))
+        keys.append("|".join(sorted(locations)))
+    return keys
+
+
+class FactorScoreCache:
+    """
+    Directory of fitted measurement models and their factor scores.
+
+    :param directory: directory of the .npz and .json files.
+    """
+
+    def __init__(self, directory="../data/factor_scores"):
+        self.directory = directory
+
+    def paths(self, key):
+        """
+        Paths of the parameters and factor scores, and of the description of a fit.
+        """
+        path = os.path.join(self.directory, f"cfa-{key}")
+        return f"{path}.npz", f"{path}.json"
+
+    def load(self, key):
+        """
+        Saved fit of a measurement model: dict of its description (see save), parameters and factor scores, or None.
+        """
+        arrays_path, path = self.paths(key)
+        if not os.path.exists(path) or not os.path.exists(arrays_path):
+            return None
+        with open(path) as file:
+            fit = json.load(file)
+        with np.load(arrays_path) as arrays:
+            fit.update({name: arrays[name] for name in arrays.files})
+        return fit
+
+    def save(self, key, data_hash, model, result, ids, factors):
+        """
+        Save the parameters, with their locations (see parameter_keys), and the factor scores of a fit.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        arrays_path, path = self.paths(key)
+
+        # write to a temporary file and rename it, so that concurrent runs never read a partial file
+        temporary = f"{arrays_path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            np.savez(
+                file,
+                params=result.x,
+                param_keys=np.asarray(parameter_keys(model)),
+                ids=np.asarray(ids),
+                scores=factors.to_numpy(dtype=float),
+            )
+        os.replace(temporary, arrays_path)
+        with open(path, "w") as file:
+            json.dump(
+                {
+                    "data_hash": data_hash,
+                    "factors": list(factors.columns),
+                    "fun": float(result.fun),
+                    "success": bool(result.success),
+                    "n_it": int(result.n_it),
+                    "message": str(result.message),
+                    "name_method": result.name_method,
+                    "name_obj": result.name_obj,
+                },
+                file,
+                indent=4,
+            )
+
+    def fit(self, description, data, obj="DWLS", panel="id", force=False):
+        """
+        Fitted semopy model and factor scores of a measurement model, as model.fit(data, obj=obj) and
+        model.predict_factors(data), read from the cache if the model and the indicator data did not change.
+
+        :param description: semopy description of the measurement model.
+        :param data: data with one row per person, its ids in the column panel.
+        :param force: fit the model even if the cache has a fit with the same data.
+        :return: (model, factor scores with the index of data).
+        """
+        import semopy
+        from semopy.solver import SolverResult
+
+        model = semopy.Model(description)
+        indicators = list(model.vars["observed"])
+        key = measurement_hash(description, indicators, obj)
+        data_hash = indicator_hash(data, indicators, panel)
+        cached = self.load(key)
+        model.load(data)
+
+        # saved parameters in the order of this model, or None if they are not those of its parameters, e.g. a cache
+        # written without their locations
+        params = None
+        if cached is not None and "param_keys" in cached:
+            saved = dict(zip(cached["param_keys"].tolist(), cached["params"]))
+            keys = parameter_keys(model)
+            if sorted(saved) == sorted(keys):
+                params = np.array([saved[name] for name in keys])
+            else:
+                logger.info(f"Parameters of the measurement model {key} in the cache do not match the model")
+
+        if params is not None:
+            model.param_vals = params
+            model.update_matrices(model.param_vals)
+            if cached["data_hash"] == data_hash and not force:
+                if obj in ("WLS", "DWLS"):
+                    model.prepare_wls(obj, False)
+                model.last_result = SolverResult(
+                    cached["fun"],
+                    cached["success"],
+                    cached["n_it"],
+                    model.param_vals,
+                    cached["message"],
+                    cached["name_method"],
+                    cached["name_obj"],
+                )
+                logger.info(f"Factor scores of the measurement model {key} read from the cache")
+                factors = pd.DataFrame(cached["scores"], index=data.index, columns=cached["factors"])
+                return model, factors
+            logger.info(f"Measurement model {key} fitted from the saved parameters")
+
+        result = model.fit(data, obj=obj)
+        logger.info(f"Measurement model {key} fitted in {result.n_it} iterations")
+        factors = model.predict_factors(data)
+        factors.index = data.index
+        self.save(key, data_hash, model, result, data[panel].to_numpy(), factors)
+        return model, factors
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
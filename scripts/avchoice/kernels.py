@@ -0,0 +1,97 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Fused kernel of the native engine (see mixed_logit.py), compiled with Numba.
+#
+# The NumPy evaluation materializes (persons x tasks x alternatives x draws) arrays of the utilities, their
+# exponentials, the probabilities and the residuals. The kernel computes them in one pass over the tasks of each
+# person, with buffers of one task: the utilities of the alternatives from the groups of terms, a max-shifted softmax,
+# the product of the probabilities of the chosen alternatives over the tasks (the panel likelihood, kept as a product
+# and a logarithm so that it does not underflow), and the sums over the tasks of the residuals times the data of each
+# group, from which the engine gets the scores. The draws are the innermost loop, over contiguous memory. It runs
+# without the GIL, so that the blocks of persons of the engine are evaluated in parallel by its threads.
+# ---------------------------------------------------------------------------------------------------------------------#
+import numba
+import numpy as np
+
+# probabilities below which the running product of the panel likelihood is moved to its logarithm
+_TINY = 1e-150
+
+
+@numba.njit(cache=True, nogil=True)
+def fused_logit(data, values, alternatives, available, chosen, loglikelihood, summed, gradient):
+    """
+    Log panel likelihood of the logit model and sums of its residuals, for each person and draw.
+
+    :param data: (persons x tasks x groups) product of the task-level variables of each group of terms, one for the
+        groups without task-level variables.
+    :param values: (persons x groups x draws) sum of the coefficients times the person-level variables and draws of
+        the terms of each group.
+    :param alternatives: (groups) index of the alternative of each group.
+    :param available: (persons x tasks x alternatives) availabilities, as booleans.
+    :param chosen: (persons x tasks) index of the chosen alternatives.
+    :param loglikelihood: output (persons x draws), sum over the tasks of the log probabilities of the chosen
+        alternatives.
+    :param summed: output (persons x groups x draws), if gradient, sum over the tasks of the residuals y_tj - P_tjr
+        of the alternative of each group times its data.
+    """
+    n_persons, n_tasks, n_groups = data.shape
+    n_draws = values.shape[2]
+    n_alternatives = available.shape[2]
+    v = np.empty((n_alternatives, n_draws))
+    product = np.empty(n_draws)
+    logarithm = np.empty(n_draws)
+    offered = np.empty(n_alternatives, dtype=np.intp)
+    for p in range(n_persons):
+        product[:] = 1.0
+        logarithm[:] = 0.0
+        if gradient:
+            summed[p] = 0.0
+        for t in range(n_tasks):
+            # the tasks with one alternative, e.g. the padded tasks, have a probability of one and no residuals
+            n_offered = 0
+            for j in range(n_alternatives):
+                if available[p, t, j]:
+                    offered[n_offered] = j
+                    n_offered += 1
+            if n_offered < 2:
+                continue
+
+            # utilities
+            v[:] = 0.0
+            for g in range(n_groups):
+                if data[p, t, g] != 0.0:
+                    j = alternatives[g]
+                    for r in range(n_draws):
+                        v[j, r] += data[p, t, g] * values[p, g, r]
+
+            # max-shifted softmax, probability of the chosen alternative, and residuals in place of the utilities
+            c = chosen[p, t]
+            for r in range(n_draws):
+                shift = v[c, r]
+                for k in range(n_offered):
+                    shift = max(shift, v[offered[k], r])
+                denominator = 0.0
+                for k in range(n_offered):
+                    v[offered[k], r] = np.exp(v[offered[k], r] - shift)
+                    denominator += v[offered[k], r]
+                probability = v[c, r] / denominator
+                if probability > _TINY:
+                    product[r] *= probability
+                    if product[r] < _TINY:
+                        logarithm[r] += np.log(product[r])
+                        product[r] = 1.0
+                else:
+                    logarithm[r] += np.log(v[c, r]) - np.log(denominator)
+                if gradient:
+                    for k in range(n_offered):
+                        v[offered[k], r] = -v[offered[k], r] / denominator
+                    v[c, r] += 1.0
+
+            # residuals times the data of each group
+            if gradient:
+                for g in range(n_groups):
+                    if data[p, t, g] != 0.0:
+                        j = alternatives[g]
+                        for r in range(n_draws):
+                            summed[p, g, r] += v[j, r] * data[p, t, g]
+        for r in range(n_draws):
+            loglikelihood[p, r] = logarithm[r] + np.log(product[r])
@@ -0,0 +1,1119 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Native numpy engine for the simulated panel log likelihood of the VOT-space mixed logit models.
+#
+# The 3-x, 4-x and 5-x scripts estimate log(MonteCarlo(PanelLikelihoodTrajectory(models.logit(v, av, chosen)))) with
+# three alternatives, normal random ASCs and triangular random VOTs. Instead of walking Biogeme's expression tree row
+# by row, the utilities are expanded into elementary terms (see terms.py) and evaluated at once over a
+# (persons x tasks x alternatives x draws) array. The persons are split into blocks, evaluated on a pool of threads.
+# ---------------------------------------------------------------------------------------------------------------------#
+import copy
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.special import ndtr
+
+from .draws import generate_draws
+from .terms import linearize, simplify
+
+logger = logging.getLogger(__name__)
+
+
+class EstimationResults:
+    """
+    Estimated parameters and log likelihood of a native mixed logit estimation.
+
+    The hessian (exact, or minus the BHHH matrix) gives the classical covariance -H^-1 and, with the BHHH matrix B, the
+    robust (sandwich) covariance H^-1 B H^-1.
+    """
+
+    def __init__(
+        self,
+        model_name,
+        beta_names,
+        values,
+        loglike,
+        n_persons,
+        n_observations,
+        iterations,
+        converged,
+        hessian=None,
+        bhhh=None,
+    ):
+        self.model_name = model_name
+        self.beta_names = list(beta_names)
+        self.values = np.asarray(values, dtype=float)
+        self.loglike = float(loglike)
+        self.n_persons = n_persons
+        self.n_observations = n_observations
+        self.iterations = iterations
+        self.converged = converged
+        self.hessian = hessian
+        self.bhhh = bhhh
+
+    def get_beta_values(self):
+        """
+        Dict of the estimated parameters, as returned by Biogeme.
+        """
+        return dict(zip(self.beta_names, self.values.tolist()))
+
+    def covariance(self):
+        """
+        Classical covariance matrix, -H^-1.
+        """
+        return -np.linalg.pinv(self.hessian)
+
+    def robust_covariance(self):
+        """
+        Robust (sandwich) covariance matrix, H^-1 B H^-1.
+        """
+        inverse = np.linalg.pinv(self.hessian)
+        return inverse @ self.bhhh @ inverse
+
+    def get_estimated_parameters(self):
+        """
+        Table of the estimated parameters, with the standard errors and t-tests when the second derivatives are
+        available.
+        """
+        table = pd.DataFrame({"Value": self.values}, index=self.beta_names)
+        if self.hessian is None or self.bhhh is None:
+            return table
+        for prefix, covariance in (("", self.covariance()), ("Rob. ", self.robust_covariance())):
+            std_err = np.sqrt(np.maximum(np.diag(covariance), 0.0))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t_test = self.values / std_err
+            table[f"{prefix}Std err"] = std_err
+            table[f"{prefix}t-test"] = t_test
+            table[f"{prefix}p-value"] = 2 * ndtr(-np.abs(t_test))
+        return table
+
+    def save(self, path):
+        """
+        Save the results in a .npz file, e.g. to warm start the cross-validation folds from the full-sample estimates.
+        """
+        arrays = {"hessian": self.hessian, "bhhh": self.bhhh}
+        np.savez(
+            path,
+            model_name=self.model_name,
+            beta_names=np.array(self.beta_names),
+            values=self.values,
+            loglike=self.loglike,
+            n_persons=self.n_persons,
+            n_observations=self.n_observations,
+            iterations=self.iterations,
+            converged=self.converged,
+            **{name: array for name, array in arrays.items() if array is not None},
+        )
+        logger.info(f"Estimation results saved in {path}")
+
+    @classmethod
+    def load(cls, path):
+        """
+        Results saved by save().
+        """
+        with np.load(path) as saved:
+            return cls(
+                str(saved["model_name"]),
+                saved["beta_names"].tolist(),
+                saved["values"],
+                saved["loglike"],
+                int(saved["n_persons"]),
+                int(saved["n_observations"]),
+                int(saved["iterations"]),
+                bool(saved["converged"]),
+                hessian=saved["hessian"] if "hessian" in saved else None,
+                bhhh=saved["bhhh"] if "bhhh" in saved else None,
+            )
+
+    def inverse_hessian(self, beta_names, n_persons):
+        """
+        Inverse hessian of minus the log likelihood, for the parameters beta_names of a sample of n_persons, as the
+        initial matrix of BFGS.
+
+        The log likelihood is a sum over persons, so its hessian is rescaled by the ratio of the sample sizes. Returns
+        None if the hessian is not available, not negative definite or does not cover beta_names.
+        """
+        if self.hessian is None or not set(beta_names) <= set(self.beta_names):
+            return None
+        index = [self.beta_names.index(name) for name in beta_names]
+        hessian = -self.hessian[np.ix_(index, index)] * n_persons / self.n_persons
+        try:
+            np.linalg.cholesky(hessian)
+        except np.linalg.LinAlgError:
+            logger.warning(f"The hessian of {self.model_name} is not negative definite, BFGS starts from identity.")
+            return None
+        inverse = np.linalg.inv(hessian)
+        return (inverse + inverse.T) / 2
+
+
+class PanelMixedLogit:
+    """
+    Simulated panel log likelihood of a logit model whose utilities are sums of elementary terms.
+
+    :param data: long format data, one row per choice task.
+    :param utilities: dict alternative -> list of terms (see terms.py).
+    :param availability: dict alternative -> column name or constant.
+    :param choice: name of the column with the chosen alternative.
+    :param draws: dict draw name -> array (number of persons x number of draws), persons sorted by panel id.
+    :param start: dict beta name -> starting value.
+    :param panel: name of the column identifying the persons.
+    :param memory_limit: ceiling in MB of the (persons x tasks x alternatives x draws) intermediate arrays; the
+        simulated log likelihood and its derivatives are accumulated over chunks of draws that fit in it. By default
+        the AVCHOICE_MEMORY_LIMIT environment variable (see run-pipeline.py), or 2048.
+    :param dtype: floating point type of the data, draws and intermediate arrays, "float64" or "float32". The panel
+        likelihood is accumulated as a sum of log probabilities, so that float32 does not underflow; the sums over
+        the persons, the scores and the second derivatives are always accumulated in float64.
+    :param threads: threads evaluating the blocks of persons, by default the AVCHOICE_CPUS environment variable (see
+        pipeline.py), or all the cores.
+    :param kernel: "numpy", or "numba" for the fused kernel of kernels.py, which evaluates the log likelihood and the
+        scores without the (persons x tasks x alternatives x draws) arrays; the hessian is always evaluated with NumPy.
+    """
+
+    def __init__(
+        self, data, utilities, availability, choice, draws, start=None, panel="id", model_name="mxl", memory_limit=None,
+        dtype="float64", threads=None, kernel="numpy",
+    ):
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float64, np.float32):
+            raise ValueError(f"Unknown dtype {dtype}, expected float64 or float32.")
+        self.panel = panel
+        self.alternatives = sorted(utilities)
+
+        # persons and tasks, the data being sorted by panel id as in biogeme.database.panel
+        data = data.sort_values(panel, kind="mergesort")
+        person, self.person_ids = pd.factorize(data[panel], sort=True)
+        task = data.groupby(panel, sort=False).cumcount().to_numpy()
+        self.n_persons = len(self.person_ids)
+        self.n_tasks = int(task.max()) + 1
+        self.n_observations = len(data)
+        self._rows = (person, task)
+        self._data = data
+
+        # cumulated time of the draws and of the evaluations of the log likelihood and its gradient (see telemetry.py)
+        self.timings = {"draws": 0.0, "function": 0.0, "gradient": 0.0, "evaluations": 0}
+
+        # draws
+        self.draws = {name: np.asarray(values, dtype=float) for name, values in draws.items()}
+        self.number_of_draws = next(iter(self.draws.values())).shape[1] if self.draws else 1
+        self.draw_types, self.draw_seed = {}, None
+        for name, values in self.draws.items():
+            if values.shape != (self.n_persons, self.number_of_draws):
+                raise ValueError(f"Draws {name} have shape {values.shape}, expected "
+                                 f"{(self.n_persons, self.number_of_draws)}.")
+
+        # parameters, in order of appearance in the utilities
+        self.beta_names = []
+        for alternative in self.alternatives:
+            for term in utilities[alternative]:
+                for name in term.betas:
+                    if name not in self.beta_names:
+                        self.beta_names.append(name)
+        self._index = {name: i for i, name in enumerate(self.beta_names)}
+        start = start or {}
+        self.start = np.array([start.get(name, 0.0) for name in self.beta_names])
+
+        # chosen alternative and availabilities; padded tasks only have the chosen alternative available, so that
+        # their probability is exactly one
+        chosen = data[choice].map({alternative: j for j, alternative in enumerate(self.alternatives)})
+        if chosen.isnull().any():
+            raise ValueError(f"Column {choice} has values outside of the alternatives {self.alternatives}.")
+        self._chosen = np.zeros((self.n_persons, self.n_tasks), dtype=np.intp)
+        self._chosen[person, task] = chosen.to_numpy()
+        self._availability = np.zeros((self.n_persons, self.n_tasks, len(self.alternatives)))
+        self._availability[:, :, 0] = 1.0
+        self._availability[person, task, :] = 0.0
+        for j, alternative in enumerate(self.alternatives):
+            self._availability[person, task, j] = self._column(availability[alternative])
+        with np.errstate(divide="ignore"):
+            self._log_availability = np.log(self._availability > 0, dtype=self.dtype)
+
+        # draws evaluated at once: the probabilities, the residuals and the temporaries of the utilities take up to
+        # four (persons x tasks x alternatives) arrays of floats per draw
+        self.memory_limit = memory_limit or float(os.environ.get("AVCHOICE_MEMORY_LIMIT", 0)) or 2048
+        draw_bytes = 4 * self.dtype.itemsize * self.n_persons * self.n_tasks * len(self.alternatives)
+        self.draws_per_chunk = int(min(self.number_of_draws, max(1, self.memory_limit * 2**20 // draw_bytes)))
+
+        # persons evaluated together by a thread, about 2**18 values per chunk of draws; the blocks depend on the size
+        # of the problem only, so that the results do not depend on the number of threads
+        self.threads = threads or int(os.environ.get("AVCHOICE_CPUS", 0)) or os.cpu_count() or 1
+        block_size = self.n_tasks * len(self.alternatives) * self.draws_per_chunk
+        self.persons_per_block = int(min(self.n_persons, max(1, -(-2**18 // block_size))))
+
+        # group the terms of each utility by product of task-level variables
+        self.terms = {alternative: simplify(utilities[alternative]) for alternative in self.alternatives}
+        self._person_level = {}
+        self._utilities = [self._compile(self.terms[alternative]) for alternative in self.alternatives]
+        hoisted = sorted(name for name, person_level in self._person_level.items() if person_level)
+        logger.debug(f"Variables evaluated once per person: {hoisted}")
+
+        # data of the groups of terms for the fused kernel, (persons x tasks x groups), alternatives of the groups, and
+        # availabilities as booleans
+        if kernel not in ("numpy", "numba"):
+            raise ValueError(f"Unknown kernel {kernel}, expected numpy or numba.")
+        self.kernel = kernel
+        self._kernel_data, self._kernel_alternatives, self._kernel_available = None, None, None
+        if kernel == "numba":
+            ones = np.ones((self.n_persons, self.n_tasks), dtype=self.dtype)
+            columns = [ones if data is None else data for groups in self._utilities for _, data, _ in groups]
+            self._kernel_data = np.ascontiguousarray(np.stack(columns, axis=2))
+            self._kernel_alternatives = np.array(
+                [j for j, groups in enumerate(self._utilities) for _ in groups], dtype=np.intp
+            )
+            self._kernel_available = self._availability > 0
+
+    @classmethod
+    def from_biogeme(
+        cls, database, utilities, availability, choice, number_of_draws, model_name="mxl", draw_cache=None,
+        population_ids=None, memory_limit=None, dtype="float64", threads=None, kernel="numpy",
+    ):
+        """
+        Build the engine from the Biogeme utilities of a script.
+
+        The database must be declared as panel data, so that the draws are generated per person. The draws are
+        generated by the database, or taken from draw_cache (see draw_cache.py) if given, for the persons of the
+        database among population_ids.
+        """
+        betas, draw_types = {}, {}
+        terms = {
+            alternative: linearize(utility, betas, draw_types) for alternative, utility in utilities.items()
+        }
+        availability = {alternative: cls._name(value) for alternative, value in availability.items()}
+        names = sorted(draw_types)
+        draws = {}
+        started = time.perf_counter()
+        if names and draw_cache is not None:
+            person_ids = np.sort(database.data[database.panelColumn].unique())
+            draws = draw_cache.draws(draw_types, number_of_draws, person_ids, population_ids)
+        elif names:
+            table = database.generate_draws(draw_types, names, number_of_draws)
+            draws = {name: table[:, :, k] for k, name in enumerate(names)}
+        draw_seconds = time.perf_counter() - started
+        engine = cls(
+            database.data,
+            terms,
+            availability,
+            cls._name(choice),
+            draws,
+            start=betas,
+            panel=database.panelColumn,
+            model_name=model_name,
+            memory_limit=memory_limit,
+            dtype=dtype,
+            threads=threads,
+            kernel=kernel,
+        )
+
+        # settings of the draws, recorded with the estimation results (see results_store.py)
+        engine.draw_types = draw_types
+        engine.draw_seed = draw_cache.seed if draw_cache is not None else None
+        engine.timings["draws"] = draw_seconds
+        return engine
+
+    @classmethod
+    def from_specification(
+        cls, data, specification, number_of_draws, distributions, draw_cache=None, population_ids=None, seed=None,
+        panel="id", model_name=None, memory_limit=None, dtype="float64", threads=None, kernel="numpy",
+    ):
+        """
+        Build the engine from a ModelSpecification (see specification.py), whose terms are compiled once, without a
+        Biogeme database or expression.
+
+        :param distributions: dict distribution -> type of draws, e.g. {"triangular": "TRIANGULAR", "normal":
+            "NORMAL"}.
+        :param draw_cache: DrawCache of the draws, for the persons of data among population_ids. Without a cache, the
+            draws are generated with the given seed.
+        :param model_name: by default the name of the specification.
+        :param memory_limit: ceiling in MB of the intermediate arrays (see PanelMixedLogit).
+        :param dtype: "float64" or "float32" (see PanelMixedLogit).
+        :param threads: threads evaluating the blocks of persons (see PanelMixedLogit).
+        :param kernel: "numpy" or "numba" (see PanelMixedLogit).
+        """
+        draw_types = specification.draw_types(distributions)
+        person_ids = np.sort(data[panel].unique())
+        draws = {}
+        started = time.perf_counter()
+        if draw_types and draw_cache is not None:
+            draws = draw_cache.draws(draw_types, number_of_draws, person_ids, population_ids)
+        elif draw_types:
+            draws = generate_draws(draw_types, len(person_ids), number_of_draws, seed=seed)
+        draw_seconds = time.perf_counter() - started
+        engine = cls(
+            data,
+            specification.terms(),
+            specification.availability,
+            specification.choice,
+            draws,
+            start=specification.betas,
+            panel=panel,
+            model_name=model_name or specification.name,
+            memory_limit=memory_limit,
+            dtype=dtype,
+            threads=threads,
+            kernel=kernel,
+        )
+        engine.draw_types = draw_types
+        engine.draw_seed = draw_cache.seed if draw_cache is not None else seed
+        engine.timings["draws"] = draw_seconds
+        return engine
+
+    @staticmethod
+    def _name(value):
+        """
+        Name of a Biogeme variable, or the value of a constant.
+        """
+        if type(value).__name__ == "Variable":
+            return value.name
+        if type(value).__name__ == "Numeric":
+            return value.value
+        return value
+
+    def _column(self, value):
+        """
+        Values of a column (or a constant) for the rows of the data.
+        """
+        if isinstance(value, str):
+            return self._data[value].to_numpy(dtype=float)
+        return np.full(self.n_observations, float(value))
+
+    def _task_array(self, variables):
+        """
+        (persons x tasks) array of a product of variables, zero for the padded tasks.
+        """
+        values = np.ones(self.n_observations)
+        for name in variables:
+            values = values * self._column(name)
+        array = np.zeros((self.n_persons, self.n_tasks), dtype=self.dtype)
+        array[self._rows] = values
+        return array
+
+    def _is_person_level(self, name):
+        """
+        True if the column is constant within each panel, e.g. the socio-demographic covariates.
+        """
+        if name not in self._person_level:
+            values = self._column(name)
+            first = np.zeros(self.n_persons)
+            first[self._rows[0][::-1]] = values[::-1]
+            self._person_level[name] = bool(np.array_equal(values, first[self._rows[0]], equal_nan=True))
+        return self._person_level[name]
+
+    def _person_array(self, variables, draws):
+        """
+        Product of person-level variables and draws, (persons x draws) or (persons x 1) without draws, or None.
+        """
+        array = None
+        if variables:
+            values = np.ones(self.n_observations)
+            for name in variables:
+                values = values * self._column(name)
+            first = np.zeros(self.n_persons)
+            first[self._rows[0]] = values
+            array = first[:, None]
+        for name in draws:
+            array = self.draws[name] if array is None else array * self.draws[name]
+        return array if array is None else array.astype(self.dtype, copy=False)
+
+    def _compile(self, terms):
+        """
+        Group the terms of a utility by product of task-level variables.
+
+        The variables constant within each panel (socio-demographics, attitudes, ...) are hoisted with the draws in a
+        person-level array, so that only the task-level variables (hv_tt, av_tc, ...) are broadcast over the tasks.
+        Each group is (task variables, data array, [(coefficient, beta indices, person array), ...]), the data array
+        being None for the terms without task-level variables, and the person array None for the constant terms.
+        """
+        groups = {}
+        for term in terms:
+            beta_index = tuple(self._index[name] for name in term.betas)
+            person = tuple(name for name in term.variables if self._is_person_level(name))
+            task = tuple(name for name in term.variables if not self._is_person_level(name))
+            groups.setdefault(task, []).append(
+                (term.coefficient, beta_index, self._person_array(person, term.draws))
+            )
+        return [
+            (variables, self._task_array(variables) if variables else None, members)
+            for variables, members in groups.items()
+        ]
+
+    def _vector(self, betas):
+        """
+        Parameter vector from a dict of values, or from an array.
+        """
+        if isinstance(betas, dict):
+            x = self.start.copy()
+            for name, value in betas.items():
+                if name in self._index:
+                    x[self._index[name]] = value
+            return x
+        return np.asarray(betas, dtype=float)
+
+    @staticmethod
+    def _coefficient(coefficient, beta_index, x):
+        """
+        Value of the product of parameters of a term, as a Python float, which keeps the type of the arrays it
+        multiplies.
+        """
+        for i in beta_index:
+            coefficient = coefficient * x[i]
+        return float(coefficient)
+
+    def _blocks(self):
+        """
+        Views of the engine on blocks of persons_per_block persons, whose arrays are slices of those of the engine.
+        """
+        for first in range(0, self.n_persons, self.persons_per_block):
+            persons = slice(first, min(first + self.persons_per_block, self.n_persons))
+            block = copy.copy(self)
+            block.n_persons = persons.stop - persons.start
+            block.person_ids = self.person_ids[persons]
+            block.timings = {"draws": 0.0, "function": 0.0, "gradient": 0.0, "evaluations": 0}
+            block.draws = {name: values[persons] for name, values in self.draws.items()}
+            block._chosen = self._chosen[persons]
+            block._availability = self._availability[persons]
+            block._log_availability = self._log_availability[persons]
+            if self._kernel_data is not None:
+                block._kernel_data = self._kernel_data[persons]
+                block._kernel_available = self._kernel_available[persons]
+            block._utilities = [
+                [
+                    (
+                        variables,
+                        None if data is None else data[persons],
+                        [(c, i, None if person is None else person[persons]) for c, i, person in members],
+                    )
+                    for variables, data, members in groups
+                ]
+                for groups in self._utilities
+            ]
+            yield block
+
+    def _map(self, method, *arguments):
+        """
+        Results of a method of the engine evaluated on each block of persons, in the order of the blocks, on a pool of
+        threads, NumPy releasing the GIL in its array operations. A block is evaluated the same way on any thread, so
+        that the results are the same, to the bit, whatever the number of threads.
+        """
+        blocks = list(self._blocks())
+        if self.threads == 1 or len(blocks) == 1:
+            return [method(block, *arguments) for block in blocks]
+        with ThreadPoolExecutor(max_workers=min(self.threads, len(blocks))) as executor:
+            return list(executor.map(lambda block: method(block, *arguments), blocks))
+
+    @staticmethod
+    def _draw_slice(person, draws):
+        """
+        Person array for a slice of draws; the (persons x 1) arrays without draws are shared by all the draws.
+        """
+        if person is None or person.shape[1] == 1:
+            return person
+        return person[:, draws]
+
+    def _draw_chunks(self):
+        """
+        Slices of the draws evaluated at once, of draws_per_chunk draws.
+        """
+        for first in range(0, self.number_of_draws, self.draws_per_chunk):
+            yield slice(first, min(first + self.draws_per_chunk, self.number_of_draws))
+
+    def _group_values(self, members, x, draws=slice(None)):
+        """
+        Sum over the terms of a group of coefficient * person array, a (persons x draws) or (persons x 1) array, or a
+        scalar.
+        """
+        scalar, array = 0.0, None
+        for coefficient, beta_index, person in members:
+            value = self._coefficient(coefficient, beta_index, x)
+            person = self._draw_slice(person, draws)
+            if person is None:
+                scalar += value
+            elif array is None:
+                array = value * person
+            else:
+                array = array + value * person
+        return scalar if array is None else array + scalar
+
+    def utilities(self, betas, draws=slice(None)):
+        """
+        (persons x tasks x alternatives x draws) array of utilities, for all the draws or a slice of them.
+        """
+        x = self._vector(betas)
+        n_draws = len(range(*draws.indices(self.number_of_draws)))
+        v = np.zeros((self.n_persons, self.n_tasks, len(self.alternatives), n_draws), dtype=self.dtype)
+        for j, groups in enumerate(self._utilities):
+            for _, data, members in groups:
+                values = self._group_values(members, x, draws)
+                if data is None:
+                    v[:, :, j, :] += values[:, None, :] if np.ndim(values) else values
+                elif np.ndim(values):
+                    v[:, :, j, :] += data[:, :, None] * values[:, None, :]
+                else:
+                    v[:, :, j, :] += data[:, :, None] * values
+        return v
+
+    def log_probabilities(self, betas, draws=slice(None)):
+        """
+        (persons x tasks x alternatives x draws) array of logit log probabilities of all alternatives, -inf for the
+        unavailable alternatives, as utilities minus their log-sum-exp.
+        """
+        v = self.utilities(betas, draws)
+        v += self._log_availability[:, :, :, None]
+        v -= v.max(axis=2, keepdims=True)
+        v -= np.log(np.exp(v).sum(axis=2, keepdims=True))
+        return v
+
+    def probabilities(self, betas, draws=slice(None)):
+        """
+        (persons x tasks x alternatives x draws) array of logit probabilities of all alternatives.
+        """
+        log_probabilities = self.log_probabilities(betas, draws)
+        return np.exp(log_probabilities, out=log_probabilities)
+
+    def choice_probabilities(self, betas, draws=slice(None)):
+        """
+        (persons x tasks x draws) array of logit probabilities of the chosen alternatives.
+        """
+        return np.exp(self._choice_log_probabilities(self.log_probabilities(betas, draws)))
+
+    def _choice_log_probabilities(self, log_probabilities):
+        """
+        (persons x tasks x draws) log probabilities of the chosen alternatives, zero for the padded tasks.
+        """
+        return np.take_along_axis(log_probabilities, self._chosen[:, :, None, None], axis=2)[:, :, 0, :]
+
+    def panel_loglikelihood(self, betas, draws=slice(None)):
+        """
+        (persons x draws) array of the sums of the log choice probabilities over the tasks of each person, the log of
+        the panel likelihood, which does not underflow for long panels or unlikely choices.
+        """
+        return self._choice_log_probabilities(self.log_probabilities(betas, draws)).sum(axis=1, dtype=float)
+
+    def panel_likelihood(self, betas, draws=slice(None)):
+        """
+        (persons x draws) array of the products of the choice probabilities over the tasks of each person.
+        """
+        return np.exp(self.panel_loglikelihood(betas, draws))
+
+    @staticmethod
+    def _scale(shift, loglikelihood):
+        """
+        Running maximum over the chunks of draws of the log panel likelihood of each person, the shift of the
+        likelihoods before they are summed (log-sum-exp), and factor rescaling the sums of the previous chunks.
+
+        :return: shift (persons), rescaling factor (persons) and scaled likelihoods exp(log L_pr - shift_p) (persons x
+            draws).
+        """
+        scaled = np.maximum(shift, loglikelihood.max(axis=1))
+        return scaled, np.exp(shift - scaled), np.exp(loglikelihood - scaled[:, None])
+
+    def _fused(self, x, draws, gradient=True):
+        """
+        Log panel likelihood and sums of the residuals of each group of terms, for a slice of draws, from the fused
+        kernel (see kernels.py).
+
+        :return: log panel likelihood log L_pr (persons x draws) and, if gradient, sums over the tasks of the residuals
+            times the data of each group (persons x groups x draws).
+        """
+        # imported here, as Numba is only needed by the fused kernel
+        from .kernels import fused_logit
+
+        n_draws = len(range(*draws.indices(self.number_of_draws)))
+        values = np.empty((self.n_persons, len(self._kernel_alternatives), n_draws), dtype=self.dtype)
+        g = 0
+        for groups in self._utilities:
+            for _, _, members in groups:
+                values[:, g, :] = self._group_values(members, x, draws)
+                g += 1
+        loglikelihood = np.empty((self.n_persons, n_draws))
+        summed = np.empty_like(values) if gradient else np.empty((0, 0, 0), dtype=self.dtype)
+        fused_logit(
+            self._kernel_data,
+            values,
+            self._kernel_alternatives,
+            self._kernel_available,
+            self._chosen,
+            loglikelihood,
+            summed,
+            gradient,
+        )
+        return loglikelihood, summed
+
+    def _panel_sums(self, x):
+        """
+        Shift and scaled sum over the draws of the panel likelihood of each person, accumulated chunk by chunk, such
+        that sum_r L_pr = exp(shift_p) * total_p.
+        """
+        shift, total = np.full(self.n_persons, -np.inf), np.zeros(self.n_persons)
+        for draws in self._draw_chunks():
+            if self.kernel == "numba":
+                loglikelihood = self._fused(x, draws, gradient=False)[0]
+            else:
+                loglikelihood = self.panel_loglikelihood(x, draws)
+            shift, rescale, scaled = self._scale(shift, loglikelihood)
+            total = total * rescale + scaled.sum(axis=1)
+        return shift, total
+
+    def _person_loglikelihood(self, x):
+        """
+        Simulated log likelihood of each person of the engine or of a block.
+        """
+        shift, total = self._panel_sums(x)
+        return shift + np.log(total / self.number_of_draws)
+
+    def person_loglikelihood(self, betas):
+        """
+        Simulated log likelihood of each person, evaluated by blocks of persons.
+        """
+        return np.concatenate(self._map(PanelMixedLogit._person_loglikelihood, self._vector(betas)))
+
+    def loglikelihood(self, betas):
+        """
+        Simulated log likelihood of the sample, as log(MonteCarlo(PanelLikelihoodTrajectory(logit))) in Biogeme.
+        """
+        return float(self.person_loglikelihood(betas).sum())
+
+    def _coefficient_derivatives(self, coefficient, beta_index, x):
+        """
+        Derivatives of the product of parameters of a term, as a list of (beta index, value).
+        """
+        derivatives = []
+        for position, i in enumerate(beta_index):
+            if i in beta_index[:position]:
+                continue
+            others = beta_index[:position] + beta_index[position + 1:]
+            derivatives.append((i, beta_index.count(i) * self._coefficient(coefficient, others, x)))
+        return derivatives
+
+    def _coefficient_second_derivatives(self, coefficient, beta_index, x):
+        """
+        Second derivatives of the product of parameters of a term, as a list of (beta index, beta index, value).
+        """
+        derivatives = []
+        for a, i in enumerate(beta_index):
+            for b, k in enumerate(beta_index):
+                if a != b:
+                    others = tuple(index for c, index in enumerate(beta_index) if c not in (a, b))
+                    derivatives.append((i, k, self._coefficient(coefficient, others, x)))
+        return derivatives
+
+    def _residuals(self, x, draws):
+        """
+        Probabilities of all alternatives, log panel likelihood and residuals, for a slice of draws.
+
+        :return: probabilities P_tjr (persons x tasks x alternatives x draws), log panel likelihood log L_pr (persons x
+            draws) and residuals y_tj - P_tjr (persons x tasks x alternatives x draws). Weighted by L_pr / sum_r L_pr,
+            the residuals yield the scores.
+        """
+        log_probabilities = self.log_probabilities(x, draws)
+        loglikelihood = self._choice_log_probabilities(log_probabilities).sum(axis=1, dtype=float)
+        probabilities = np.exp(log_probabilities, out=log_probabilities)
+        residuals = -probabilities
+        np.put_along_axis(
+            residuals,
+            self._chosen[:, :, None, None],
+            np.take_along_axis(residuals, self._chosen[:, :, None, None], axis=2) + 1.0,
+            axis=2,
+        )
+        return probabilities, loglikelihood, residuals
+
+    def _group_sums(self, residuals):
+        """
+        For each group of terms of the utilities, sum over the tasks of the residuals times the data of the group, per
+        person and draw.
+        """
+        for j, groups in enumerate(self._utilities):
+            alternative_residuals = residuals[:, :, j, :]
+            for _, data, _ in groups:
+                if data is None:
+                    yield alternative_residuals.sum(axis=1)
+                else:
+                    yield np.einsum("pt,ptr->pr", data, alternative_residuals)
+
+    def _term_contributions(self, sums, draws=slice(None)):
+        """
+        For each term of the utilities, sum over the draws of the sums of its group (see _group_sums) times the draws
+        of the term, per person. Multiplied by the derivatives of the coefficient of the term, it yields the scores.
+        """
+        sums = iter(sums)
+        for groups in self._utilities:
+            for _, _, members in groups:
+                summed = next(sums)
+                for coefficient, beta_index, person in members:
+                    if not beta_index:
+                        continue
+                    person = self._draw_slice(person, draws)
+                    if person is None:
+                        contribution = summed.sum(axis=1)
+                    elif person.shape[1] == 1:
+                        contribution = summed.sum(axis=1) * person[:, 0]
+                    else:
+                        contribution = np.einsum("pr,pr->p", summed, person)
+                    yield coefficient, beta_index, contribution
+
+    def _person_scores(self, x):
+        """
+        Simulated log likelihood and scores of each person of the engine or of a block (see person_scores).
+
+        :return: array of log likelihoods (persons), array of scores (persons x parameters), and seconds spent on the
+            log likelihood and on the scores.
+        """
+        shift, total = np.full(self.n_persons, -np.inf), np.zeros(self.n_persons)
+        scores = np.zeros((self.n_persons, len(self.beta_names)))
+        function, gradient = 0.0, 0.0
+        for draws in self._draw_chunks():
+            started = time.perf_counter()
+            if self.kernel == "numba":
+                loglikelihood, residuals = self._fused(x, draws)
+            else:
+                loglikelihood, residuals = self._residuals(x, draws)[1:]
+            shift, rescale, scaled = self._scale(shift, loglikelihood)
+            total = total * rescale + scaled.sum(axis=1)
+            if self.kernel == "numba":
+                residuals *= scaled.astype(self.dtype)[:, None, :]
+                sums = np.moveaxis(residuals, 1, 0)
+            else:
+                residuals *= scaled.astype(self.dtype)[:, None, None, :]
+                sums = self._group_sums(residuals)
+            evaluated = time.perf_counter()
+            scores *= rescale[:, None]
+            for coefficient, beta_index, contribution in self._term_contributions(sums, draws):
+                for i, value in self._coefficient_derivatives(coefficient, beta_index, x):
+                    scores[:, i] += value * contribution
+            del residuals
+            function += evaluated - started
+            gradient += time.perf_counter() - evaluated
+        scores /= total[:, None]
+        return shift + np.log(total / self.number_of_draws), scores, (function, gradient)
+
+    def person_scores(self, betas):
+        """
+        Simulated log likelihood and analytic scores (derivatives with respect to the parameters) of each person.
+
+        With L_pr the product of the choice probabilities of person p for draw r, the score is
+        sum_r L_pr / sum_r L_pr * sum_t sum_j (y_tj - P_tjr) dV_tjr / dbeta, and dV / dbeta is obtained term by term
+        from the expansion of the utilities, e.g. d(b_cost * b_vot_rnd * tt) / db_cost = b_vot_rnd * tt. Both sums
+        over the draws are accumulated chunk by chunk (see draws_per_chunk), the likelihoods being scaled by their
+        running maximum so that they do not underflow, and the persons are evaluated by blocks (see _map).
+
+        :return: array of log likelihoods (persons), array of scores (persons x parameters).
+        """
+        started = time.perf_counter()
+        blocks = self._map(PanelMixedLogit._person_scores, self._vector(betas))
+        elapsed = time.perf_counter() - started
+
+        # the wall-clock time of the evaluation is split as the time of the blocks, summed over the threads
+        function = sum(seconds[0] for _, _, seconds in blocks)
+        gradient = sum(seconds[1] for _, _, seconds in blocks)
+        share = function / (function + gradient) if function + gradient > 0 else 1.0
+        self.timings["function"] += share * elapsed
+        self.timings["gradient"] += (1 - share) * elapsed
+        self.timings["evaluations"] += 1
+        return np.concatenate([block[0] for block in blocks]), np.concatenate([block[1] for block in blocks])
+
+    def bhhh(self, betas):
+        """
+        BHHH approximation of the information matrix: sum over the persons of the outer products of the scores.
+        """
+        _, scores = self.person_scores(betas)
+        return scores.T @ scores
+
+    def _utility_derivatives(self, x, draws):
+        """
+        Derivatives of the utilities for a slice of draws, (parameters x persons x tasks x alternatives x draws).
+        """
+        n_draws = len(range(*draws.indices(self.number_of_draws)))
+        derivatives = np.zeros((len(self.beta_names), self.n_persons, self.n_tasks, len(self.alternatives), n_draws))
+        for j, groups in enumerate(self._utilities):
+            for _, data, members in groups:
+                for coefficient, beta_index, person in members:
+                    if person is not None and person.shape[1] > 1:
+                        person = person[:, draws]
+                    for i, value in self._coefficient_derivatives(coefficient, beta_index, x):
+                        values = value if person is None else value * person
+                        if data is None:
+                            derivatives[i, :, :, j, :] += values[:, None, :] if np.ndim(values) else values
+                        elif np.ndim(values):
+                            derivatives[i, :, :, j, :] += data[:, :, None] * values[:, None, :]
+                        else:
+                            derivatives[i, :, :, j, :] += data[:, :, None] * values
+        return derivatives
+
+    def _hessian(self, x, draws_per_block):
+        """
+        Exact hessian of the simulated log likelihood of the persons of the engine or of a block (see hessian).
+        """
+        n_betas = len(self.beta_names)
+        hessian = np.zeros((n_betas, n_betas))
+        scores = np.zeros((self.n_persons, n_betas))
+        shift, total = self._panel_sums(x)
+        chosen = np.zeros((self.n_persons, self.n_tasks, len(self.alternatives)))
+        np.put_along_axis(chosen, self._chosen[:, :, None], 1.0, axis=2)
+        for draws in self._draw_chunks():
+            probabilities, loglikelihood, residuals = self._residuals(x, draws)
+            weights = np.exp(loglikelihood - shift[:, None]) / total[:, None]
+            residuals *= weights.astype(self.dtype)[:, None, None, :]
+
+            # second derivatives of the utilities, term by term, and person scores
+            for coefficient, beta_index, contribution in self._term_contributions(self._group_sums(residuals), draws):
+                for i, value in self._coefficient_derivatives(coefficient, beta_index, x):
+                    scores[:, i] += value * contribution
+                summed = contribution.sum()
+                for i, k, value in self._coefficient_second_derivatives(coefficient, beta_index, x):
+                    hessian[i, k] += value * summed
+            del residuals
+
+            # per-draw contributions of the first derivatives of the utilities
+            for first in range(draws.start, draws.stop, draws_per_block):
+                block = slice(first, min(first + draws_per_block, draws.stop))
+                local = slice(block.start - draws.start, block.stop - draws.start)
+                derivatives = self._utility_derivatives(x, block)
+                block_probabilities = probabilities[:, :, :, local]
+                block_weights = weights[:, local]
+                draw_scores = np.einsum("ptjr,kptjr->kpr", chosen[:, :, :, None] - block_probabilities, derivatives)
+                expected = np.einsum("ptjr,kptjr->kptr", block_probabilities, derivatives)
+
+                # the weighted sums of outer products are computed as matrix products of square-root weighted arrays
+                root = np.sqrt(block_weights)
+                weighted = (draw_scores * root).reshape(n_betas, -1)
+                hessian += weighted @ weighted.T
+                weighted = (expected * root[:, None, :]).reshape(n_betas, -1)
+                hessian += weighted @ weighted.T
+                weighted = derivatives * np.sqrt(block_probabilities * block_weights[:, None, None, :])
+                weighted = weighted.reshape(n_betas, -1)
+                hessian -= weighted @ weighted.T
+        hessian -= scores.T @ scores
+        return hessian
+
+    def hessian(self, betas, draws_per_block=None):
+        """
+        Exact hessian of the simulated log likelihood of the sample.
+
+        For each person, with w_r = L_r / sum_r L_r, g_r the score of draw r and s = sum_r w_r g_r,
+        H = sum_r w_r (g_r g_r' + dg_r / dbeta) - s s', where dg_r / dbeta involves the second derivatives of the
+        utilities and the covariance of their first derivatives across alternatives. The sums over the draws are
+        accumulated chunk by chunk, once sum_r L_r is known, and the per-draw contributions by blocks of draws, of
+        draws_per_block draws, to bound the memory. The hessians of the blocks of persons are summed in their order.
+        """
+        if draws_per_block is None:
+            # the derivatives of the utilities and two weighted copies of them, for all the blocks of persons at once
+            size = 3 * 8 * self.n_persons * self.n_tasks * len(self.alternatives) * len(self.beta_names)
+            draws_per_block = max(1, int(self.memory_limit * 2**20 // max(size, 1)))
+        # imported here, as the other modules of the package import the engine without evaluating it
+        from threadpoolctl import threadpool_limits
+
+        # the matrix products of the blocks on one BLAS thread, whose results do not depend on the number of threads
+        hessian = np.zeros((len(self.beta_names), len(self.beta_names)))
+        with threadpool_limits(limits=1, user_api="blas"):
+            for block in self._map(PanelMixedLogit._hessian, self._vector(betas), draws_per_block):
+                hessian += block
+        return hessian
+
+    def loglikelihood_and_gradient(self, betas):
+        """
+        Simulated log likelihood of the sample and its analytic gradient, sharing one evaluation of the utilities.
+        """
+        person_loglikelihood, scores = self.person_scores(betas)
+        return float(person_loglikelihood.sum()), scores.sum(axis=0)
+
+    def gradient(self, betas):
+        """
+        Analytic gradient of the simulated log likelihood of the sample.
+        """
+        return self.loglikelihood_and_gradient(betas)[1]
+
+    def check_gradient(self, betas=None, step=1e-6):
+        """
+        Compare the analytic gradient with central finite differences.
+
+        :return: table with the analytic and numerical derivatives, and their absolute and relative differences.
+        """
+        x = self.start.copy() if betas is None else self._vector(betas)
+        analytic = self.gradient(x)
+        numerical = np.zeros_like(x)
+        for i in range(len(x)):
+            h = step * max(1.0, abs(x[i]))
+            forward, backward = x.copy(), x.copy()
+            forward[i] += h
+            backward[i] -= h
+            numerical[i] = (self.loglikelihood(forward) - self.loglikelihood(backward)) / (2 * h)
+        difference = np.abs(analytic - numerical)
+        return pd.DataFrame(
+            {
+                "Analytic": analytic,
+                "Numerical": numerical,
+                "Abs. diff.": difference,
+                "Rel. diff.": difference / np.maximum(np.abs(numerical), 1.0),
+            },
+            index=self.beta_names,
+        )
+
+    def estimate(
+        self,
+        start=None,
+        algorithm="bfgs",
+        second_derivatives="exact",
+        max_iterations=1000,
+        tolerance=1e-6,
+        inverse_hessian=None,
+        checkpoint=None,
+        telemetry=None,
+    ):
+        """
+        Maximize the simulated log likelihood with the analytic gradient.
+
+        :param start: dict or array of starting values, by default the initial values of the betas.
+        :param algorithm: "bfgs" (quasi-Newton), "bhhh" (trust region with the BHHH matrix) or "newton" (trust
+            region with the exact hessian).
+        :param second_derivatives: "exact" or "bhhh", second derivatives used for the standard errors, or None to
+            skip them.
+        :param inverse_hessian: initial inverse hessian of BFGS (minus the log likelihood), by default the identity.
+        :param checkpoint: Checkpoint (see checkpoint.py) saved during the estimation; an interrupted estimation resumes
+            from it, with its parameters and inverse hessian of BFGS or trust radius.
+        :param telemetry: Telemetry (see telemetry.py) of the time of each iteration.
+        """
+        x0 = self.start.copy() if start is None else self._vector(start)
+        done, elapsed, trust_radius = 0, 0.0, 1.0
+        state = checkpoint.start(self, algorithm) if checkpoint is not None else None
+        if state is not None:
+            x0, done, elapsed = state["x"], state["iteration"], state["seconds"]
+            if "inverse_hessian" in state:
+                # symmetric up to rounding errors, which scipy does not accept as a starting matrix
+                inverse_hessian = (state["inverse_hessian"] + state["inverse_hessian"].T) / 2
+                try:
+                    np.linalg.cholesky(inverse_hessian)
+                except np.linalg.LinAlgError:
+                    logger.warning(f"The inverse hessian of the checkpoint is not positive definite, BFGS restarts "
+                                   f"from identity.")
+                    inverse_hessian = None
+            trust_radius = state.get("trust_radius", trust_radius)
+            logger.info(f"Estimation of {self.model_name} resumed at iteration {done} from {checkpoint.path}")
+        iteration = [done]
+        last = {}
+        started = time.perf_counter() - elapsed
+
+        def scores(x):
+            if "x" not in last or not np.array_equal(x, last["x"]):
+                person_loglikelihood, person_scores = self.person_scores(x)
+                last["x"], last["f"], last["scores"] = x.copy(), -person_loglikelihood.sum(), person_scores
+            return last["f"], last["scores"]
+
+        def objective(x):
+            value, person_scores = scores(x)
+            return value, -person_scores.sum(axis=0)
+
+        def hessian(x):
+            if algorithm == "newton":
+                return -self.hessian(x)
+            return scores(x)[1].T @ scores(x)[1]
+
+        # state of the optimizer at the last iteration, for the checkpoints: the inverse hessian of BFGS is updated as
+        # scipy updates it, which does not expose it, and the trust radius is estimated by the length of the last step
+        optimizer = {"x": x0, "trust_radius": trust_radius}
+        if checkpoint is not None and algorithm == "bfgs":
+            optimizer["gradient"] = objective(x0)[1]
+            optimizer["inverse_hessian"] = np.eye(len(x0)) if inverse_hessian is None else inverse_hessian
+
+        def update(x):
+            step = x - optimizer["x"]
+            if algorithm == "bfgs":
+                gradient = objective(x)[1]
+                change = gradient - optimizer["gradient"]
+                curvature = np.dot(change, step)
+                rho = 1000.0 if curvature == 0.0 else 1.0 / curvature
+                identity = np.eye(len(x), dtype=int)
+                left = identity - step[:, np.newaxis] * change[np.newaxis, :] * rho
+                right = identity - change[:, np.newaxis] * step[np.newaxis, :] * rho
+                optimizer["inverse_hessian"] = (
+                    np.dot(left, np.dot(optimizer["inverse_hessian"], right))
+                    + rho * step[:, np.newaxis] * step[np.newaxis, :]
+                )
+                optimizer["gradient"] = gradient
+            elif np.any(step != 0.0):
+                optimizer["trust_radius"] = min(float(np.linalg.norm(step)), 500.0)
+            optimizer["x"] = x.copy()
+
+        def callback(x, *args):
+            iteration[0] += 1
+            logger.info(f"Iter. {iteration[0]:5d}    Function {scores(x)[0]:.6g}    "
+                        f"Time {time.perf_counter() - started:.1f}s")
+            if telemetry is not None:
+                telemetry.iteration(self, iteration[0], -scores(x)[0])
+            if checkpoint is not None:
+                update(x)
+                if checkpoint.due(iteration[0]):
+                    checkpoint.save(
+                        iteration[0],
+                        x,
+                        time.perf_counter() - started,
+                        inverse_hessian=optimizer.get("inverse_hessian"),
+                        trust_radius=optimizer["trust_radius"] if algorithm != "bfgs" else None,
+                    )
+
+        logger.info(f"Native estimation of {self.model_name}: {len(self.beta_names)} parameters, "
+                    f"{self.n_persons} persons, {self.n_observations} observations, {self.number_of_draws} draws "
+                    f"({self.draws_per_chunk} per chunk)")
+        if telemetry is not None:
+            telemetry.start(self, algorithm, done)
+        if algorithm == "bfgs":
+            result = minimize(
+                objective,
+                x0,
+                method="BFGS",
+                jac=True,
+                callback=callback,
+                options={"maxiter": max_iterations - done, "gtol": tolerance, "hess_inv0": inverse_hessian},
+            )
+        elif algorithm in ("bhhh", "newton"):
+            result = minimize(
+                objective,
+                x0,
+                method="trust-exact",
+                jac=True,
+                hess=hessian,
+                callback=callback,
+                options={"maxiter": max_iterations - done, "gtol": tolerance, "initial_trust_radius": trust_radius},
+            )
+        else:
+            raise ValueError(f"Unknown algorithm {algorithm}, expected bfgs, bhhh or newton.")
+        logger.info(f"Final log likelihood: {-result.fun:.6f} ({result.message})")
+        if checkpoint is not None:
+            checkpoint.remove()
+        if telemetry is not None:
+            telemetry.end(self, done + result.nit, -result.fun, result.success)
+
+        # second derivatives for the standard errors
+        bhhh, second = None, None
+        if second_derivatives is not None:
+            bhhh = self.bhhh(result.x)
+            if second_derivatives == "exact":
+                second = self.hessian(result.x)
+            elif second_derivatives == "bhhh":
+                second = -bhhh
+            else:
+                raise ValueError(f"Unknown second derivatives {second_derivatives}, expected exact or bhhh.")
+            logger.info(f"Second derivatives ({second_derivatives}) calculated in "
+                        f"{time.perf_counter() - started:.1f}s since the start of the estimation")
+            if telemetry is not None:
+                telemetry.second_derivatives(self, second_derivatives)
+
+        results = EstimationResults(
+            self.model_name,
+            self.beta_names,
+            result.x,
+            -result.fun,
+            self.n_persons,
+            self.n_observations,
+            done + result.nit,
+            result.success,
+            hessian=second,
+            bhhh=bhhh,
+        )
+        logger.info(f"Estimated parameters:\n{results.get_estimated_parameters().to_string()}")
+        return results
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
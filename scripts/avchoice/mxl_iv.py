@@ -0,0 +1,109 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Specifications of the final mixed logit model IV (4-2 to 4-6) and of its constrained variant (4-4).
+#
+# VOT-space utilities with triangular VOTs by alternative, a common cost parameter, and normal alternative specific
+# constants of AV and AVWL interacted with the significant socio-demographic and attitudinal covariates of
+# 4-1-mxl-IV-initial.
+# ---------------------------------------------------------------------------------------------------------------------#
+from .specification import ModelSpecification
+
+MXL_IV_FINAL = ModelSpecification(
+    name="4-2-mxl-IV-final",
+    betas={
+        # alternative specific constants
+        "asc_av": -0.668,
+        "s_asc_av": 0.142,
+        "asc_avwl": -0.554,
+        "s_asc_avwl": 0.108,
+        # travel time and cost parameters
+        "b_cost": -0.00584,
+        "b_vot_hv": 0.731,
+        "s_vot_hv": 2.55,
+        "b_vot_av": 0.532,
+        "s_vot_av": 0.276,
+        "b_vot_avwl": 0.492,
+        "s_vot_avwl": 0.108,
+        # socio-demographic and attitudinal parameters
+        "b_school_2_av": 1.13,
+        "b_hh_child_av": 0.226,
+        "b_income_grp_2_av": 0,
+        "b_income_grp_3_av": 0,
+        "b_income_grp_5_av": 0,
+        "b_mode_social_3_av": 0,
+        "b_av_usefulness_av": 0,
+        "b_polychronicity_av": 0,
+        "b_envt_concern_av": 0,
+        "b_tba_tot_diff_av": 0,
+        "b_ttu_diff_av": 0,
+        "b_age_grp_3_avwl": -2.08,
+        "b_school_3_avwl": -0.0875,
+        "b_citation_avwl": 0,
+        "b_av_usefulness_avwl": 0,
+        "b_envt_concern_avwl": 0,
+        "b_av_fam_avwl": 0,
+        "b_tba_tot_diff_avwl": 0,
+        "b_ttu_diff_avwl": 0,
+    },
+    draws={
+        "b_vot_hv_rnd": "triangular",
+        "b_vot_av_rnd": "triangular",
+        "b_vot_avwl_rnd": "triangular",
+        "asv_av_rnd": "normal",
+        "asv_avwl_rnd": "normal",
+    },
+    components={
+        # random VOT parameters
+        "vot_hv": [("b_vot_hv",), ("s_vot_hv", "b_vot_hv_rnd")],
+        "vot_av": [("b_vot_av",), ("s_vot_av", "b_vot_av_rnd")],
+        "vot_avwl": [("b_vot_avwl",), ("s_vot_avwl", "b_vot_avwl_rnd")],
+        # random asc parameters
+        "asc_av_rnd": [
+            ("asc_av",),
+            ("s_asc_av", "asv_av_rnd"),
+            ("b_school_2_av", "school_2"),
+            ("b_hh_child_av", "hh_child"),
+            ("b_income_grp_2_av", "income_grp_2"),
+            ("b_income_grp_3_av", "income_grp_3"),
+            ("b_income_grp_5_av", "income_grp_5"),
+            ("b_mode_social_3_av", "mode_social_3"),
+            ("b_av_usefulness_av", "av_usefulness_std"),
+            ("b_polychronicity_av", "polychronicity_std"),
+            ("b_envt_concern_av", "envt_concern_std"),
+            ("b_tba_tot_diff_av", "tba_tot_diff"),
+            ("b_ttu_diff_av", "ttu_diff_std"),
+        ],
+        "asc_avwl_rnd": [
+            ("asc_avwl",),
+            ("s_asc_avwl", "asv_avwl_rnd"),
+            ("b_age_grp_3_avwl", "age_grp_3"),
+            ("b_school_3_avwl", "school_3"),
+            ("b_citation_avwl", "citation"),
+            ("b_av_usefulness_avwl", "av_usefulness_std"),
+            ("b_envt_concern_avwl", "envt_concern_std"),
+            ("b_av_fam_avwl", "av_fam_std"),
+            ("b_tba_tot_diff_avwl", "tba_tot_diff"),
+            ("b_ttu_diff_avwl", "ttu_diff_std"),
+        ],
+    },
+    utilities={
+        1: [("b_cost", "vot_hv", "hv_tt"), ("b_cost", "hv_tc")],
+        2: [("asc_av_rnd",), ("b_cost", "vot_av", "av_tt"), ("b_cost", "av_tc")],
+        3: [("asc_avwl_rnd",), ("b_cost", "vot_avwl", "avwl_tt"), ("b_cost", "avwl_tc")],
+    },
+    availability={1: "hv_av", 2: "av_av", 3: "avwl_av"},
+)
+
+# constrained model of the likelihood ratio test: the VOTs of AV and AVWL have the same mean and spread, and the same
+# draws
+MXL_IV_FINAL_LR_TEST = MXL_IV_FINAL.derive(
+    "4-4-mxl-IV-final-lr-test",
+    rename={
+        "b_vot_av": "b_vot_av_com",
+        "s_vot_av": "s_vot_av_com",
+        "b_vot_avwl": "b_vot_av_com",
+        "s_vot_avwl": "s_vot_av_com",
+        "b_vot_avwl_rnd": "b_vot_av_rnd",
+    },
+)
+
+# ---------------------------------------------------------------------------------------------------------------------#
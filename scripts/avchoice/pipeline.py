@@ -0,0 +1,254 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Incremental runner of the scripts of the analysis (run-pipeline.py).
+#
+# Each stage is a script with its input files (the script itself, the modules of avchoice it runs, the prepared data,
+# the stored results of other models...) and its output files. A stage runs only if the content hash of its inputs
+# changed since its last successful run, or if one of its outputs is missing or was modified. The stages whose inputs
+# are outputs of other stages wait for them; the other stages run concurrently within a budget of cores.
+# ---------------------------------------------------------------------------------------------------------------------#
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# interpreters of the scripts, by extension
+INTERPRETERS = {
+    ".py": [sys.executable],
+    ".R": ["Rscript"],
+}
+
+
+class Stage:
+    """
+    Script of the pipeline.
+
+    :param name: name of the stage, e.g. "5-2".
+    :param script: script run from the directory of the pipeline, e.g. "5-2-mxl-V-final.py".
+    :param inputs: files or directories read by the script, in addition to the script.
+    :param outputs: files written by the script.
+    :param cpus: cores used by the script, e.g. one per fold for the cross-validations.
+    """
+
+    def __init__(self, name, script, inputs=(), outputs=(), cpus=1):
+        self.name = name
+        self.script = script
+        self.inputs = [script] + list(inputs)
+        self.outputs = list(outputs)
+        self.cpus = cpus
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, {self.script!r})"
+
+
+def file_hash(path):
+    """
+    Hash of the content of a file, or of the Python files of a directory, or None if there is no such path.
+    """
+    if os.path.isdir(path):
+        digest = hashlib.sha1()
+        for directory, directories, files in os.walk(path):
+            # pruned during the walk, so that the bytecode and the Numba caches written by the scripts are not read
+            directories[:] = sorted(name for name in directories if name != "__pycache__")
+            for name in sorted(name for name in files if name.endswith(".py")):
+                digest.update(os.path.relpath(os.path.join(directory, name), path).encode())
+                digest.update(file_hash(os.path.join(directory, name)).encode())
+        return digest.hexdigest()
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Pipeline:
+    """
+    Stages of the analysis and the hashes of their last successful runs.
+
+    :param stages: list of Stage, in the order of the analysis.
+    :param state_path: .json file of the hashes of the inputs and outputs of the last successful runs.
+    :param log_directory: directory of the console output of each stage.
+    """
+
+    def __init__(self, stages, state_path="../outputs/pipeline.json", log_directory="../outputs/pipeline"):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+        self.log_directory = log_directory
+        producers = {path: stage.name for stage in stages for path in stage.outputs}
+        self.upstream = {
+            stage.name: sorted(
+                {producers[path] for path in stage.inputs if producers.get(path, stage.name) != stage.name}
+            )
+            for stage in stages
+        }
+
+    def load_state(self):
+        """
+        Hashes of the last successful runs, dict stage name -> {"inputs": hash, "outputs": {path: hash}}.
+        """
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path) as file:
+            return json.load(file)
+
+    def save_state(self, state):
+        """
+        Save the hashes of the last successful runs, through a temporary file.
+        """
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(state, file, indent=4)
+        os.replace(temporary, self.state_path)
+
+    def input_hash(self, stage):
+        """
+        Hash of the inputs of a stage.
+        """
+        digest = hashlib.sha1()
+        for path in sorted(stage.inputs):
+            digest.update(path.encode())
+            digest.update(str(file_hash(path)).encode())
+        return digest.hexdigest()
+
+    def outdated(self, stage, state):
+        """
+        Reason to run a stage, or None if it is up to date.
+        """
+        previous = state.get(stage.name)
+        if previous is None:
+            return "never run"
+        if previous["inputs"] != self.input_hash(stage):
+            return "inputs changed"
+        for path in stage.outputs:
+            if file_hash(path) != previous["outputs"].get(path):
+                return f"{path} missing or modified"
+        return None
+
+    def selection(self, targets=None):
+        """
+        Names of the stages of the targets and of their upstream stages, in the order of the analysis.
+        """
+        if not targets:
+            return list(self.stages)
+        unknown = [name for name in targets if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown stages {unknown}, expected some of {list(self.stages)}.")
+        selected = set()
+        queue = list(targets)
+        while queue:
+            name = queue.pop()
+            if name not in selected:
+                selected.add(name)
+                queue += self.upstream[name]
+        return [name for name in self.stages if name in selected]
+
+    def _start(self, stage, cpus):
+        """
+        Start the script of a stage, its numerical libraries limited to its cores.
+        """
+        environment = dict(os.environ)
+        for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "AVCHOICE_CPUS"):
+            environment[variable] = str(cpus)
+        interpreter = INTERPRETERS[os.path.splitext(stage.script)[1]]
+        os.makedirs(self.log_directory, exist_ok=True)
+        log = open(os.path.join(self.log_directory, f"{stage.name}.txt"), "w")
+        process = subprocess.Popen(interpreter + [stage.script], stdout=log, stderr=subprocess.STDOUT, env=environment)
+        log.close()
+        return process
+
+    def run(self, targets=None, force=(), cpus=None, dry_run=False):
+        """
+        Run the outdated stages of the targets (all stages by default) and of their upstream stages.
+
+        :param force: names of stages run even if they are up to date.
+        :param cpus: budget of cores of the concurrent stages, by default the number of cores.
+        :param dry_run: only report the stages that would run; the stages downstream of an outdated stage are reported
+            as waiting, since their inputs are only known once it has run.
+        :return: dict stage name -> "up to date", "done", "failed", "blocked" (an upstream stage failed) or, in a dry
+            run, the reason to run it.
+        """
+        cpus = cpus or os.cpu_count() or 1
+        names = self.selection(targets)
+        state = self.load_state()
+        status = {}
+        running = {}
+        used = 0
+        while len(status) < len(names):
+            progress = False
+            for name in names:
+                if name in status or name in running:
+                    continue
+                upstream = [status.get(other) for other in self.upstream[name] if other in names]
+                if any(value in ("failed", "blocked") for value in upstream):
+                    status[name] = "blocked"
+                    logger.warning(f"Stage {name} blocked by a failed upstream stage")
+                    progress = True
+                    continue
+                if dry_run and any(value not in (None, "up to date") for value in upstream):
+                    status[name] = "waiting for upstream stages"
+                    progress = True
+                    continue
+                if not all(value in ("up to date", "done") for value in upstream):
+                    continue
+                stage = self.stages[name]
+                reason = "forced" if name in force else self.outdated(stage, state)
+                if reason is None:
+                    status[name] = "up to date"
+                    progress = True
+                    continue
+                if dry_run:
+                    status[name] = reason
+                    progress = True
+                    continue
+
+                # a stage needing more than the budget runs alone
+                stage_cpus = min(stage.cpus, cpus)
+                if running and used + stage_cpus > cpus:
+                    continue
+                logger.info(f"Stage {name} started ({reason}, {stage_cpus} cores)")
+
+                # inputs hashed before the script starts, as it may write to them, e.g. the bytecode of the package
+                inputs = self.input_hash(stage)
+                running[name] = (self._start(stage, stage_cpus), inputs, time.perf_counter())
+                used += stage_cpus
+                progress = True
+
+            for name, (process, inputs, started) in list(running.items()):
+                if process.poll() is None:
+                    continue
+                del running[name]
+                stage = self.stages[name]
+                used -= min(stage.cpus, cpus)
+                progress = True
+                seconds = time.perf_counter() - started
+                if process.returncode != 0:
+                    status[name] = "failed"
+                    logger.error(f"Stage {name} failed in {seconds:.1f} s, see {self.log_directory}/{name}.txt")
+                    continue
+                missing = [path for path in stage.outputs if not os.path.exists(path)]
+                if missing:
+                    logger.warning(f"Stage {name} did not write {missing}")
+                status[name] = "done"
+                state[name] = {
+                    "inputs": inputs,
+                    "outputs": {path: file_hash(path) for path in stage.outputs},
+                    "seconds": round(seconds, 1),
+                }
+                self.save_state(state)
+                logger.info(f"Stage {name} done in {seconds:.1f} s")
+
+            if not progress:
+                time.sleep(0.2)
+        return {name: status[name] for name in names}
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
@@ -0,0 +1,164 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Typed columnar storage of the prepared data.
+#
+# 0-prepare-data.py writes two uncompressed Arrow IPC (Feather v2) files: a person table keyed by id, with the
+# socio-demographic, attitudinal and trip attributes, and a task table with one row per choice task (id, scenario,
+# chosen, travel times, travel costs and availabilities). Dummies are stored as int8, the other integer columns with
+# the smallest integer type and the continuous columns as float32, and each table has a .json manifest of its column
+# groups. The model scripts memory-map the tables, read only the columns of their variables, and broadcast the person
+# attributes to the tasks for these columns only.
+# ---------------------------------------------------------------------------------------------------------------------#
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from pyarrow import feather
+
+# columns of the choice tasks, in the choice group of the manifest of the task table
+CHOICE_COLUMNS = [
+    "scenario",
+    "chosen",
+    "hv_tt",
+    "hv_tc",
+    "av_tt",
+    "av_tc",
+    "avwl_tt",
+    "avwl_tc",
+    "hv_av",
+    "av_av",
+    "avwl_av",
+]
+
+
+def _manifest_path(path):
+    """
+    Path of the manifest of a table of the prepared data.
+    """
+    return f"{os.path.splitext(path)[0]}.json"
+
+
+def compact_types(df, panel="id"):
+    """
+    Copy of the data with compact column types, and the column groups: panel, choice, dummies, integers and
+    continuous.
+
+    The panel column keeps its type, so that the keys of the draw cache do not change.
+    """
+    df = df.copy()
+    groups = {"panel": [panel], "choice": [], "dummies": [], "integers": [], "continuous": []}
+    for column in df.columns:
+        if column == panel:
+            continue
+        values = df[column]
+        if values.dtype == bool:
+            values = values.astype(np.int8)
+        integer = pd.api.types.is_integer_dtype(values) or (
+            pd.api.types.is_float_dtype(values) and np.array_equal(values, np.round(values))
+        )
+        if integer and values.isin([0, 1]).all():
+            df[column] = values.astype(np.int8)
+            group = "dummies"
+        elif integer:
+            df[column] = pd.to_numeric(values.astype(np.int64), downcast="integer")
+            group = "integers"
+        else:
+            df[column] = values.astype(np.float32)
+            group = "continuous"
+        groups["choice" if column in CHOICE_COLUMNS else group].append(column)
+    return df, groups
+
+
+TABLES = ("persons", "tasks")
+
+
+def table_path(table, directory="../data"):
+    """
+    Path of the Arrow file of a table of the prepared data, "persons" or "tasks".
+    """
+    return os.path.join(directory, f"prepared_{table}.arrow")
+
+
+def write_table(df, path, panel="id"):
+    """
+    Write a table as an uncompressed Arrow IPC file with compact types, and its manifest.
+    """
+    df, groups = compact_types(df, panel)
+    feather.write_feather(df.reset_index(drop=True), path, compression="uncompressed")
+    manifest = {
+        "rows": len(df),
+        "columns": {column: str(dtype) for column, dtype in df.dtypes.items()},
+        "groups": groups,
+    }
+    with open(_manifest_path(path), "w") as file:
+        json.dump(manifest, file, indent=4)
+
+
+def write_prepared_data(persons, tasks, directory="../data", panel="id"):
+    """
+    Write the person table (one row per person) and the task table (one row per choice task) of the prepared data.
+    """
+    if persons[panel].duplicated().any():
+        raise ValueError(f"The person table has several rows for some values of {panel}.")
+    write_table(persons, table_path("persons", directory), panel)
+    write_table(tasks, table_path("tasks", directory), panel)
+
+
+def read_manifest(table, directory="../data"):
+    """
+    Manifest of a table of the prepared data: number of rows, column types and column groups.
+    """
+    with open(_manifest_path(table_path(table, directory))) as file:
+        return json.load(file)
+
+
+def variable_names(namespace):
+    """
+    Sorted names of the Biogeme variables of a namespace, e.g. the globals() of a script.
+    """
+    return sorted({value.name for value in namespace.values() if type(value).__name__ == "Variable"})
+
+
+def _read_table(table, columns, directory):
+    """
+    Memory-mapped columns of a table; with split blocks, the numeric columns of the pandas frame are views of the file.
+    """
+    arrow_table = feather.read_table(table_path(table, directory), columns=columns, memory_map=True)
+    return arrow_table.to_pandas(split_blocks=True)
+
+
+def read_prepared_data(columns=None, groups=None, directory="../data", panel="id"):
+    """
+    Prepared data in long format, one row per choice task, restricted to the given columns and column groups of the
+    manifests (all columns by default). Only the selected person attributes are broadcast to the tasks.
+
+    Falls back to the long format pickle written by earlier versions of 0-prepare-data.py if there are no Arrow files.
+    """
+    selected = None
+    if columns is not None or groups is not None:
+        selected = list(columns or [])
+        for group in groups or []:
+            for table in TABLES:
+                selected += read_manifest(table, directory)["groups"].get(group, [])
+        selected = list(dict.fromkeys(selected))
+    if not os.path.exists(table_path("tasks", directory)):
+        df = pd.read_pickle(os.path.join(directory, "prepared_data.pkl"))
+        return df if selected is None else df[selected]
+
+    task_columns = list(read_manifest("tasks", directory)["columns"])
+    person_columns = [column for column in read_manifest("persons", directory)["columns"] if column not in task_columns]
+    if selected is not None:
+        unknown = [column for column in selected if column not in task_columns + person_columns]
+        if unknown:
+            raise KeyError(f"Columns {unknown} are not in the prepared data.")
+        task_columns = [column for column in task_columns if column in selected or column == panel]
+        person_columns = [column for column in person_columns if column in selected]
+
+    tasks = _read_table("tasks", task_columns, directory)
+    if person_columns:
+        persons = _read_table("persons", [panel] + person_columns, directory).set_index(panel)
+        tasks = tasks.join(persons, on=panel)
+    return tasks if selected is None else tasks[selected]
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
@@ -0,0 +1,178 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Persistent store of the estimation results of the native engine, looked up by model name.
+#
+# Each model has a .npz file with its estimates, log likelihood and second derivatives (see EstimationResults.save),
+# and a .json file with its fingerprint: a hash of the specification of the utilities, a hash of the data, and the
+# settings of the draws. Downstream scripts (validation, elasticities, likelihood ratio tests) read the results of a
+# model instead of estimating it again, and a model is re-estimated only when its fingerprint changes.
+# ---------------------------------------------------------------------------------------------------------------------#
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+from .mixed_logit import EstimationResults
+
+logger = logging.getLogger(__name__)
+
+
+def specification_hash(engine):
+    """
+    Hash of the utilities of the engine (terms, fixed parameters included, and alternatives), and of its draws.
+
+    The starting values are not part of the specification, as they do not change the model.
+    """
+    specification = {
+        "utilities": {
+            str(alternative): sorted(repr(tuple(term)) for term in engine.terms[alternative])
+            for alternative in engine.alternatives
+        },
+        "number_of_draws": engine.number_of_draws,
+        "draw_types": engine.draw_types,
+        "draw_seed": engine.draw_seed,
+    }
+    # the float32 evaluation yields different estimates; float64 is left out so that the stored results stay valid
+    if engine.dtype != np.float64:
+        specification["dtype"] = str(engine.dtype)
+    return hashlib.sha1(json.dumps(specification, sort_keys=True).encode()).hexdigest()
+
+
+def data_hash(engine):
+    """
+    Hash of the data entering the likelihood: persons, choices, availabilities and variables of the utilities.
+    """
+    digest = hashlib.sha1()
+    digest.update(np.asarray(engine.person_ids).astype(str).astype(bytes).tobytes())
+    digest.update(np.ascontiguousarray(engine._chosen).tobytes())
+    digest.update(np.ascontiguousarray(engine._availability).tobytes())
+    variables = sorted({name for terms in engine.terms.values() for term in terms for name in term.variables})
+    for name in variables:
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(engine._column(name)).tobytes())
+    return digest.hexdigest()
+
+
+class ResultsStore:
+    """
+    Directory of estimation results.
+
+    :param directory: directory of the .npz and .json files, by default the outputs of the scripts.
+    """
+
+    def __init__(self, directory="../outputs"):
+        self.directory = directory
+
+    def paths(self, model_name):
+        """
+        Paths of the results and of the fingerprint of a model.
+        """
+        path = os.path.join(self.directory, model_name)
+        return f"{path}.npz", f"{path}.json"
+
+    def fingerprint(self, model_name):
+        """
+        Fingerprint of the stored results of a model, or None.
+        """
+        _, path = self.paths(model_name)
+        if not os.path.exists(path):
+            return None
+        with open(path) as file:
+            return json.load(file)
+
+    def get(self, model_name, engine=None):
+        """
+        Stored results of a model, or None if there are none or, when an engine is given, if they were estimated with
+        another specification, other data or other draws than the engine's.
+        """
+        results_path, _ = self.paths(model_name)
+        fingerprint = self.fingerprint(model_name)
+        if fingerprint is None or not os.path.exists(results_path):
+            return None
+        if engine is not None:
+            for key, current in (("spec_hash", specification_hash(engine)), ("data_hash", data_hash(engine))):
+                if fingerprint.get(key) != current:
+                    logger.info(f"Stored results of {model_name} are out of date ({key} changed).")
+                    return None
+        return EstimationResults.load(results_path)
+
+    def put(self, results, engine):
+        """
+        Store the results of an estimation with the engine, under the name of the results.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        results_path, path = self.paths(results.model_name)
+
+        fingerprint = {
+            "model_name": results.model_name,
+            "spec_hash": specification_hash(engine),
+            "data_hash": data_hash(engine),
+            "draws": {
+                "number_of_draws": engine.number_of_draws,
+                "draw_types": engine.draw_types,
+                "draw_seed": engine.draw_seed,
+            },
+            "loglike": results.loglike,
+            "n_persons": results.n_persons,
+            "n_observations": results.n_observations,
+            "converged": bool(results.converged),
+            "betas": results.get_beta_values(),
+        }
+        if results.hessian is not None:
+            fingerprint["covariance"] = results.covariance().tolist()
+
+        # the fingerprint of the previous results is removed first and written last, through temporary files, so that a
+        # crash while saving never leaves a fingerprint next to results it does not describe
+        if os.path.exists(path):
+            os.remove(path)
+        # (numpy adds .npz to the names of the files it saves without it)
+        temporary = f"{results_path[:-len('.npz')]}.{os.getpid()}.tmp.npz"
+        results.save(temporary)
+        os.replace(temporary, results_path)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(fingerprint, file, indent=4)
+        os.replace(temporary, path)
+
+    def checkpoint(self, model_name):
+        """
+        Checkpoint of the estimation of a model (see checkpoint.py), in the checkpoints directory of the store.
+        """
+        from .checkpoint import Checkpoint
+
+        return Checkpoint(os.path.join(self.directory, "checkpoints", f"{model_name}.npz"))
+
+    def telemetry(self, model_name):
+        """
+        Telemetry of the estimations of a model (see telemetry.py), next to the log of its script.
+        """
+        from .telemetry import Telemetry
+
+        return Telemetry(os.path.join(self.directory, f"{model_name}.telemetry.jsonl"))
+
+    def get_or_estimate(self, engine, source=None, force=False, **options):
+        """
+        Results of the model of the engine, estimated only if the store has no up-to-date results.
+
+        :param source: name of the model whose results are looked up first, e.g. the estimation script of a model
+            reused by the elasticity script. By default, and if they are out of date, the results stored under the
+            name of the engine are looked up.
+        :param force: estimate the model even if the store has up-to-date results.
+        :param options: options of PanelMixedLogit.estimate. The estimation is checkpointed in the store by default,
+            and resumes from its checkpoint if it was interrupted, and its telemetry is written next to the results.
+        """
+        if not force:
+            for model_name in dict.fromkeys([source or engine.model_name, engine.model_name]):
+                results = self.get(model_name, engine)
+                if results is not None:
+                    logger.info(f"Results of {model_name} read from the store, log likelihood {results.loglike:.6f}")
+                    return results
+        options.setdefault("checkpoint", self.checkpoint(engine.model_name))
+        options.setdefault("telemetry", self.telemetry(engine.model_name))
+        results = engine.estimate(**options)
+        self.put(results, engine)
+        return results
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
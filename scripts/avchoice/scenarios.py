@@ -0,0 +1,163 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Batched what-if scenarios of the panel mixed logit models (4-6).
+#
+# A scenario is a set of declarative overrides of data columns, e.g. {"tba_tot_diff": ("add", 1)} or
+# {"age_grp_2": ("set", 0), "age_grp_3": ("set", 1)}. The utilities of the base data are computed once; each scenario
+# only changes the terms of the utilities that use an overridden column, so the utilities of all scenarios are the
+# base utilities plus a stack of differences, evaluated together over the same draws.
+# ---------------------------------------------------------------------------------------------------------------------#
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# operations of the overrides: (operation, value) applied to the values of a column
+OPERATIONS = {
+    "add": lambda values, value, data: values + value,
+    "multiply": lambda values, value, data: values * value,
+    "set": lambda values, value, data: np.full_like(values, value),
+    "column": lambda values, value, data: data[value].to_numpy(dtype=float),
+}
+
+
+def _override(engine, name, override):
+    """
+    Values of the column name for the rows of the data of the engine after an override.
+    """
+    operation, value = override
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown operation {operation} on {name}, expected one of {sorted(OPERATIONS)}.")
+    return OPERATIONS[operation](engine._column(name), value, engine._data)
+
+
+def _task_product(engine, variables, columns):
+    """
+    (persons x tasks) array of a product of variables, whose values are taken from columns when overridden.
+    """
+    values = np.ones(engine.n_observations)
+    for name in variables:
+        values = values * (columns[name] if name in columns else engine._column(name))
+    array = np.zeros((engine.n_persons, engine.n_tasks))
+    array[engine._rows] = values
+    return array
+
+
+def _draw_product(engine, draws):
+    """
+    (persons x draws) array of a product of draws, or None.
+    """
+    array = None
+    for name in draws:
+        array = engine.draws[name] if array is None else array * engine.draws[name]
+    return array
+
+
+def _differences(engine, x, overrides):
+    """
+    Changes of the utilities under the overrides of a scenario, as a list of (alternative index, coefficient times
+    change of the data, (persons x tasks), draw product (persons x draws) or None) over the terms that use an
+    overridden column. The overrides of columns that no term uses are ignored, as the data of the engine may not have
+    them.
+    """
+    variables = {name for terms in engine.terms.values() for term in terms for name in term.variables}
+    for name in sorted(set(overrides) - variables):
+        logger.warning(f"Column {name} is not a variable of the utilities, its override is ignored.")
+    columns = {name: _override(engine, name, override) for name, override in overrides.items() if name in variables}
+    differences = []
+    for j, alternative in enumerate(engine.alternatives):
+        for term in engine.terms[alternative]:
+            if not set(term.variables) & set(columns):
+                continue
+            coefficient = engine._coefficient(term.coefficient, [engine._index[name] for name in term.betas], x)
+            change = _task_product(engine, term.variables, columns) - _task_product(engine, term.variables, {})
+            differences.append((j, coefficient * change, _draw_product(engine, term.draws)))
+    return differences
+
+
+def _panel_probabilities(v, availability, observed):
+    """
+    Simulated probabilities of choosing each alternative in all the tasks of a person, (... x persons x
+    alternatives), from (... x persons x tasks x alternatives x draws) utilities.
+    """
+    v = np.where(availability[..., None] > 0, v, -np.inf)
+    v = v - v.max(axis=-2, keepdims=True)
+    v -= np.log(np.exp(v).sum(axis=-2, keepdims=True))
+
+    # the products over the tasks are sums of log probabilities, in which the padded tasks do not enter
+    v = np.where(observed[:, :, None, None], v, 0.0)
+    return np.exp(v.sum(axis=-3, dtype=float)).mean(axis=-1)
+
+
+def scenario_changes(engine, betas, scenarios, alternative_names=None, persons_per_block=None):
+    """
+    Mean percentage changes of the simulated panel choice probabilities of each alternative under what-if scenarios,
+    as Biogeme's exp(log(MonteCarlo(PanelLikelihoodTrajectory(models.logit(v, av, alternative))))) for the base data
+    and for each scenario.
+
+    :param engine: PanelMixedLogit of the model.
+    :param betas: dict of the estimated parameters.
+    :param scenarios: dict scenario name -> dict column -> (operation, value), the operation being "add", "multiply",
+        "set" or "column" (values taken from another column, e.g. ("column", "envt_concern_scen")).
+    :param alternative_names: dict alternative -> name in the table, e.g. {1: "HV", 2: "AV", 3: "AVWL"}.
+    :param persons_per_block: persons evaluated at once for all the scenarios, by default the persons of the engine
+        divided by the number of scenarios. The engine evaluates its chunks of draws (see
+        PanelMixedLogit.draws_per_chunk) within its memory limit with up to four utility arrays of all the persons; here
+        the base utilities of all the persons, and the utilities of the scenarios of a block of persons with about two
+        temporaries of their size, stay within the same limit.
+    :return: tidy table with one row per scenario and alternative.
+    """
+    x = engine._vector(betas)
+    names = list(scenarios)
+    if persons_per_block is None:
+        persons_per_block = max(1, engine.n_persons // max(1, len(names)))
+    differences = [_differences(engine, x, scenarios[name]) for name in names]
+    for name, scenario_differences in zip(names, differences):
+        if not scenario_differences:
+            logger.warning(f"Scenario {name} overrides no variable of the utilities.")
+
+    observed = np.zeros((engine.n_persons, engine.n_tasks), dtype=bool)
+    observed[engine._rows] = True
+    base = np.zeros((engine.n_persons, len(engine.alternatives)))
+    changed = np.zeros((len(names), engine.n_persons, len(engine.alternatives)))
+    for draws in engine._draw_chunks():
+        # sums over the chunks of draws of the engine (see PanelMixedLogit.draws_per_chunk), averaged below
+        v_base = engine.utilities(x, draws)
+        n_draws = v_base.shape[-1]
+        for start in range(0, engine.n_persons, persons_per_block):
+            block = slice(start, start + persons_per_block)
+            availability, block_observed = engine._availability[block], observed[block]
+            base[block] += n_draws * _panel_probabilities(v_base[block], availability, block_observed)
+
+            # utilities of all the scenarios, stacked on a first axis
+            v = np.repeat(v_base[None, block], len(names), axis=0)
+            for s, scenario_differences in enumerate(differences):
+                for j, change, draw_product in scenario_differences:
+                    if draw_product is None:
+                        v[s, :, :, j, :] += change[block][:, :, None]
+                    else:
+                        v[s, :, :, j, :] += change[block][:, :, None] * draw_product[block, draws][:, None, :]
+            changed[:, block] += n_draws * _panel_probabilities(v, availability, block_observed)
+        del v_base
+    base /= engine.number_of_draws
+    changed /= engine.number_of_draws
+
+    alternative_names = alternative_names or {}
+    rows = []
+    for s, name in enumerate(names):
+        for j, alternative in enumerate(engine.alternatives):
+            change = pd.Series((changed[s, :, j] - base[:, j]) / base[:, j])
+            rows.append(
+                {
+                    "Scenario": name,
+                    "Alternative": alternative_names.get(alternative, alternative),
+                    "Mean change (%)": round(change.mean() * 100, 2),
+                }
+            )
+    table = pd.DataFrame(rows)
+    logger.info(f"Mean changes of the choice probabilities:\n{table.to_string(index=False)}")
+    return table
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
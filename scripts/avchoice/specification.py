@@ -0,0 +1,184 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Declarative specification of the VOT-space logit models.
+#
+# A specification lists the free parameters with their starting values, the draws with their distribution, named
+# components (random parameters with their covariate interactions) and the utilities, each utility and component
+# being a sum of products of names. It is compiled once into the elementary terms evaluated by the native engine
+# (see terms.py), without building and expanding a Biogeme expression, and into Biogeme expressions for the Biogeme
+# engine. Variants of a model, e.g. the constrained model of a likelihood ratio test, are derived from it by listing
+# their differences.
+# ---------------------------------------------------------------------------------------------------------------------#
+from .terms import Term, simplify
+
+
+def _rename(products, rename):
+    """
+    Products with their names renamed.
+    """
+    return [tuple(rename.get(name, name) for name in product) for product in products]
+
+
+class ModelSpecification:
+    """
+    Specification of a logit model whose utilities are sums of products of parameters, variables and draws.
+
+    :param name: model name.
+    :param betas: dict beta name -> starting value of the free parameters.
+    :param draws: dict draw name -> distribution, "triangular" or "normal".
+    :param components: dict component name -> list of products, each product being a tuple of names of betas, draws,
+        variables or other components, e.g. {"vot_hv": [("b_vot_hv",), ("s_vot_hv", "b_vot_hv_rnd")]}.
+    :param utilities: dict alternative -> list of products, e.g. {1: [("b_cost", "vot_hv", "hv_tt"), ("b_cost",
+        "hv_tc")], ...}.
+    :param availability: dict alternative -> column of the availability.
+    :param choice: column of the chosen alternative.
+    """
+
+    def __init__(self, name, betas, draws, components, utilities, availability, choice="chosen"):
+        self.name = name
+        self.betas = dict(betas)
+        self.draws = dict(draws)
+        self.components = {component: list(products) for component, products in components.items()}
+        self.utilities = {alternative: list(products) for alternative, products in utilities.items()}
+        self.availability = dict(availability)
+        self.choice = choice
+        for first, second in ((self.betas, self.draws), (self.betas, self.components), (self.draws, self.components)):
+            shared = sorted(set(first) & set(second))
+            if shared:
+                raise ValueError(f"Names {shared} of {name} are used for several kinds of names.")
+        self._terms = None
+
+    def __repr__(self):
+        return f"ModelSpecification({self.name!r}, {len(self.betas)} betas, {len(self.draws)} draws)"
+
+    def _expand(self, product, path=()):
+        """
+        Expansion of a product into a list of products of betas, draws and variables.
+        """
+        expanded = [()]
+        for name in product:
+            if name in self.components:
+                if name in path:
+                    raise ValueError(f"Component {name} of {self.name} is defined from itself.")
+                options = [atoms for part in self.components[name] for atoms in self._expand(part, path + (name,))]
+            else:
+                options = [(name,)]
+            expanded = [left + right for left in expanded for right in options]
+        return expanded
+
+    def terms(self):
+        """
+        Elementary terms of the utilities, dict alternative -> list of Term, compiled on the first call.
+        """
+        if self._terms is None:
+            self._terms = {}
+            for alternative, products in self.utilities.items():
+                terms = []
+                for product in products:
+                    for atoms in self._expand(product):
+                        betas = tuple(sorted(name for name in atoms if name in self.betas))
+                        draws = tuple(sorted(name for name in atoms if name in self.draws))
+                        variables = tuple(sorted(name for name in atoms if name not in betas + draws))
+                        terms.append(Term(1.0, betas, variables, draws))
+                self._terms[alternative] = simplify(terms)
+        return self._terms
+
+    def variables(self):
+        """
+        Sorted columns of the data used by the model: variables, availabilities and choice.
+        """
+        names = {self.choice}
+        names.update(value for value in self.availability.values() if isinstance(value, str))
+        for terms in self.terms().values():
+            for term in terms:
+                names.update(term.variables)
+        return sorted(names)
+
+    def draw_types(self, distributions):
+        """
+        Types of draws, dict draw name -> type.
+
+        :param distributions: dict distribution -> type of draws, e.g. {"triangular": "TRIANGULAR_HALTON", "normal":
+            "NORMAL_SHALTON"} (see draws.py).
+        """
+        return {name: distributions[distribution] for name, distribution in self.draws.items()}
+
+    def biogeme(self, distributions):
+        """
+        Utilities and availabilities as Biogeme expressions, (v, av), for the Biogeme engine.
+
+        :param distributions: dict distribution -> type of draws, as in draw_types.
+        """
+        from biogeme.expressions import Beta, Variable, bioDraws
+
+        draw_types = self.draw_types(distributions)
+        expressions = {}
+
+        def expression(name):
+            if name not in expressions:
+                if name in self.betas:
+                    expressions[name] = Beta(name, self.betas[name], None, None, 0)
+                elif name in self.draws:
+                    expressions[name] = bioDraws(name, draw_types[name])
+                elif name in self.components:
+                    expressions[name] = total(self.components[name])
+                else:
+                    expressions[name] = Variable(name)
+            return expressions[name]
+
+        def total(products):
+            value = None
+            for product in products:
+                factor = None
+                for name in product:
+                    factor = expression(name) if factor is None else factor * expression(name)
+                value = factor if value is None else value + factor
+            return value
+
+        v = {alternative: total(products) for alternative, products in self.utilities.items()}
+        av = {alternative: Variable(value) for alternative, value in self.availability.items()}
+        return v, av
+
+    def derive(self, name, betas=None, draws=None, components=None, utilities=None, rename=None):
+        """
+        Specification of a variant of the model, e.g. the constrained model of a likelihood ratio test.
+
+        :param betas, draws, components, utilities: entries added to or replacing those of the model, an entry with
+            the value None being removed.
+        :param rename: dict old name -> new name of betas, draws or components; names renamed to the same new name are
+            constrained to be equal, the starting value of the first one being kept.
+        """
+
+        def update(current, changes):
+            updated = dict(current)
+            for key, value in (changes or {}).items():
+                if value is None:
+                    updated.pop(key, None)
+                else:
+                    updated[key] = value
+            return updated
+
+        rename = rename or {}
+        new_betas = {}
+        for beta, value in update(self.betas, betas).items():
+            new_betas.setdefault(rename.get(beta, beta), value)
+        new_draws = {}
+        for draw, distribution in update(self.draws, draws).items():
+            new_draws.setdefault(rename.get(draw, draw), distribution)
+        return ModelSpecification(
+            name,
+            new_betas,
+            new_draws,
+            {
+                rename.get(component, component): _rename(products, rename)
+                for component, products in update(self.components, components).items()
+            },
+            {
+                alternative: _rename(products, rename)
+                for alternative, products in update(self.utilities, utilities).items()
+            },
+            self.availability,
+            self.choice,
+        )
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
@@ -0,0 +1,71 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Profile of the startup of the model scripts, from the start of the process to the start of the optimizer.
+#
+# The scripts mark the end of each phase (imports, data, model, draws...); the phases are reported in the log and on
+# the console when the profile is enabled, e.g. by run-pipeline.py --profile-startup, which sets the environment
+# variable AVCHOICE_PROFILE_STARTUP for the scripts it runs.
+# ---------------------------------------------------------------------------------------------------------------------#
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def process_start_time():
+    """
+    Wall-clock time of the start of the process, so that the imports are part of the profile, or the current time
+    where it is not available (outside of Linux).
+    """
+    try:
+        with open("/proc/self/stat") as file:
+            # fields after the command name, the start time being the 22nd field of the line, in clock ticks
+            start_ticks = float(file.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as file:
+            uptime = float(file.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+class StartupProfile:
+    """
+    Wall-clock time of the phases of the startup of a script.
+
+    :param enabled: report the phases, by default if the environment variable AVCHOICE_PROFILE_STARTUP is set.
+    """
+
+    def __init__(self, enabled=None):
+        if enabled is None:
+            enabled = os.environ.get("AVCHOICE_PROFILE_STARTUP", "") not in ("", "0")
+        self.enabled = enabled
+        self.phases = []
+        self._last = process_start_time()
+
+    def mark(self, phase):
+        """
+        End a phase, which started at the end of the previous phase (at the start of the process for the first one).
+        """
+        now = time.time()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self, phase=None):
+        """
+        Log and print the time of the phases, if the profile is enabled, and return them as a dict phase -> seconds.
+
+        :param phase: phase ended before the report, e.g. "model".
+        """
+        if phase is not None:
+            self.mark(phase)
+        seconds = dict(self.phases)
+        if self.enabled:
+            total = sum(seconds.values())
+            lines = [f"{name:20} {value:8.3f} s" for name, value in self.phases]
+            lines.append(f"{'total':20} {total:8.3f} s")
+            logger.info("Startup profile:\n" + "\n".join(lines))
+            print("Startup profile:\n" + "\n".join(lines))
+        return seconds
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
@@ -0,0 +1,348 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Synthetic survey data with the schema of data_documentation.xlsx, for benchmarks and tests without the raw data.
+#
+# The respondents have the columns read by 0-prepare-data.py and the model scripts: trip time and cost, in-vehicle
+# activities (tba) and time usefulness (tu) in the current vehicle and in an AV, Likert indicators of the six latent
+# factors of the measurement model, socio-demographic categoricals with the codes of the documentation, the block of
+# the stated choice experiment (sp_block) and the 4 choices of the block (stated_pref_1 to stated_pref_12, empty
+# outside of the block). The Likert indicators are ordinal responses to standard normal factors, and the choices are
+# simulated from a mixed logit model with known true parameters, by default the specification of 4-2 with the VOTs
+# of the paper, so that the estimation scripts can be benchmarked at any size and their recovery of the parameters
+# measured.
+#
+# The respondents are generated and written by chunks, with one random generator per chunk spawned from the seed, so
+# that millions of respondents can be written in bounded memory; the data depend on the seed and the chunk size.
+# ---------------------------------------------------------------------------------------------------------------------#
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from .design import DESIGN, expand_design
+from .draws import inverse_triangular
+from .mxl_iv import MXL_IV_FINAL
+
+logger = logging.getLogger(__name__)
+
+# indicators of the latent factors of the measurement model of 0-prepare-data.py, with their loadings; the concerns
+# 1, 4 and 5 measure the usefulness of AVs, negatively, and the indicators left out of the measurement model (e.g.
+# tech_savvy_2) load weakly on their factor
+FACTORS = {
+    "av_usefulness": {
+        "av_benefit_1": 0.8,
+        "av_benefit_2": 0.8,
+        "av_benefit_3": 0.7,
+        "av_benefit_4": 0.7,
+        "av_benefit_5": 0.7,
+        "av_benefit_6": 0.6,
+        "av_concern_1": -0.6,
+        "av_concern_4": -0.5,
+        "av_concern_5": -0.5,
+    },
+    "av_concern": {"av_concern_2": 0.7, "av_concern_3": 0.7, "av_concern_6": 0.6, "av_concern_7": 0.6},
+    "tech_savviness": {"tech_savvy_1": 0.8, "tech_savvy_2": 0.4, "tech_savvy_3": 0.7},
+    "driving_enjoyment": {
+        "enjoy_driving_1": 0.8,
+        "enjoy_driving_2": 0.4,
+        "enjoy_driving_3": 0.7,
+        "enjoy_driving_4": 0.7,
+        "enjoy_driving_5": 0.4,
+    },
+    "polychronicity": {"polychronicity_1": 0.8, "polychronicity_2": 0.7, "polychronicity_3": 0.7},
+    "envt_concern": {"envt_concern_1": 0.8, "envt_concern_2": 0.8, "envt_concern_3": 0.7},
+}
+
+# thresholds of the latent responses (standard normal) between the 5 levels of the Likert scales
+LIKERT_THRESHOLDS = np.array([-1.3, -0.5, 0.3, 1.1])
+
+# categorical variables: codes of data_documentation.xlsx and their probabilities
+CATEGORICALS = {
+    "tu_hv": ([1, 2, 3, 4, 5], [0.08, 0.14, 0.28, 0.30, 0.20]),
+    "av_fam": ([1, 2, 3, 4, 5], [0.22, 0.31, 0.27, 0.13, 0.07]),
+    "tu_av": ([1, 2, 3, 4, 5], [0.04, 0.08, 0.24, 0.34, 0.30]),
+    "age_grp": ([1, 2, 3], [0.28, 0.52, 0.20]),
+    "gender": ([1, 2, 3, 4], [0.50, 0.47, 0.02, 0.01]),
+    "education": ([1, 2, 3], [0.34, 0.40, 0.26]),
+    "school": ([1, 2, 3], [0.86, 0.07, 0.07]),
+    "hh_adult": ([1, 2, 3, 4, 5, 6, 7, 8], [0.18, 0.55, 0.14, 0.08, 0.03, 0.01, 0.005, 0.005]),
+    "hh_child": ([0, 1, 2, 3, 4], [0.58, 0.19, 0.15, 0.05, 0.03]),
+    "income_grp": ([1, 2, 3, 4, 5], [0.11, 0.16, 0.19, 0.16, 0.38]),
+    "employment": ([1, 2, 3], [0.30, 0.13, 0.57]),
+    "license": ([0, 1], [0.01, 0.99]),
+    "citation": ([1, 2, 3, 4, 5], [0.42, 0.26, 0.15, 0.12, 0.05]),
+    "crash_exp": ([1, 2, 3, 4, 5, 6], [0.38, 0.30, 0.16, 0.11, 0.03, 0.02]),
+    "hh_vehs": ([0, 1, 2, 3, 4, 5], [0.02, 0.28, 0.43, 0.18, 0.06, 0.03]),
+    "mode_commute": ([1, 2, 3, 4, 5], [0.05, 0.03, 0.80, 0.05, 0.07]),
+    "mode_shopping": ([1, 2, 3, 4, 5], [0.05, 0.02, 0.86, 0.04, 0.03]),
+    "mode_personal": ([1, 2, 3, 4, 5], [0.04, 0.02, 0.85, 0.05, 0.04]),
+    "mode_social": ([1, 2, 3, 4, 5], [0.04, 0.02, 0.80, 0.10, 0.04]),
+    "rec_trips": ([0, 1, 2, 3, 4, 5, 7, 10], [0.03, 0.20, 0.22, 0.17, 0.11, 0.09, 0.10, 0.08]),
+}
+
+# probabilities of the races (check all that apply)
+RACES = [0.75, 0.10, 0.02, 0.08, 0.01, 0.07, 0.03, 0.02]
+
+# probabilities of the in-vehicle activities, in the current vehicle and in an AV
+TBA_HV = [0.75, 0.55, 0.35, 0.30, 0.40, 0.30, 0.65, 0.30, 0.20, 0.25, 0.15, 0.10, 0.30, 0.25, 0.20, 0.20, 0.05]
+TBA_AV = [0.70, 0.65, 0.55, 0.50, 0.60, 0.50, 0.75, 0.50, 0.40, 0.45, 0.35, 0.30, 0.50, 0.45, 0.40, 0.35, 0.05]
+
+# groups of the in-vehicle activities of 0-prepare-data.py
+TBA_GROUPS = {1: [7], 2: [5, 6, 10], 3: [3, 4], 4: [2, 8, 9], 5: [11, 12], 6: [13, 14, 15], 7: [16]}
+
+# mean VOTs of the paper ($/hour), true values of the VOTs of the choices
+PAPER_VOTS = {"b_vot_hv": 34.8, "b_vot_av": 31.1, "b_vot_avwl": 29.9}
+
+# blocks of 4 scenarios of the stated choice experiment
+BLOCKS = {1: [1, 2, 3, 4], 2: [5, 6, 7, 8], 3: [9, 10, 11, 12]}
+
+# columns of data.csv, in the order of the documentation
+COLUMNS = (
+    ["id", "time", "cost"]
+    + [f"tba_hv_{k}" for k in range(1, 18)]
+    + ["tu_hv", "av_fam"]
+    + [f"tba_av_{k}" for k in range(1, 18)]
+    + ["tu_av"]
+    + [f"stated_pref_{k}" for k in range(1, 13)]
+    + [indicator for indicators in FACTORS.values() for indicator in indicators]
+    + ["age_grp"]
+    + [f"race_{k}" for k in range(1, 9)]
+    + ["gender", "education", "school", "hh_adult", "hh_child", "income_grp", "employment", "license"]
+    + ["driving_exp", "citation", "crash_exp", "hh_vehs", "mode_commute", "mode_shopping", "mode_personal"]
+    + ["mode_social", "rec_trips", "sp_block"]
+)
+
+
+def _moments(column):
+    """
+    Mean and standard deviation of a categorical variable.
+    """
+    codes, probabilities = (np.asarray(values, dtype=float) for values in CATEGORICALS[column])
+    mean = codes @ probabilities
+    return mean, np.sqrt((codes - mean) ** 2 @ probabilities)
+
+
+def generate_persons(rng, ids):
+    """
+    Respondents without their choices, as a data frame of the columns of data.csv, and their latent factors.
+
+    :return: data frame of the respondents, dict factor -> standard normal values.
+    """
+    size = len(ids)
+    persons = {"id": np.asarray(ids)}
+
+    # trip time (hours) and fuel cost (dollars), correlated
+    persons["time"] = np.clip(np.round(rng.lognormal(np.log(3.0), 0.6, size), 2), 0.5, 24.0)
+    persons["cost"] = np.maximum(np.round(8.4 * persons["time"] * rng.lognormal(0.0, 0.3, size)), 5).astype(int)
+
+    for column, (codes, probabilities) in CATEGORICALS.items():
+        persons[column] = rng.choice(codes, size, p=np.asarray(probabilities) / np.sum(probabilities))
+    for k, probability in enumerate(TBA_HV, 1):
+        persons[f"tba_hv_{k}"] = (rng.random(size) < probability).astype(int)
+    for k, probability in enumerate(TBA_AV, 1):
+        persons[f"tba_av_{k}"] = (rng.random(size) < probability).astype(int)
+    for k, probability in enumerate(RACES, 1):
+        persons[f"race_{k}"] = (rng.random(size) < probability).astype(int)
+
+    # years of driving, within the age group
+    low, high = np.array([0, 1, 5, 30]), np.array([0, 17, 46, 66])
+    persons["driving_exp"] = rng.integers(low[persons["age_grp"]], high[persons["age_grp"]])
+
+    # Likert indicators of the latent factors
+    factors = {}
+    for factor, indicators in FACTORS.items():
+        factors[factor] = rng.standard_normal(size)
+        for indicator, loading in indicators.items():
+            response = loading * factors[factor] + np.sqrt(1.0 - loading**2) * rng.standard_normal(size)
+            persons[indicator] = 1 + np.searchsorted(LIKERT_THRESHOLDS, response)
+
+    persons["sp_block"] = rng.integers(1, len(BLOCKS) + 1, size)
+    return pd.DataFrame(persons), factors
+
+
+def model_variables(persons, factors):
+    """
+    Person variables of the models, derived from the columns of data.csv as in 0-prepare-data.py: dummies of the
+    categoricals, standardized factors, in-vehicle activity groups, and standardized time usefulness and AV
+    familiarity. The standardizations use the moments of the generating distributions, which do not depend on the
+    chunk, instead of the moments of the sample.
+    """
+    variables = {column: persons[column].to_numpy(dtype=float) for column in persons.columns}
+    for column, (codes, _) in CATEGORICALS.items():
+        for code in codes:
+            variables[f"{column}_{code}"] = (persons[column].to_numpy() == code).astype(float)
+    for factor, values in factors.items():
+        variables[f"{factor}_std"] = values
+
+    for vehicle in ("hv", "av"):
+        for group, items in TBA_GROUPS.items():
+            total = sum(variables[f"tba_{vehicle}_{item}"] for item in items)
+            variables[f"tba_g{group}_{vehicle}"] = total
+            variables[f"tba_g{group}_{vehicle}_cat"] = (total > 0).astype(float)
+        variables[f"tba_tot_{vehicle}"] = sum(variables[f"tba_{vehicle}_{item}"] for item in range(1, 18))
+    for group in TBA_GROUPS:
+        variables[f"tba_g{group}_diff"] = variables[f"tba_g{group}_av"] - variables[f"tba_g{group}_hv"]
+    variables["tba_tot_diff"] = variables["tba_tot_av"] - variables["tba_tot_hv"]
+
+    (mean_hv, sd_hv), (mean_av, sd_av) = _moments("tu_hv"), _moments("tu_av")
+    variables["ttu_diff"] = variables["tu_av"] - variables["tu_hv"]
+    variables["ttu_hv_std"] = (variables["tu_hv"] - mean_hv) / sd_hv
+    variables["ttu_av_std"] = (variables["tu_av"] - mean_av) / sd_av
+    variables["ttu_diff_std"] = (variables["ttu_diff"] - mean_av + mean_hv) / np.sqrt(sd_hv**2 + sd_av**2)
+    mean, sd = _moments("av_fam")
+    variables["av_fam_std"] = (variables["av_fam"] - mean) / sd
+    return pd.DataFrame(variables, index=persons.index)
+
+
+def true_betas(specification, betas=None):
+    """
+    True parameters of the choices: the starting values of the specification, the mean VOTs ($/hour) being those of
+    the paper, updated with betas.
+    """
+    values = dict(specification.betas)
+    values.update({name: value for name, value in PAPER_VOTS.items() if name in values})
+    values.update(betas or {})
+    unknown = sorted(set(values) - set(specification.betas))
+    if unknown:
+        raise ValueError(f"Betas {unknown} are not parameters of {specification.name}.")
+    return values
+
+
+def simulate_choices(rng, persons, variables, specification=MXL_IV_FINAL, betas=None):
+    """
+    Choices of the scenarios of the block of each respondent, simulated from the mixed logit model with one draw of
+    the random parameters per respondent.
+
+    :param variables: person variables of the models (see model_variables).
+    :param specification: ModelSpecification of the model, by default that of 4-2.
+    :param betas: dict beta -> true value, by default those of true_betas.
+    :return: data frame of the choice tasks, with the row of the respondent in persons (person), the scenario, the
+        attributes of the alternatives, their availabilities and the chosen alternative.
+    """
+    betas = true_betas(specification, betas)
+
+    # one row per choice task, with the attributes of the alternatives and their availabilities
+    scenarios = np.array([BLOCKS[block] for block in sorted(BLOCKS)])[persons["sp_block"].to_numpy() - 1]
+    person = np.repeat(np.arange(len(persons)), scenarios.shape[1])
+    tasks = pd.DataFrame({"person": person, "scenario": scenarios.ravel()})
+    tasks["time"] = persons["time"].to_numpy()[person]
+    tasks["cost"] = persons["cost"].to_numpy()[person]
+    tasks = tasks.join(expand_design(tasks, DESIGN)).drop(columns=["time", "cost"])
+    for availability in specification.availability.values():
+        tasks[availability] = 1.0
+
+    # random parameters of the respondents
+    draws = {}
+    for name, distribution in specification.draws.items():
+        if distribution == "triangular":
+            draws[name] = inverse_triangular(rng.random(len(persons)))[person]
+        elif distribution == "normal":
+            draws[name] = rng.standard_normal(len(persons))[person]
+        else:
+            raise ValueError(f"Unknown distribution {distribution} of draw {name}.")
+
+    def column(name):
+        if name in tasks:
+            return tasks[name].to_numpy(dtype=float)
+        if name in variables:
+            return variables[name].to_numpy(dtype=float)[person]
+        raise ValueError(f"Variable {name} of {specification.name} is not generated.")
+
+    alternatives = sorted(specification.utilities)
+    utilities = np.zeros((len(tasks), len(alternatives)))
+    for j, alternative in enumerate(alternatives):
+        for term in specification.terms()[alternative]:
+            value = term.coefficient * np.prod([betas[name] for name in term.betas])
+            for name in term.variables:
+                value = value * column(name)
+            for name in term.draws:
+                value = value * draws[name]
+            utilities[:, j] += value
+        utilities[column(specification.availability[alternative]) == 0, j] = -np.inf
+    utilities += rng.gumbel(size=utilities.shape)
+    tasks[specification.choice] = np.asarray(alternatives)[np.argmax(utilities, axis=1)]
+    return tasks
+
+
+def stated_preferences(persons, tasks, choice="chosen"):
+    """
+    Choices of the respondents as the columns stated_pref_1 to stated_pref_12 of data.csv, missing outside of the
+    block of the respondent.
+    """
+    choices = pd.DataFrame(pd.NA, index=persons.index, columns=[f"stated_pref_{k}" for k in range(1, 13)])
+    choices = choices.astype("Int8")
+    for scenario, rows in tasks.groupby("scenario"):
+        choices.iloc[rows["person"].to_numpy(), scenario - 1] = rows[choice].to_numpy()
+    return choices
+
+
+def model_data(respondents, seed=0, specification=MXL_IV_FINAL, betas=None):
+    """
+    Synthetic data of the models without data.csv and 0-prepare-data.py, e.g. for benchmarks: one row per choice task
+    with the id of the respondent, the scenario, the attributes, the availabilities, the chosen alternative and the
+    person variables of the models (see model_variables). The variables of the latent factors are the true factors,
+    instead of the factor scores of the measurement model.
+
+    :param respondents: number of respondents.
+    :param seed: seed of the data, generated as the first chunk of generate_survey.
+    :param specification, betas: model of the choices and true parameters, as in simulate_choices.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0])
+    persons, factors = generate_persons(rng, np.arange(1, respondents + 1))
+    variables = model_variables(persons, factors)
+    tasks = simulate_choices(rng, persons, variables, specification, betas)
+    person = tasks.pop("person").to_numpy()
+    variables = variables.drop(columns=[column for column in tasks if column in variables]).iloc[person]
+    data = pd.concat([tasks, variables.reset_index(drop=True)], axis=1)
+    data["id"] = data["id"].astype(int)
+    return data
+
+
+def generate_survey(path, respondents, seed=0, specification=MXL_IV_FINAL, betas=None, chunk_size=50_000):
+    """
+    Write a synthetic data.csv, through a temporary file, and the settings of its generation with the true parameters
+    of the choices in a .json file next to it.
+
+    :param path: .csv file, e.g. ../data/synthetic/data.csv.
+    :param respondents: number of respondents (696 in the survey).
+    :param seed: seed of the random generators of the chunks.
+    :param specification: ModelSpecification of the choices, by default that of 4-2.
+    :param betas: dict beta -> true value, by default those of true_betas.
+    :param chunk_size: respondents generated and written at a time.
+    :return: dict of the settings of the generation.
+    """
+    settings = {
+        "respondents": int(respondents),
+        "seed": seed,
+        "chunk_size": int(chunk_size),
+        "model": specification.name,
+        "betas": true_betas(specification, betas),
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    started = time.perf_counter()
+    starts = range(0, respondents, chunk_size)
+    generators = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(len(starts))]
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", newline="") as file:
+        for rng, start in zip(generators, starts):
+            ids = np.arange(start + 1, min(start + chunk_size, respondents) + 1)
+            persons, factors = generate_persons(rng, ids)
+            variables = model_variables(persons, factors)
+            tasks = simulate_choices(rng, persons, variables, specification, betas)
+            persons = persons.join(stated_preferences(persons, tasks, specification.choice))
+            persons[COLUMNS].to_csv(file, header=start == 0, index=False)
+    os.replace(temporary, path)
+    settings["seconds"] = time.perf_counter() - started
+
+    with open(os.path.splitext(path)[0] + ".json", "w") as file:
+        json.dump(settings, file, indent=4)
+    logger.info(f"{respondents} synthetic respondents written in {path} in {settings['seconds']:.1f}s")
+    return settings
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
@@ -0,0 +1,193 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Telemetry of the native estimations, as JSON lines next to the log files.
+#
+# Each estimation appends a "start" record (model, sizes, time to get the draws, threads), one "iteration" record per
+# iteration of the optimizer, an "end" record and a "second_derivatives" record. The records split the wall-clock time
+# between the evaluations of the log likelihood, of its gradient, and the optimizer itself, and give the peak resident
+# memory of the process. summarize() gathers the runs of several files in one table (see telemetry-summary.py), e.g.
+# to see where the time of the folds of a cross-validation goes, or to compare a run with a previous one.
+# ---------------------------------------------------------------------------------------------------------------------#
+import datetime
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def peak_memory():
+    """
+    Peak resident memory of the process in MB, or None where it is not available.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def threads():
+    """
+    Threads of the numerical libraries (BLAS, OpenMP) and of the interpreter.
+    """
+    from threadpoolctl import threadpool_info
+
+    return {
+        "library_threads": max([pool["num_threads"] for pool in threadpool_info()], default=1),
+        "python_threads": threading.active_count(),
+    }
+
+
+class Telemetry:
+    """
+    JSON lines file of the telemetry of the estimations of a model, appended by each estimation.
+
+    :param path: .jsonl file, e.g. ../outputs/4-2-mxl-IV-final.telemetry.jsonl.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._run = None
+        self._started = None
+        self._last = None
+
+    def __repr__(self):
+        return f"Telemetry({self.path!r})"
+
+    def _write(self, record):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+    def start(self, engine, algorithm, iteration=0):
+        """
+        Record the start of an estimation with the engine.
+
+        :param iteration: first iteration, e.g. of an estimation resumed from a checkpoint.
+        """
+        self._run = f"{datetime.datetime.now().isoformat(timespec='milliseconds')}-{os.getpid()}"
+        self._started = time.perf_counter()
+        self._last = (self._started, dict(engine.timings))
+        self._write(
+            {
+                "event": "start",
+                "run": self._run,
+                "model": engine.model_name,
+                "algorithm": algorithm,
+                "iteration": iteration,
+                "parameters": len(engine.beta_names),
+                "persons": engine.n_persons,
+                "observations": engine.n_observations,
+                "draws": engine.number_of_draws,
+                "draw_seconds": engine.timings["draws"],
+                "engine_threads": engine.threads,
+                "peak_memory_mb": peak_memory(),
+                **threads(),
+            }
+        )
+
+    def _interval(self, engine):
+        """
+        Time since the previous record, split between the evaluations and the optimizer.
+        """
+        now = time.perf_counter()
+        last_time, last_timings = self._last
+        self._last = (now, dict(engine.timings))
+        seconds = now - last_time
+        function = engine.timings["function"] - last_timings["function"]
+        gradient = engine.timings["gradient"] - last_timings["gradient"]
+        return {
+            "seconds": seconds,
+            "evaluations": engine.timings["evaluations"] - last_timings["evaluations"],
+            "function_seconds": function,
+            "gradient_seconds": gradient,
+            "optimizer_seconds": seconds - function - gradient,
+            "elapsed_seconds": now - self._started,
+            "peak_memory_mb": peak_memory(),
+        }
+
+    def iteration(self, engine, iteration, loglike):
+        """
+        Record an iteration of the optimizer.
+        """
+        record = {"event": "iteration", "run": self._run, "iteration": iteration, "loglike": loglike}
+        self._write({**record, **self._interval(engine)})
+
+    def end(self, engine, iterations, loglike, converged):
+        """
+        Record the end of the optimization.
+        """
+        record = {"event": "end", "run": self._run, "iterations": iterations, "loglike": loglike}
+        self._write({**record, "converged": bool(converged), **self._interval(engine)})
+
+    def second_derivatives(self, engine, kind):
+        """
+        Record the calculation of the second derivatives for the standard errors, after the optimization.
+        """
+        record = {"event": "second_derivatives", "run": self._run, "kind": kind}
+        self._write({**record, **self._interval(engine)})
+
+
+def read_telemetry(path):
+    """
+    Records of a telemetry file, as a data frame with one row per record.
+    """
+    with open(path) as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    table = pd.DataFrame(records)
+    table["file"] = os.path.basename(path)
+    return table
+
+
+def summarize(paths):
+    """
+    One row per estimation run of the telemetry files: iterations, evaluations, and the split of the time between the
+    draws, the evaluations of the log likelihood and of its gradient, the optimizer and the second derivatives.
+    """
+    rows = []
+    for path in paths:
+        table = read_telemetry(path)
+        for run, records in table.groupby("run", sort=False):
+            start = records[records["event"] == "start"].iloc[0]
+            steps = records[records["event"].isin(["iteration", "end"])]
+            end = records[records["event"] == "end"]
+            second = records[records["event"] == "second_derivatives"]
+            evaluations = steps["evaluations"].sum()
+            evaluation_seconds = steps["function_seconds"].sum() + steps["gradient_seconds"].sum()
+            rows.append(
+                {
+                    "file": start["file"],
+                    "run": run,
+                    "model": start["model"],
+                    "persons": int(start["persons"]),
+                    "draws": int(start["draws"]),
+                    "iterations": int((records["event"] == "iteration").sum()),
+                    "finished": not end.empty,
+                    "loglike": steps["loglike"].dropna().iloc[-1] if steps["loglike"].notna().any() else None,
+                    "evaluations": int(evaluations),
+                    "draw s": start["draw_seconds"],
+                    "function s": steps["function_seconds"].sum(),
+                    "gradient s": steps["gradient_seconds"].sum(),
+                    "optimizer s": steps["optimizer_seconds"].sum(),
+                    "second derivatives s": second["seconds"].sum(),
+                    "total s": steps["seconds"].sum() + second["seconds"].sum(),
+                    "s / evaluation": evaluation_seconds / evaluations if evaluations else None,
+                    "peak memory MB": records["peak_memory_mb"].max(),
+                    "library threads": int(start["library_threads"]),
+                    # not recorded before the engine evaluated the persons by blocks on threads
+                    "engine threads": int(start["engine_threads"]) if pd.notna(start.get("engine_threads")) else 1,
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
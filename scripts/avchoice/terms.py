@@ -0,0 +1,102 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Expansion of the VOT-space utility functions into a sum of elementary terms.
+#
+# Every utility of the 3-x, 4-x and 5-x mixed logit models is a polynomial in the parameters that is linear in the
+# data and in the draws, e.g. b_cost * (b_vot_hv + s_vot_hv * draw) * hv_tt + b_cost * hv_tc. Once expanded, each
+# utility is a list of terms
+#
+#     coefficient * beta_1 * ... * beta_k * variable_1 * ... * variable_m * draw_1 * ... * draw_n
+#
+# which is the representation evaluated by the native likelihood engine in mixed_logit.py.
+# ---------------------------------------------------------------------------------------------------------------------#
+from collections import namedtuple
+
+
+# an elementary term of a utility function
+Term = namedtuple("Term", ["coefficient", "betas", "variables", "draws"])
+
+
+def _product(left, right):
+    """
+    Multiply two elementary terms.
+    """
+    return Term(
+        left.coefficient * right.coefficient,
+        tuple(sorted(left.betas + right.betas)),
+        tuple(sorted(left.variables + right.variables)),
+        tuple(sorted(left.draws + right.draws)),
+    )
+
+
+def _scale(terms, factor):
+    """
+    Multiply a list of terms by a constant.
+    """
+    return [term._replace(coefficient=term.coefficient * factor) for term in terms]
+
+
+def simplify(terms):
+    """
+    Merge the terms sharing the same betas, variables and draws, and drop the null ones.
+    """
+    merged = {}
+    for term in terms:
+        key = (term.betas, term.variables, term.draws)
+        merged[key] = merged.get(key, 0.0) + term.coefficient
+    return [Term(coefficient, *key) for key, coefficient in merged.items() if coefficient != 0]
+
+
+def linearize(expression, betas=None, draw_types=None):
+    """
+    Expand a Biogeme expression into a list of elementary terms.
+
+    The initial values of the free parameters are collected in the dict betas, and the types of the draws in the dict
+    draw_types. Fixed parameters (status different from 0) are replaced by their value. Only sums, differences,
+    products, unary minus and divisions by a constant are supported, which covers the whole VOT-space family.
+    """
+    if betas is None:
+        betas = {}
+    if draw_types is None:
+        draw_types = {}
+
+    # plain python numbers
+    if isinstance(expression, (int, float)):
+        return [Term(float(expression), (), (), ())]
+
+    kind = type(expression).__name__
+    if kind == "Numeric":
+        return [Term(float(expression.value), (), (), ())]
+    if kind == "Beta":
+        if expression.status != 0:
+            return [Term(float(expression.initValue), (), (), ())]
+        betas.setdefault(expression.name, float(expression.initValue))
+        return [Term(1.0, (expression.name,), (), ())]
+    if kind == "Variable":
+        return [Term(1.0, (), (expression.name,), ())]
+    if kind == "bioDraws":
+        draw_types.setdefault(expression.name, expression.drawType)
+        return [Term(1.0, (), (), (expression.name,))]
+    if kind == "UnaryMinus":
+        return _scale(linearize(expression.child, betas, draw_types), -1.0)
+    if kind == "Plus":
+        left = linearize(expression.left, betas, draw_types)
+        right = linearize(expression.right, betas, draw_types)
+        return simplify(left + right)
+    if kind == "Minus":
+        left = linearize(expression.left, betas, draw_types)
+        right = linearize(expression.right, betas, draw_types)
+        return simplify(left + _scale(right, -1.0))
+    if kind == "Times":
+        left = linearize(expression.left, betas, draw_types)
+        right = linearize(expression.right, betas, draw_types)
+        return simplify([_product(a, b) for a in left for b in right])
+    if kind == "Divide":
+        denominator = linearize(expression.right, betas, draw_types)
+        if len(denominator) != 1 or denominator[0].betas or denominator[0].variables or denominator[0].draws:
+            raise ValueError("Only divisions by a constant are supported in the utility functions.")
+        return _scale(linearize(expression.left, betas, draw_types), 1.0 / denominator[0].coefficient)
+
+    raise ValueError(f"Expression {kind} is not supported by the native mixed logit engine: {expression}")
+
+
+# ---------------------------------------------------------------------------------------------------------------------#
@@ -0,0 +1,61 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# import modules
+import argparse
+import logging
+
+import pandas as pd
+
+# import benchmarks of the native engine
+from avchoice.benchmark import BENCHMARKS, compare, load_results, run_suite, save_results
+
+# configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# ---------------------------------------------------------------------------------------------------------------------#
+## benchmarks of the model families on synthetic data, compared with the baseline
+# e.g. python run-benchmarks.py --save-baseline before a change, then python run-benchmarks.py after it, which fails
+# if a benchmark regressed by more than the threshold
+
+parser = argparse.ArgumentParser(description="Benchmark the native engine on the model families.")
+parser.add_argument("benchmarks", nargs="*", help=f"benchmarks to run, among {list(BENCHMARKS)} (default: all)")
+parser.add_argument("--persons", type=int, default=2000, help="respondents of the synthetic data")
+parser.add_argument("--draws", type=int, default=None, help="draws of the mixed logit models (default: 100)")
+parser.add_argument("--dtype", default="float64", choices=["float64", "float32"], help="floating point type")
+parser.add_argument("--threads", type=int, default=1, help="threads of the evaluations of the native engine")
+parser.add_argument("--kernel", default="numpy", choices=["numpy", "numba"], help="kernel of the evaluations")
+parser.add_argument("--repeats", type=int, default=5, help="timed evaluations of the log likelihood and gradient")
+parser.add_argument("--baseline", default="../outputs/benchmarks/baseline.json", help="baseline results")
+parser.add_argument("--output", default="../outputs/benchmarks/latest.json", help="results of this run")
+parser.add_argument("--threshold", type=float, default=0.2, help="relative growth of a metric flagged as a regression")
+parser.add_argument("--save-baseline", action="store_true", help="save the results of this run as the baseline")
+arguments = parser.parse_args()
+
+suite = run_suite(
+    arguments.benchmarks,
+    arguments.persons,
+    arguments.draws,
+    arguments.repeats,
+    dtype=arguments.dtype,
+    threads=arguments.threads,
+    kernel=arguments.kernel,
+)
+save_results(suite, arguments.output)
+
+table = pd.DataFrame(suite["results"].values()).set_index("benchmark")
+with pd.option_context("display.max_columns", None, "display.width", 200):
+    print(table.drop(columns=["spec_hash", "seed"]))
+
+if arguments.save_baseline:
+    save_results(suite, arguments.baseline)
+    print(f"Baseline saved in {arguments.baseline}")
+else:
+    comparison = compare(suite, load_results(arguments.baseline), threshold=arguments.threshold)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(comparison.to_string(index=False))
+    if (comparison["status"] == "regression").any():
+        raise SystemExit(1)
+
+# ---------------------------------------------------------------------------------------------------------------------#
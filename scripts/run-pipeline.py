@@ -0,0 +1,154 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# import modules
+import argparse
+import logging
+import os
+
+# import incremental pipeline runner
+from avchoice.pipeline import Pipeline, Stage
+
+# configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# ---------------------------------------------------------------------------------------------------------------------#
+## stages of the analysis, run from the scripts directory
+# a stage reruns when the hash of one of its inputs changes, e.g. a change of the specification of 5-2 reruns 5-2,
+# which updates the stored results of 5-2-mxl-V-final, which reruns 5-3
+
+
+def modules(*names):
+    """
+    Files of modules of the helper package.
+    """
+    return [f"avchoice/{name}.py" for name in names]
+
+
+# prepared data, read by all the model scripts
+prepared_data = [
+    "../data/prepared_persons.arrow",
+    "../data/prepared_persons.json",
+    "../data/prepared_tasks.arrow",
+    "../data/prepared_tasks.json",
+]
+
+# inputs of the model scripts: the prepared data and the modules of the helper package that they run, e.g. the
+# native engine, with its __init__, through which they import them; the modules that do not change their outputs
+# (startup profiles, telemetry, benchmarks, synthetic data, this runner) are not inputs, and the specification of
+# model IV is only an input of its scripts
+biogeme_inputs = prepared_data + modules("__init__", "prepared_data")
+biogeme_draws_inputs = biogeme_inputs + modules("draws")
+native_inputs = biogeme_draws_inputs + modules(
+    "mixed_logit", "kernels", "terms", "specification", "draw_cache", "results_store", "checkpoint"
+)
+validation_inputs = native_inputs + modules("cross_validation")
+model_iv = modules("mxl_iv")
+
+
+def stored_results(model_name):
+    """
+    Files of the results of a native estimation in the results store.
+    """
+    return [f"../outputs/{model_name}.npz", f"../outputs/{model_name}.json"]
+
+
+stages = [
+    Stage(
+        "0-prepare",
+        "0-prepare-data.py",
+        inputs=modules("__init__", "factor_scores", "prepared_data", "design") + ["../data/data.csv"],
+        outputs=prepared_data + ["../data/prepared_persons.csv"],
+    ),
+    Stage(
+        "0-visualize",
+        "0-visualize-data.R",
+        inputs=["../data/prepared_persons.csv"],
+        outputs=[
+            "../outputs/plots/p1_latent_variables.jpeg",
+            "../outputs/plots/p2_tba.jpeg",
+            "../outputs/plots/p3_ttu.jpeg",
+        ],
+    ),
+    Stage("1-1", "1-1-mnl-I.py", inputs=biogeme_inputs, outputs=["../outputs/1-1-mnl-I.html"]),
+    Stage("1-2", "1-2-mnl-I-val.py", inputs=biogeme_inputs, outputs=["../outputs/1-2-mnl-I-val.log"]),
+    Stage("2-1", "2-1-mnl-II-initial.py", inputs=biogeme_inputs, outputs=["../outputs/2-1-mnl-II-initial.html"]),
+    Stage("2-2", "2-2-mnl-II-final.py", inputs=biogeme_inputs, outputs=["../outputs/2-2-mnl-II-final.html"]),
+    Stage("2-3", "2-3-mnl-II-final-val.py", inputs=biogeme_inputs, outputs=["../outputs/2-3-mnl-II-final-val.log"]),
+    Stage("3-1", "3-1-mxl-III.py", inputs=native_inputs, outputs=stored_results("3-1-mxl-III")),
+    Stage(
+        "3-2",
+        "3-2-mxl-III-val.py",
+        inputs=validation_inputs + stored_results("3-1-mxl-III"),
+        outputs=["../outputs/3-2-mxl-III-val.log"],
+        cpus=5,
+    ),
+    Stage("4-1", "4-1-mxl-IV-initial.py", inputs=biogeme_draws_inputs, outputs=["../outputs/4-1-mxl-IV-initial.html"]),
+    Stage("4-2", "4-2-mxl-IV-final.py", inputs=native_inputs + model_iv, outputs=stored_results("4-2-mxl-IV-final")),
+    Stage(
+        "4-3",
+        "4-3-mxl-IV-final-val.py",
+        inputs=validation_inputs + model_iv + stored_results("4-2-mxl-IV-final"),
+        outputs=["../outputs/4-3-mxl-IV-final-val.log"],
+        cpus=5,
+    ),
+    Stage(
+        "4-4",
+        "4-4-mxl-IV-final-lr-test.py",
+        inputs=native_inputs + model_iv,
+        outputs=stored_results("4-4-mxl-IV-final-lr-test"),
+    ),
+    Stage(
+        "4-5",
+        "4-5-lr-test.py",
+        inputs=modules("__init__", "results_store", "mixed_logit")
+        + stored_results("4-2-mxl-IV-final")
+        + stored_results("4-4-mxl-IV-final-lr-test"),
+        outputs=["../outputs/4-5-lr-test.log"],
+    ),
+    Stage(
+        "4-6",
+        "4-6-mxl-IV-final-elast.py",
+        inputs=native_inputs + model_iv + modules("scenarios") + stored_results("4-2-mxl-IV-final"),
+        outputs=["../outputs/4-6-mxl-IV-final-elast.csv"],
+    ),
+    Stage("5-1", "5-1-mxl-V-initial.py", inputs=biogeme_draws_inputs, outputs=["../outputs/5-1-mxl-V-initial.html"]),
+    Stage("5-2", "5-2-mxl-V-final.py", inputs=native_inputs, outputs=stored_results("5-2-mxl-V-final")),
+    Stage(
+        "5-3",
+        "5-3-mxl-V-final-val.py",
+        inputs=validation_inputs + stored_results("5-2-mxl-V-final"),
+        outputs=["../outputs/5-3-mxl-V-final-val.log"],
+        cpus=5,
+    ),
+]
+
+# ---------------------------------------------------------------------------------------------------------------------#
+## run the outdated stages
+
+parser = argparse.ArgumentParser(description="Run the outdated stages of the analysis.")
+parser.add_argument("targets", nargs="*", help="stages to bring up to date with their upstream stages (default: all)")
+parser.add_argument("--cpus", type=int, default=None, help="budget of cores of the concurrent stages")
+parser.add_argument("--force", nargs="*", default=[], help="stages to run even if they are up to date")
+parser.add_argument("--dry-run", action="store_true", help="only list the stages that would run")
+parser.add_argument("--profile-startup", action="store_true", help="report the startup phases of the model scripts")
+parser.add_argument(
+    "--memory-limit", type=float, default=None, help="ceiling in MB of the draw arrays of each native estimation"
+)
+arguments = parser.parse_args()
+
+# read by the model scripts (see avchoice/startup.py), which inherit the environment of the runner
+if arguments.profile_startup:
+    os.environ["AVCHOICE_PROFILE_STARTUP"] = "1"
+if arguments.memory_limit is not None:
+    os.environ["AVCHOICE_MEMORY_LIMIT"] = str(arguments.memory_limit)
+
+pipeline = Pipeline(stages, state_path="../outputs/pipeline.json", log_directory="../outputs/pipeline")
+status = pipeline.run(arguments.targets, force=arguments.force, cpus=arguments.cpus, dry_run=arguments.dry_run)
+for name, value in status.items():
+    print(f"{name:12} {value}")
+if any(value in ("failed", "blocked") for value in status.values()):
+    raise SystemExit(1)
+
+# ---------------------------------------------------------------------------------------------------------------------#
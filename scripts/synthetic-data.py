@@ -0,0 +1,46 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# import modules
+import argparse
+import logging
+
+# import synthetic survey data generator
+from avchoice.synthetic import generate_survey
+
+# configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# ---------------------------------------------------------------------------------------------------------------------#
+## synthetic data.csv with the schema of data_documentation.xlsx and choices simulated from the model of 4-2
+# e.g. python synthetic-data.py --respondents 100000 --beta b_cost=-0.01, then copy it to ../data/data.csv to run the
+# pipeline on it; the true parameters are saved next to it, in data.json
+
+
+def beta(text):
+    """
+    True value of a beta, from name=value.
+    """
+    name, value = text.split("=")
+    return name, float(value)
+
+
+parser = argparse.ArgumentParser(description="Generate a synthetic data.csv for benchmarks.")
+parser.add_argument("--output", default="../data/synthetic/data.csv", help="synthetic data.csv")
+parser.add_argument("--respondents", type=int, default=696, help="number of respondents")
+parser.add_argument("--seed", type=int, default=0, help="seed of the data")
+parser.add_argument("--chunk-size", type=int, default=50_000, help="respondents generated and written at a time")
+parser.add_argument("--beta", type=beta, action="append", default=[], help="true value of a beta, as name=value")
+arguments = parser.parse_args()
+
+settings = generate_survey(
+    arguments.output,
+    arguments.respondents,
+    seed=arguments.seed,
+    betas=dict(arguments.beta),
+    chunk_size=arguments.chunk_size,
+)
+print(f"{settings['respondents']} respondents in {arguments.output} ({settings['seconds']:.1f}s)")
+
+# ---------------------------------------------------------------------------------------------------------------------#
@@ -0,0 +1,33 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# import modules
+import argparse
+import glob
+
+import pandas as pd
+
+# import telemetry of the native estimations
+from avchoice.telemetry import summarize
+
+# ---------------------------------------------------------------------------------------------------------------------#
+## summary of the telemetry of the native estimations, one row per run
+# e.g. python telemetry-summary.py ../outputs/4-3-mxl-IV-final-fold-*.telemetry.jsonl to compare the folds of 4-3
+
+parser = argparse.ArgumentParser(description="Summarize the telemetry of the native estimations.")
+parser.add_argument("paths", nargs="*", help="telemetry files (default: all the telemetry files of ../outputs)")
+parser.add_argument("--last", action="store_true", help="only the last run of each file")
+parser.add_argument("--csv", default=None, help="also write the summary to this .csv file")
+arguments = parser.parse_args()
+
+paths = arguments.paths or sorted(glob.glob("../outputs/*.telemetry.jsonl"))
+if not paths:
+    raise SystemExit("No telemetry file.")
+summary = summarize(paths)
+if arguments.last:
+    summary = summary.groupby("file", sort=False).tail(1)
+
+with pd.option_context("display.max_columns", None, "display.width", 200, "display.float_format", "{:.3f}".format):
+    print(summary.drop(columns="run").to_string(index=False))
+if arguments.csv is not None:
+    summary.to_csv(arguments.csv, index=False)
+
+# ---------------------------------------------------------------------------------------------------------------------#
@@ -0,0 +1,26 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Fixtures of the tests of avchoice and of the scripts, on synthetic data (see avchoice/synthetic.py).
+#
+# The tests are run from the scripts directory, e.g. python -m pytest tests, and never read or write ../data and
+# ../outputs: the scripts run in a copy of the directories of the repository in a temporary directory.
+# ---------------------------------------------------------------------------------------------------------------------#
+import os
+import sys
+
+import pytest
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPTS not in sys.path:
+    sys.path.insert(0, SCRIPTS)
+
+
+@pytest.fixture(scope="session")
+def survey(tmp_path_factory):
+    """
+    Synthetic data.csv of 400 respondents, with choices simulated from the model of 4-2.
+    """
+    from avchoice.synthetic import generate_survey
+
+    path = tmp_path_factory.mktemp("synthetic") / "data.csv"
+    generate_survey(str(path), 400, seed=0)
+    return path
@@ -0,0 +1,79 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Cached fit of the measurement model (avchoice/factor_scores.py), read in processes with other hash seeds.
+# ---------------------------------------------------------------------------------------------------------------------#
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import SCRIPTS
+
+# measurement model of 0-prepare-data.py
+DESCRIPTION = """
+av_usefulness     =~ av_benefit_1 + av_benefit_2 + av_benefit_3 + av_benefit_4 + av_benefit_5 + av_benefit_6 + \
+                     av_concern_1 + av_concern_4 + av_concern_5
+av_concern        =~ av_concern_2 + av_concern_3 + av_concern_6 + av_concern_7
+tech_savviness    =~ tech_savvy_1  + tech_savvy_3
+driving_enjoyment =~ enjoy_driving_1 + enjoy_driving_3 + enjoy_driving_4
+polychronicity    =~ polychronicity_1 + polychronicity_2 + polychronicity_3
+envt_concern      =~ envt_concern_1 + envt_concern_2 + envt_concern_3
+""".replace("\\\n", "")
+
+# fit in a new process, which prints the estimates by location (the variables of the covariances sorted), the smallest
+# eigenvalue of the implied covariance, the CFI of the fit and the first factor scores
+_FIT = """
+import json, sys
+import numpy as np, pandas as pd, semopy
+from avchoice import FactorScoreCache
+description, data, directory, rows = json.loads(sys.argv[1])
+model, factors = FactorScoreCache(directory).fit(description, pd.read_csv(data).iloc[:rows], obj="DWLS")
+table = model.inspect(std_est=True)
+stats = semopy.calc_stats(model)
+print(json.dumps({
+    "estimates": {
+        " ".join([a, op, b] if op != "~~" else [min(a, b), op, max(a, b)]): float(value)
+        for a, op, b, value in table[["lval", "op", "rval", "Estimate"]].values
+    },
+    "eigenvalue": float(np.linalg.eigvalsh(model.calc_sigma()[0]).min()),
+    "cfi": float(stats["CFI"].iloc[0]),
+    "scores": factors.iloc[:5].to_numpy().tolist(),
+}))
+"""
+
+
+def _fit(survey, directory, seed, rows=400):
+    process = subprocess.run(
+        [sys.executable, "-c", _FIT, json.dumps([DESCRIPTION, str(survey), str(directory), rows])],
+        cwd=SCRIPTS,
+        env=dict(os.environ, PYTHONHASHSEED=str(seed)),
+        stdout=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+def test_cache_read_with_another_hash_seed(survey, tmp_path):
+    fitted = _fit(survey, tmp_path, 1)
+    arrays = next(tmp_path.glob("cfa-*.npz"))
+    modified = arrays.stat().st_mtime_ns
+    for seed in (2, 3):
+        cached = _fit(survey, tmp_path, seed)
+        assert arrays.stat().st_mtime_ns == modified
+        assert cached["eigenvalue"] > 0
+        assert cached["estimates"].keys() == fitted["estimates"].keys()
+        for name, value in fitted["estimates"].items():
+            assert cached["estimates"][name] == pytest.approx(value, abs=1e-10)
+        assert cached["cfi"] == pytest.approx(fitted["cfi"])
+        assert cached["scores"] == fitted["scores"]
+
+
+def test_warm_start_with_another_hash_seed(survey, tmp_path):
+    _fit(survey, tmp_path, 1)
+    fitted = _fit(survey, tmp_path / "new", 4, rows=350)
+    warm = _fit(survey, tmp_path, 4, rows=350)
+    assert warm["eigenvalue"] > 0
+    for name, value in fitted["estimates"].items():
+        assert warm["estimates"][name] == pytest.approx(value, rel=1e-2, abs=1e-2)
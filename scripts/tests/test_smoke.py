@@ -0,0 +1,150 @@
+# ---------------------------------------------------------------------------------------------------------------------#
+# Smoke tests on synthetic data: the native engine against Biogeme, its analytic gradient, and a short run of the
+# pipeline from 0-prepare-data.py to the likelihood ratio test (4-5) and the scenarios (4-6).
+# ---------------------------------------------------------------------------------------------------------------------#
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from conftest import SCRIPTS
+
+# types of draws of the distributions of the specifications
+DISTRIBUTIONS = {"triangular": "TRIANGULAR", "normal": "NORMAL"}
+
+# scripts of the smoke run, whose 5000 draws are reduced to keep it short
+SMOKE_DRAWS = {"4-2-mxl-IV-final.py": 50, "4-4-mxl-IV-final-lr-test.py": 50, "4-6-mxl-IV-final-elast.py": 50}
+
+
+def _engine(tmp_path, kernel="numpy"):
+    """
+    Native engine of model IV on synthetic data, with the draws of a cache in tmp_path, and the true parameters.
+    """
+    from avchoice import DrawCache, PanelMixedLogit
+    from avchoice.mxl_iv import MXL_IV_FINAL
+    from avchoice.synthetic import model_data, true_betas
+
+    data = model_data(100, seed=2)
+    draw_cache = DrawCache(str(tmp_path / "draws"), seed=0)
+    engine = PanelMixedLogit.from_specification(
+        data, MXL_IV_FINAL, 50, DISTRIBUTIONS, draw_cache=draw_cache, kernel=kernel
+    )
+    return engine, data, draw_cache, true_betas(MXL_IV_FINAL)
+
+
+@pytest.mark.parametrize("kernel", ["numpy", "numba"])
+def test_loglikelihood_matches_biogeme(tmp_path, monkeypatch, kernel):
+    import biogeme.biogeme as bio
+    import biogeme.database as db
+    import biogeme.models as models
+    from biogeme.expressions import MonteCarlo, PanelLikelihoodTrajectory, Variable, log
+
+    from avchoice.draws import random_number_generators
+    from avchoice.mxl_iv import MXL_IV_FINAL
+
+    # Biogeme writes its parameter file in the working directory
+    monkeypatch.chdir(tmp_path)
+    engine, data, draw_cache, betas = _engine(tmp_path, kernel)
+
+    database = db.Database("synthetic", data)
+    database.panel("id")
+    database.set_random_number_generators(random_number_generators())
+    draw_cache.attach(database)
+    v, av = MXL_IV_FINAL.biogeme(DISTRIBUTIONS)
+    logprob = log(MonteCarlo(PanelLikelihoodTrajectory(models.logit(v, av, Variable(MXL_IV_FINAL.choice)))))
+    biogeme = bio.BIOGEME(database, {"loglike": logprob}, number_of_draws=engine.number_of_draws)
+    biogeme.modelName = "synthetic"
+    expected = biogeme.simulate(the_beta_values=betas)["loglike"].sum()
+
+    assert engine.loglikelihood(betas) == pytest.approx(expected, rel=1e-10)
+
+
+@pytest.mark.parametrize("kernel", ["numpy", "numba"])
+def test_gradient(tmp_path, kernel):
+    engine, _, _, betas = _engine(tmp_path, kernel)
+    table = engine.check_gradient(betas)
+    assert table["Rel. diff."].max() < 1e-4, table.sort_values("Rel. diff.").tail().to_string()
+
+
+@pytest.fixture(scope="module")
+def smoke_run(tmp_path_factory, survey):
+    """
+    Run of run-pipeline.py 4-5 4-6 (0-prepare, 4-2, 4-4, 4-5 and 4-6) in a copy of the scripts, on the synthetic
+    survey, with fewer draws.
+
+    :return: (directory of the copy, completed process of the runner).
+    """
+    root = tmp_path_factory.mktemp("pipeline")
+    scripts = root / "scripts"
+    shutil.copytree(SCRIPTS, scripts, ignore=shutil.ignore_patterns("__pycache__", "tests", "biogeme.toml"))
+    for script, draws in SMOKE_DRAWS.items():
+        text = (scripts / script).read_text()
+        assert "number_of_draws = 5000\n" in text, f"number_of_draws of {script} changed, update SMOKE_DRAWS"
+        (scripts / script).write_text(text.replace("number_of_draws = 5000\n", f"number_of_draws = {draws}\n"))
+    (root / "data").mkdir()
+    (root / "outputs").mkdir()
+    shutil.copy(survey, root / "data" / "data.csv")
+
+    process = subprocess.run(
+        [sys.executable, "run-pipeline.py", "4-5", "4-6", "--cpus", "1"],
+        cwd=scripts,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    return root, process
+
+
+def _stage_logs(root):
+    """
+    Console output of the stages of a run, for the messages of the failed assertions.
+    """
+    directory = root / "outputs" / "pipeline"
+    return "\n".join(f"--- {path.name}\n{path.read_text()[-3000:]}" for path in sorted(directory.glob("*.txt")))
+
+
+def test_smoke_run_stages(smoke_run):
+    root, process = smoke_run
+    assert process.returncode == 0, f"{process.stdout}\n{_stage_logs(root)}"
+    for name in ("0-prepare", "4-2", "4-4", "4-5", "4-6"):
+        assert re.search(rf"^{name}\s+done$", process.stdout, re.MULTILINE), process.stdout
+
+
+def test_smoke_run_prepare_again(smoke_run):
+    # a new process, with another hash seed, reads the measurement model from the cache of the first run
+    root, _ = smoke_run
+    process = subprocess.run(
+        [sys.executable, "0-prepare-data.py"],
+        cwd=root / "scripts",
+        env=dict(os.environ, PYTHONHASHSEED="7"),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    assert process.returncode == 0, process.stdout[-3000:]
+
+
+def test_smoke_run_lr_test(smoke_run):
+    root, _ = smoke_run
+    loglike = {}
+    for name in ("4-2-mxl-IV-final", "4-4-mxl-IV-final-lr-test"):
+        with open(root / "outputs" / f"{name}.json") as file:
+            loglike[name] = json.load(file)["loglike"]
+    log = (root / "outputs" / "4-5-lr-test.log").read_text()
+    assert "Log likelihoods read from the results store." in log
+    statistic = float(re.search(r"Likelihood Ratio Statistic: (\S+)", log).group(1))
+    assert statistic == pytest.approx(2 * (loglike["4-2-mxl-IV-final"] - loglike["4-4-mxl-IV-final-lr-test"]))
+    assert 0.0 <= float(re.search(r"p-value: (\S+)", log).group(1)) <= 1.0
+
+
+def test_smoke_run_scenarios(smoke_run):
+    root, _ = smoke_run
+    changes = pd.read_csv(root / "outputs" / "4-6-mxl-IV-final-elast.csv")
+    assert "all invidiuals were considered 65+ years old" in set(changes["Scenario"])
+    assert len(changes) == 14 * 3
+    assert changes["Mean change (%)"].notna().all()